@@ -1,18 +1,34 @@
-import json
-from decimal import Decimal
-from flask.json import JSONEncoder
-from flask import Flask, Response
-from sagemaker_svc_wrapper.api.projects import project_ns as projects
-from sagemaker_svc_wrapper.api.jobs import job_ns as jobs
-from sagemaker_svc_wrapper.api.project_models import project_model_ns as modles
+from sagemaker_svc_wrapper.configs import profiling
+
+with profiling.timed('import flask'):
+    from flask import Flask
+with profiling.timed('import flask_restplus'):
+    import flask_restplus
+with profiling.timed('import sagemaker_svc_wrapper.handlers'):
+    from sagemaker_svc_wrapper.handlers import dynamo_handler, sagemaker_handler
+with profiling.timed('import sagemaker_svc_wrapper.api.projects'):
+    from sagemaker_svc_wrapper.api.projects import project_ns as projects
+with profiling.timed('import sagemaker_svc_wrapper.api.jobs'):
+    from sagemaker_svc_wrapper.api.jobs import job_ns as jobs
+with profiling.timed('import sagemaker_svc_wrapper.api.project_models'):
+    from sagemaker_svc_wrapper.api.project_models import project_model_ns as modles
+with profiling.timed('import sagemaker_svc_wrapper.api.invoke'):
+    from sagemaker_svc_wrapper.api.invoke import invoke_ns as invoke
+with profiling.timed('import sagemaker_svc_wrapper.api.metrics'):
+    from sagemaker_svc_wrapper.api import metrics
 from sagemaker_svc_wrapper.api import API
 
 def init():
-    app = Flask(__name__)
-    API.add_namespace(modles)
-    API.add_namespace(jobs)
-    API.add_namespace(projects)
-    API.init_app(app)
+    with profiling.timed('app init'):
+        app = Flask(__name__)
+        API.add_namespace(modles)
+        API.add_namespace(jobs)
+        API.add_namespace(projects)
+        API.add_namespace(invoke)
+        API.add_namespace(metrics.metrics_ns)
+        API.init_app(app)
+        metrics.init_app(app)
+    profiling.report()
     return app
 
 
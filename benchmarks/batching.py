@@ -0,0 +1,185 @@
+"""
+throughput of the /invoke proxy with and without micro-batching, against a local stub endpoint.
+
+    python -m benchmarks.batching --concurrency 16 --overhead-ms 10
+
+the stub serves the sagemaker-runtime invocations api over http on localhost and runs one request at a time,
+each taking overhead-ms plus per-record-ms per record, like a single instance with per request overhead.
+the proxy talks to it through a real botocore client, callers are threads sending single record requests
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import boto3
+from tests.fakes import install_fake_aws
+from sagemaker_svc_wrapper.configs import clients
+from sagemaker_svc_wrapper.configs.settings import SYS_CONFIG
+# runtime_handler registers its target variant hooks with the client factory
+from sagemaker_svc_wrapper.handlers import dynamo_handler, runtime_handler  # pylint: disable=unused-import
+from benchmarks.run import percentile
+
+PROJECT = 'bench-batching'
+ENDPOINT = 'bench-batching-endpoint'
+
+
+class StubEndpoint(ThreadingMixIn, HTTPServer):
+    """
+    local invocations endpoint, doubles every instance of {"instances": [...]}
+        :param overhead: seconds per invocation
+        :param per_record: seconds per record
+    """
+    daemon_threads = True
+
+    def __init__(self, overhead, per_record):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StubHandler)
+        self.overhead = overhead
+        self.per_record = per_record
+        self.invocations = 0
+        # a single model worker, concurrent invocations queue up behind it
+        self.instance = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        instances = json.loads(self.rfile.read(int(self.headers['Content-Length'])))['instances']
+        with self.server.instance:
+            time.sleep(self.server.overhead + self.server.per_record * len(instances))
+            self.server.invocations += 1
+        output = json.dumps({'predictions': [instance * 2 for instance in instances]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(output)))
+        self.send_header('X-Amzn-Invoked-Production-Variant', 'default')
+        self.end_headers()
+        self.wfile.write(output)
+
+    def log_message(self, *args):
+        pass
+
+
+def runtime_client(endpoint_url):
+    """
+    sagemaker-runtime client pointed at the stub, configured like the shared one
+    """
+    session = boto3.session.Session(aws_access_key_id='bench', aws_secret_access_key='bench',
+                                    region_name='ap-southeast-2')
+    return clients.new_client('sagemaker-runtime', session=session, endpoint_url=endpoint_url)
+
+
+def bench(client_factory, stub, name, concurrency, requests):
+    """
+    concurrency threads each sending requests single record invocations
+    """
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    start_line = threading.Barrier(concurrency + 1)
+
+    def caller(worker):
+        client = client_factory()
+        start_line.wait()
+        for index in range(requests):
+            record = worker * requests + index
+            start = time.perf_counter()
+            response = client.post(f'/invoke/{PROJECT}', json={'instances': [record]})
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code != 200 or response.get_json() != {'predictions': [record * 2]}:
+                    errors.append(response.status_code)
+
+    threads = [threading.Thread(target=caller, args=(worker,)) for worker in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    invocations = stub.invocations
+    start_line.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    if errors:
+        raise RuntimeError(f'{name}: {len(errors)} failed requests, e.g. {errors[0]}')
+
+    total = concurrency * requests
+    return OrderedDict([
+        ('mode', name),
+        ('requests', total),
+        ('throughput_rps', total / wall),
+        ('p50_ms', percentile(latencies, 0.50) * 1000),
+        ('p95_ms', percentile(latencies, 0.95) * 1000),
+        ('invocations', stub.invocations - invocations),
+        ('records_per_invocation', total / (stub.invocations - invocations)),
+    ])
+
+
+def run(args):
+    import app
+
+    SYS_CONFIG.log_request_metrics = False
+    stub = StubEndpoint(args.overhead_ms / 1000.0, args.per_record_ms / 1000.0)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    try:
+        install_fake_aws()
+        clients.register('sagemaker-runtime', client=runtime_client(stub.url))
+        dynamo_handler.create_project(PROJECT)
+        dynamo_handler.update_project(PROJECT, {'serving_endpoint': ENDPOINT})
+
+        rows = []
+        dynamo_handler.create_project_model(PROJECT, 'default')
+        rows.append(bench(app.app.test_client, stub, 'unbatched', args.concurrency, args.requests))
+        dynamo_handler.create_project_model(PROJECT, 'default', batching={'max_batch_size': args.max_batch_size,
+                                                                          'max_wait_ms': args.max_wait_ms})
+        rows.append(bench(app.app.test_client, stub, f'batched ({args.max_batch_size}, {args.max_wait_ms} ms)',
+                          args.concurrency, args.requests))
+        return rows
+    finally:
+        stub.shutdown()
+        stub.server_close()
+
+
+def print_rows(rows):
+    header = f"{'mode':<24} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'invokes':>8} {'rec/inv':>8}"
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(f"{row['mode']:<24} {row['requests']:>8} {row['throughput_rps']:>8.1f} {row['p50_ms']:>8.2f} "
+              f"{row['p95_ms']:>8.2f} {row['invocations']:>8} {row['records_per_invocation']:>8.1f}")
+    if len(rows) == 2 and rows[0]['throughput_rps']:
+        print(f"throughput gain: {rows[1]['throughput_rps'] / rows[0]['throughput_rps']:.1f}x")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent callers')
+    parser.add_argument('--requests', type=int, default=25, help='requests per caller')
+    parser.add_argument('--overhead-ms', type=float, default=10.0, help='stub endpoint time per invocation')
+    parser.add_argument('--per-record-ms', type=float, default=0.2, help='stub endpoint time per record')
+    parser.add_argument('--max-batch-size', type=int, default=16)
+    parser.add_argument('--max-wait-ms', type=int, default=5)
+    parser.add_argument('--json', help='write results to this file')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rows = run(args)
+    print_rows(rows)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(rows, output, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
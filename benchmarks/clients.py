@@ -0,0 +1,216 @@
+"""
+load test of the shared client factory against a local sagemaker stub, plain boto3 clients next to tuned ones.
+
+    python -m benchmarks.clients --concurrency 16 --requests 30 --capacity 50
+
+the stub serves DescribeEndpoint over http on localhost, takes latency-ms per call and answers ThrottlingException
+above capacity calls per second, like an account limit. callers are threads sharing one client, like the
+request pool or the cron workers. reported per client: failed calls, latency, the attempts and throttles the
+stub saw and the tcp connections it accepted, i.e. how often the connection pool was too small to reuse one
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import boto3
+from botocore.exceptions import ClientError
+from sagemaker_svc_wrapper.configs import clients
+from benchmarks.run import percentile
+
+
+class StubSageMaker(ThreadingMixIn, HTTPServer):
+    """
+    local sagemaker api, describes any endpoint as InService
+        :param latency: seconds per call
+        :param capacity: calls per second answered, the rest is throttled
+    """
+    daemon_threads = True
+
+    def __init__(self, latency, capacity):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StubHandler)
+        self.latency = latency
+        self.capacity = float(capacity)
+        self.lock = threading.Lock()
+        self.tokens = self.capacity
+        self.refilled = time.monotonic()
+        self.attempts = 0
+        self.throttled = 0
+        self.connections = 0
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def admit(self):
+        """
+        token bucket of one second of capacity
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.refilled) * self.capacity)
+            self.refilled = now
+            self.attempts += 1
+            if self.tokens < 1:
+                self.throttled += 1
+                return False
+            self.tokens -= 1
+            return True
+
+    def counters(self):
+        with self.lock:
+            return self.attempts, self.throttled, self.connections
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])) or b'{}')
+        if self.server.admit():
+            time.sleep(self.server.latency)
+            status, output = 200, {'EndpointName': request.get('EndpointName'), 'EndpointStatus': 'InService',
+                                   'EndpointArn': f"arn:aws:sagemaker:::endpoint/{request.get('EndpointName')}",
+                                   'EndpointConfigName': request.get('EndpointName'),
+                                   'CreationTime': 0, 'LastModifiedTime': 0}
+        else:
+            status, output = 400, {'__type': 'ThrottlingException', 'message': 'Rate exceeded'}
+        body = json.dumps(output).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/x-amz-json-1.1')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def bench_session():
+    return boto3.session.Session(aws_access_key_id='bench', aws_secret_access_key='bench',
+                                 region_name='ap-southeast-2')
+
+
+def default_client(endpoint_url):
+    """
+    boto3 defaults: 10 pooled connections, legacy retries, 60 second timeouts
+    """
+    return bench_session().client('sagemaker', endpoint_url=endpoint_url)
+
+
+def tuned_client(endpoint_url):
+    """
+    the client handlers get from the shared factory
+    """
+    return clients.new_client('sagemaker', session=bench_session(), endpoint_url=endpoint_url)
+
+
+def bench(client, stub, name, concurrency, requests):
+    """
+    concurrency threads each describing requests endpoints through one shared client
+    """
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+    start_line = threading.Barrier(concurrency + 1)
+
+    def caller(worker):
+        start_line.wait()
+        for index in range(requests):
+            start = time.perf_counter()
+            try:
+                client.describe_endpoint(EndpointName=f'bench-{worker}-{index}')
+                failed = None
+            except ClientError as error:
+                failed = error.response['Error']['Code']
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if failed:
+                    failures.append(failed)
+
+    threads = [threading.Thread(target=caller, args=(worker,)) for worker in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    attempts, throttled, connections = stub.counters()
+    start_line.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    stub_attempts, stub_throttled, stub_connections = stub.counters()
+
+    total = concurrency * requests
+    return OrderedDict([
+        ('client', name),
+        ('calls', total),
+        ('failed', len(failures)),
+        ('throughput_rps', (total - len(failures)) / wall),
+        ('p50_ms', percentile(latencies, 0.50) * 1000),
+        ('p95_ms', percentile(latencies, 0.95) * 1000),
+        ('p99_ms', percentile(latencies, 0.99) * 1000),
+        ('attempts', stub_attempts - attempts),
+        ('throttled', stub_throttled - throttled),
+        ('connections', stub_connections - connections),
+    ])
+
+
+def run(args):
+    rows = []
+    for name, client_factory in (('default', default_client), ('tuned', tuned_client)):
+        # a fresh stub per client so neither starts on the other's drained bucket
+        stub = StubSageMaker(args.latency_ms / 1000.0, args.capacity)
+        threading.Thread(target=stub.serve_forever, daemon=True).start()
+        try:
+            rows.append(bench(client_factory(stub.url), stub, name, args.concurrency, args.requests))
+        finally:
+            stub.shutdown()
+            stub.server_close()
+    return rows
+
+
+def print_rows(rows):
+    header = (f"{'client':<10} {'calls':>6} {'failed':>6} {'ok/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'attempts':>8} {'throttled':>9} {'conns':>6}")
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(f"{row['client']:<10} {row['calls']:>6} {row['failed']:>6} {row['throughput_rps']:>8.1f} "
+              f"{row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['attempts']:>8} "
+              f"{row['throttled']:>9} {row['connections']:>6}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent callers sharing a client')
+    parser.add_argument('--requests', type=int, default=30, help='calls per caller')
+    parser.add_argument('--latency-ms', type=float, default=10.0, help='stub time per call')
+    parser.add_argument('--capacity', type=float, default=50.0, help='stub calls per second before throttling')
+    parser.add_argument('--max-failed', type=int, help='exit non zero when the tuned client fails more calls')
+    parser.add_argument('--json', help='write results to this file')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rows = run(args)
+    print_rows(rows)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(rows, output, indent=2)
+    if args.max_failed is not None and rows[-1]['failed'] > args.max_failed:
+        print(f"tuned client failed {rows[-1]['failed']} calls, more than {args.max_failed}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
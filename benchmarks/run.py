@@ -0,0 +1,236 @@
+"""
+offline benchmark of the api routes and the status cron against in-process aws stand-ins.
+
+    python -m benchmarks.run --projects 10,50,200 --latency-ms 5
+
+reports p50/p95/p99 latency, throughput and aws calls per request for every route and dataset size.
+--max-p95-ms and --max-calls-per-request turn it into a regression gate with a non zero exit code
+"""
+import argparse
+import json
+import sys
+import time
+from collections import OrderedDict
+from tests.fakes import install_fake_aws
+from sagemaker_svc_wrapper.configs.settings import SYS_CONFIG
+from sagemaker_svc_wrapper.handlers import dynamo_handler
+
+SPEC_SERVE = {'InitialInstanceCount': 1, 'InstanceType': 'ml.m4.xlarge'}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def seed(fake, projects, variants, history, in_flight):
+    """
+    synthetic dataset: every project has variants, each with a serving model,
+    history retired jobs and in_flight jobs waiting for their endpoint
+        :return: list of project names
+    """
+    project_names = [f'bench-p{index}' for index in range(projects)]
+    timestamp = int(time.time()) - 3600
+    for project_name in project_names:
+        variant_names = [f'v{index}' for index in range(variants)]
+        dynamo_handler.create_project(project_name, variants={variant: 1 for variant in variant_names})
+        dynamo_handler.update_project(project_name, {'serving_endpoint': f'{project_name}-v0-Serve-{timestamp}'})
+        for variant_name in variant_names:
+            serving = f'{project_name}-{variant_name}-Serve-{timestamp}'
+            dynamo_handler.create_project_model(project_name, variant_name, spec_serve=SPEC_SERVE,
+                                                image_serve=json.dumps('image'), latest_model=serving)
+            fake.sagemaker.create_endpoint(EndpointName=serving, EndpointConfigName=serving)
+            for index in range(history):
+                dynamo_handler.log_job(project_name, 'Serve', variant_name, 'Retired',
+                                       job_name=f'{project_name}-{variant_name}-Serve-{timestamp - index - 1}',
+                                       timestamp_queued=timestamp - index - 1)
+            for index in range(in_flight):
+                job_name = f'{project_name}-{variant_name}-Serve-{timestamp + index + 1}'
+                dynamo_handler.log_job(project_name, 'Serve', variant_name, 'Creating',
+                                       job_name=job_name, timestamp_queued=timestamp + index + 1)
+                fake.sagemaker.create_endpoint(EndpointName=job_name, EndpointConfigName=job_name)
+    fake.sagemaker.settle()
+    for endpoint in fake.sagemaker.endpoints.values():
+        if endpoint['EndpointName'].endswith(tuple(str(timestamp + index + 1) for index in range(in_flight))):
+            endpoint['EndpointStatus'] = 'Creating'
+    return project_names
+
+
+def bench_route(fake, name, send, requests, before=None):
+    """
+    time requests sequential calls of send(i)
+        :param before: untimed setup per request, must not make fake aws calls
+    """
+    latencies = []
+    fake.calls.reset()
+    for index in range(requests):
+        if before:
+            before(index)
+        start = time.perf_counter()
+        response = send(index)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code >= 500:
+            raise RuntimeError(f'{name} failed: {response.status_code} {response.data[:200]}')
+    return summary(name, latencies, fake.calls.total(), requests)
+
+
+def summary(name, latencies, aws_calls, requests):
+    return OrderedDict([
+        ('route', name),
+        ('requests', requests),
+        ('p50_ms', percentile(latencies, 0.50) * 1000),
+        ('p95_ms', percentile(latencies, 0.95) * 1000),
+        ('p99_ms', percentile(latencies, 0.99) * 1000),
+        ('throughput_rps', requests / sum(latencies) if sum(latencies) else 0.0),
+        ('aws_calls_per_request', aws_calls / requests if requests else 0.0),
+    ])
+
+
+def bench_routes(fake, client, project_names, variants, requests):
+    variant = 'v0'
+    job_name = next(iter(fake.dynamodb.Table(SYS_CONFIG.job_table).items.values()))['job_name']
+
+    def project(index):
+        return project_names[index % len(project_names)]
+
+    etags = {project_name: client.get(f'/project/{project_name}').headers['ETag'] for project_name in project_names}
+    job_etag = client.get(f'/job/{job_name}').headers['ETag']
+
+    results = [
+        bench_route(fake, 'GET /project/<name>', lambda i: client.get(f'/project/{project(i)}'), requests),
+        bench_route(fake, 'GET /project/<name>/jobs', lambda i: client.get(f'/project/{project(i)}/jobs'), requests),
+        bench_route(fake, 'GET /project/<name>/models',
+                    lambda i: client.get(f'/project/{project(i)}/models'), requests),
+        bench_route(fake, 'GET /models/<project>/<variant>',
+                    lambda i: client.get(f'/models/{project(i)}/{variant}'), requests),
+        bench_route(fake, 'GET /job/<name>', lambda i: client.get(f'/job/{job_name}'), requests),
+        # dashboard polls of unchanged items
+        bench_route(fake, 'GET /project/<name> If-None-Match',
+                    lambda i: client.get(f'/project/{project(i)}', headers={'If-None-Match': etags[project(i)]}),
+                    requests),
+        bench_route(fake, 'GET /job/<name> If-None-Match',
+                    lambda i: client.get(f'/job/{job_name}', headers={'If-None-Match': job_etag}), requests),
+        bench_route(fake, 'POST /invoke/<project>',
+                    lambda i: client.post(f'/invoke/{project(i)}', data=b'{"instances": [[1, 2, 3]]}',
+                                          content_type='application/json'), requests),
+    ]
+
+    existing = {name: set(getattr(fake.sagemaker, name)) for name in ('endpoints', 'endpoint_configs', 'models')}
+
+    def reset_endpoints(index):
+        # serve job names are per second, drop resources of earlier serve requests
+        for name, names in existing.items():
+            resources = getattr(fake.sagemaker, name)
+            for resource_name in set(resources) - names:
+                del resources[resource_name]
+
+    results.append(bench_route(
+        fake, 'POST /job/<project>/serve',
+        lambda i: client.post(f'/job/{project(i)}/serve', json={'image_serve': 'image', 'variant_name': variant}),
+        requests, before=reset_endpoints))
+    results.append(bench_route(
+        fake, 'POST /job/<project>/serve?async',
+        lambda i: client.post(f'/job/{project(i)}/serve?async=true',
+                              json={'image_serve': 'image', 'variant_name': variant}),
+        requests))
+    return results
+
+
+def bench_cron(fake, cron_mode, in_flight_jobs):
+    from cron import status_handler
+
+    SYS_CONFIG.cron_mode = cron_mode
+    fake.calls.reset()
+    start = time.perf_counter()
+    result = status_handler.jobs_update()
+    elapsed = time.perf_counter() - start
+    row = summary(f'cron jobs_update ({cron_mode})', [elapsed], fake.calls.total(), 1)
+    row['aws_calls_per_job'] = fake.calls.total() / in_flight_jobs if in_flight_jobs else 0.0
+    row['jobs_reconciled'] = len(result.reconciled)
+    row['jobs_pending'] = len(result.pending)
+    return row
+
+
+def run(args):
+    import app
+
+    client = app.app.test_client()
+    SYS_CONFIG.log_request_metrics = False
+    rows = []
+    for projects in args.projects:
+        size = OrderedDict([('projects', projects), ('variants', args.variants),
+                            ('in_flight_jobs', projects * args.variants * args.in_flight)])
+
+        fake = install_fake_aws(latency=args.latency_ms / 1000.0)
+        project_names = seed(fake, projects, args.variants, args.history, args.in_flight)
+        for row in bench_routes(fake, client, project_names, args.variants, args.requests):
+            rows.append(OrderedDict(list(size.items()) + list(row.items())))
+
+        # every cron mode starts from the same dataset with all in-flight endpoints just gone InService
+        for cron_mode in args.cron_modes:
+            fake = install_fake_aws(latency=args.latency_ms / 1000.0)
+            seed(fake, projects, args.variants, args.history, args.in_flight)
+            fake.sagemaker.settle()
+            row = bench_cron(fake, cron_mode, size['in_flight_jobs'])
+            rows.append(OrderedDict(list(size.items()) + list(row.items())))
+    return rows
+
+
+def print_rows(rows):
+    header = f"{'projects':>8} {'jobs':>6}  {'route':<34} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'aws/req':>8}"
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(f"{row['projects']:>8} {row['in_flight_jobs']:>6}  {row['route']:<34} {row['p50_ms']:>8.2f} "
+              f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['throughput_rps']:>8.1f} "
+              f"{row['aws_calls_per_request']:>8.1f}")
+
+
+def regressions(rows, max_p95_ms=None, max_calls_per_request=None):
+    failures = []
+    for row in rows:
+        if row['route'].startswith('cron'):
+            continue
+        if max_p95_ms is not None and row['p95_ms'] > max_p95_ms:
+            failures.append(f"{row['route']} at {row['projects']} projects: p95 {row['p95_ms']:.2f} ms > {max_p95_ms}")
+        if max_calls_per_request is not None and row['aws_calls_per_request'] > max_calls_per_request:
+            failures.append(f"{row['route']} at {row['projects']} projects: "
+                            f"{row['aws_calls_per_request']:.1f} aws calls > {max_calls_per_request}")
+    return failures
+
+
+def parse_args(argv=None):
+    def int_list(value):
+        return [int(part) for part in value.split(',') if part]
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--projects', type=int_list, default=[10, 50], help='dataset sizes to sweep, comma separated')
+    parser.add_argument('--variants', type=int, default=3, help='variants per project')
+    parser.add_argument('--history', type=int, default=20, help='retired jobs per variant')
+    parser.add_argument('--in-flight', type=int, default=1, help='in-flight jobs per variant')
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='injected latency per aws call')
+    parser.add_argument('--cron-modes', type=lambda value: value.split(','), default=['bulk', 'describe'])
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--max-p95-ms', type=float, help='fail when a route p95 exceeds this')
+    parser.add_argument('--max-calls-per-request', type=float, help='fail when a route makes more aws calls')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rows = run(args)
+    print_rows(rows)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(rows, output, indent=2)
+    failures = regressions(rows, args.max_p95_ms, args.max_calls_per_request)
+    for failure in failures:
+        print(f'regression: {failure}', file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
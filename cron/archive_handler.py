@@ -0,0 +1,59 @@
+from collections import defaultdict
+import maya
+from sagemaker_svc_wrapper.configs.settings import SYS_CONFIG
+from sagemaker_svc_wrapper.configs import metrics
+from sagemaker_svc_wrapper.handlers import dynamo_handler, s3_handler
+
+# jobs that will not change any more
+ARCHIVE_STATUSES = ('Retired', 'Failed')
+DAY_SECONDS = 24 * 60 * 60
+
+
+def archive_key(project_name, archived_at):
+    """
+    :param project_name: 
+    :param archived_at: epoch seconds of the archive run
+    :return: s3 key of the run's archive of a project, e.g. jobs/p/2019/01/21/1548041871.jsonl.gz
+    """
+    day = maya.MayaDT(archived_at).datetime()
+    return f'{SYS_CONFIG.archive_prefix}/{project_name}/{day:%Y/%m/%d}/{archived_at}.jsonl.gz'
+
+
+def old_jobs(until, max_jobs):
+    """
+    retired and failed jobs queued at or before until, by project
+        :param until: epoch seconds
+        :param max_jobs: stop after this many jobs, the rest is left for the next run
+    """
+    by_project = defaultdict(list)
+    found = 0
+    for status in ARCHIVE_STATUSES:
+        for job in dynamo_handler.list_jobs_by_status(status, until=until):
+            if found >= max_jobs:
+                return by_project
+            by_project[job['project_name']].append(job)
+            found += 1
+    return by_project
+
+
+def archive_jobs(event=None, context=None):
+    """
+    scheduled move of retired and failed jobs older than archive_after_days to gzipped jsonl on s3,
+    one object per project and run. jobs are deleted from the job table only after their object is written,
+    a run failing in between archives them again next time
+        :param event: scheduled event
+        :param context: lambda context
+        :return: dict of project name to archived jobs
+    """
+    archived = {}
+    with metrics.scope('cron archive_jobs'):
+        now = maya.now().epoch
+        by_project = old_jobs(now - SYS_CONFIG.archive_after_days * DAY_SECONDS, SYS_CONFIG.archive_max_jobs)
+        for project_name, jobs in sorted(by_project.items()):
+            jobs.sort(key=lambda job: job.get('timestamp_queued', 0))
+            key = archive_key(project_name, now)
+            size = s3_handler.put_jsonl_gz(SYS_CONFIG.archive_bucket, key, jobs)
+            dynamo_handler.delete_jobs([job['job_name'] for job in jobs])
+            archived[project_name] = len(jobs)
+            print(f'archived {len(jobs)} jobs of {project_name} to s3://{SYS_CONFIG.archive_bucket}/{key} ({size} bytes)')
+    return archived
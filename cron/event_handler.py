@@ -0,0 +1,77 @@
+import json
+from sagemaker_svc_wrapper.configs.settings import SYS_CONFIG
+from sagemaker_svc_wrapper.configs import metrics
+from sagemaker_svc_wrapper.handlers import dynamo_handler, util_handler, sqs_handler
+from cron import status_handler
+
+ENDPOINT_STATE_CHANGE = 'SageMaker Endpoint State Change'
+TRAINING_JOB_STATE_CHANGE = 'SageMaker Training Job State Change'
+TRANSFORM_JOB_STATE_CHANGE = 'SageMaker Transform Job State Change'
+
+# job statuses an event can still move forward
+OPEN_STATUSES = status_handler.IN_FLIGHT_STATUSES + list(status_handler.JOB_STATUS_TYPES.values())
+
+
+def normalize_status(status):
+    """
+    endpoint events spell statuses like IN_SERVICE, the api like InService
+        :param status:
+    """
+    if status and status.isupper():
+        return ''.join(part.title() for part in status.split('_'))
+    return status
+
+
+def observed_job(sagemaker_event):
+    """
+    :param sagemaker_event: eventbridge sagemaker state change event
+    :return: (job name, status), (None, None) for other events
+    """
+    detail = sagemaker_event.get('detail', {})
+    detail_type = sagemaker_event.get('detail-type')
+    if detail_type == ENDPOINT_STATE_CHANGE:
+        return detail.get('EndpointName'), normalize_status(detail.get('EndpointStatus'))
+    if detail_type == TRAINING_JOB_STATE_CHANGE:
+        return detail.get('TrainingJobName'), normalize_status(detail.get('TrainingJobStatus'))
+    if detail_type == TRANSFORM_JOB_STATE_CHANGE:
+        return detail.get('TransformJobName'), normalize_status(detail.get('TransformJobStatus'))
+    return None, None
+
+
+def apply_event(sagemaker_event, throttle):
+    """
+    update job, project model and project records of the job an event is about
+        :param sagemaker_event: eventbridge sagemaker state change event
+        :param throttle: AdaptiveThrottle for sagemaker calls
+        :return: status applied, None when the event is not about an open job of this service
+    """
+    job_name, status = observed_job(sagemaker_event)
+    if not job_name or not status:
+        return None
+    job = dynamo_handler.get_job(job_name)
+    if job.get('endpoint_status') not in OPEN_STATUSES:
+        return None
+    return status_handler.reconcile_job(dict(job, observed_status=status), throttle)
+
+
+def handle_events(event, context=None):
+    """
+    sagemaker state changes from eventbridge, delivered through sqs or invoked with a raw event.
+    a failed sqs record fails the invocation so the batch is delivered again, events already applied
+    find their job moved on. the sweep cron catches anything dead-lettered
+        :param event: sqs lambda event or a raw eventbridge event
+        :param context: lambda context
+    """
+    throttle = util_handler.AdaptiveThrottle(rate=SYS_CONFIG.sagemaker_calls_per_second)
+    with metrics.scope('cron handle_events'):
+        if 'Records' not in event:
+            return apply_event(event, throttle)
+
+        failures = []
+        for record in event['Records']:
+            try:
+                apply_event(json.loads(record['body']), throttle)
+            except Exception as error:  # pylint: disable=broad-except
+                print(f"sagemaker event {record.get('messageId')} failed: {error}")
+                failures.append({'itemIdentifier': record['messageId']})
+    return sqs_handler.batch_response(failures)
@@ -0,0 +1,116 @@
+import json
+import re
+import maya
+from sagemaker_svc_wrapper.configs.settings import SYS_CONFIG
+from sagemaker_svc_wrapper.configs import metrics
+from sagemaker_svc_wrapper.handlers import dynamo_handler, sagemaker_handler, util_handler, sweep_handler
+from cron import reconciler
+
+# models and endpoint configs are named after the serve job creating them
+JOB_NAME_PATTERN = re.compile(r'^(?P<project_name>.+)-(Train|Serve|Transform|Sweep)-\d+(-\d+)?$')
+# jobs whose resources may still be used
+LIVE_STATUSES = ['Queued', sweep_handler.SCHEDULED_STATUS, 'ModelCreatedOnly', 'Training', 'Transforming',
+                 sweep_handler.SWEEP_STATUS, 'Creating', 'Updating', 'InService']
+DAY_SECONDS = 24 * 60 * 60
+DELETERS = {
+    'model': sagemaker_handler.delete_model,
+    'endpoint_config': sagemaker_handler.delete_endpoint_config,
+}
+
+
+def referenced_names(live_endpoints):
+    """
+    model and endpoint config names still in use: live endpoints and the models of their recorded configs,
+    project serving_endpoint and project model latest_model pointers, and live jobs with the models they score with
+        :param live_endpoints: endpoint names from sagemaker
+    """
+    names = set(live_endpoints)
+    for record in dynamo_handler.batch_get_endpoints(list(live_endpoints)):
+        names.update(variant.get('ModelName') for variant in json.loads(record.get('endpoint_config') or '[]'))
+    names.update(project.get('serving_endpoint') for project in dynamo_handler.list_projects())
+    names.update(project_model.get('latest_model') for project_model in dynamo_handler.list_all_project_models())
+    for status in LIVE_STATUSES:
+        for job in dynamo_handler.list_jobs_by_status(status):
+            names.update((job.get('job_name'), job.get('model_name')))
+    names.discard(None)
+    return names
+
+
+def orphans(resources, referenced, project_names):
+    """
+    resources of this service's projects that nothing references
+        :param resources: dict of resource name to creation time
+        :param referenced: names in use
+        :param project_names: names of every project, resources of other teams are never touched
+    """
+    found = []
+    for name in sorted(resources):
+        matched = JOB_NAME_PATTERN.match(name)
+        if name not in referenced and matched and matched.group('project_name') in project_names:
+            found.append(name)
+    return found
+
+
+def delete_resource(resource, throttle, timestamp):
+    """
+    delete an orphaned model or endpoint config, the job it was named after records when
+        :param resource: {'job_name': 'model/<name>' or 'endpoint_config/<name>', 'kind', 'name'}
+        :param throttle: AdaptiveThrottle for sagemaker calls
+        :param timestamp: epoch seconds of the run
+    """
+    if throttle.call(DELETERS[resource['kind']], resource['name']):
+        dynamo_handler.update_job(resource['name'], {f"{resource['kind']}_deleted_at": timestamp})
+
+
+def collect_garbage(event=None, context=None):
+    """
+    scheduled deletion of models and endpoint configs older than gc_retention_days that nothing references.
+    deletions run in parallel within sagemaker_calls_per_second, every run with deletions is logged as a
+    GarbageCollection record in the job table. {"dry_run": true} in the event only reports
+        :param event: scheduled event
+        :param context: lambda context
+        :return: report dict of orphaned model and endpoint config names, deleted and failed ones
+    """
+    event = event or {}
+    dry_run = event.get('dry_run', SYS_CONFIG.gc_dry_run)
+    with metrics.scope('cron collect_garbage'):
+        deadline = reconciler.deadline_from(context, SYS_CONFIG.cron_time_budget_seconds)
+        throttle = util_handler.AdaptiveThrottle(rate=SYS_CONFIG.sagemaker_calls_per_second)
+        now = maya.now().epoch
+        before = now - SYS_CONFIG.gc_retention_days * DAY_SECONDS
+
+        # the live endpoint listing comes first, a resource created after it is too young to be listed below
+        live_endpoints = throttle.call(sagemaker_handler.list_endpoint_statuses)
+        models = throttle.call(sagemaker_handler.list_models, creation_time_before=before)
+        endpoint_configs = throttle.call(sagemaker_handler.list_endpoint_configs, creation_time_before=before)
+        referenced = referenced_names(live_endpoints)
+        project_names = {project['project_name'] for project in dynamo_handler.list_projects()}
+
+        report = {
+            'dry_run': dry_run,
+            'models': orphans(models, referenced, project_names),
+            'endpoint_configs': orphans(endpoint_configs, referenced, project_names),
+        }
+        # reconciler items are keyed by job_name, a model and its endpoint config share a name
+        resources = [{'job_name': f'{kind}/{name}', 'kind': kind, 'name': name}
+                     for kind, names in (('model', report['models']), ('endpoint_config', report['endpoint_configs']))
+                     for name in names][:SYS_CONFIG.gc_max_deletions]
+        if dry_run or not resources:
+            print(f"gc {'dry run' if dry_run else 'run'}: {len(report['models'])} orphaned models, "
+                  f"{len(report['endpoint_configs'])} orphaned endpoint configs")
+            return report
+
+        engine = reconciler.Reconciler(metrics.propagate(lambda resource: delete_resource(resource, throttle, now)),
+                                       max_workers=SYS_CONFIG.cron_max_workers,
+                                       group_key=lambda resource: resource['job_name'])
+        result = engine.run(resources, deadline)
+        for kind in DELETERS:
+            report[f'deleted_{kind}s'] = sorted(key.split('/', 1)[1] for key in result.reconciled
+                                               if key.startswith(f'{kind}/'))
+        report['failed'] = sorted(result.failed + result.pending)
+
+        dynamo_handler.log_gc_run(f'gc-{now}', report, now)
+        print(f"gc run: deleted {len(report['deleted_models'])} models, "
+              f"{len(report['deleted_endpoint_configs'])} endpoint configs, failed {len(report['failed'])}, "
+              f"throttled: {throttle.throttled}")
+    return report
@@ -0,0 +1,60 @@
+from sagemaker_svc_wrapper.configs.settings import SYS_CONFIG
+from sagemaker_svc_wrapper.configs import metrics
+from sagemaker_svc_wrapper.handlers import dynamo_handler, sqs_handler, job_handler
+
+
+def run_job(job_type, project_name, job, receive_count=1):
+    """
+    carry out the sagemaker steps of a queued job and record the outcome on the job
+        :param job_type: Train, Serve or Transform
+        :param project_name:
+        :param job: job dict as queued by the api
+        :param receive_count: delivery attempt, from the second one on resources may already exist
+    """
+    job_name = job['job_name']
+    stored = dynamo_handler.get_job(job_name)
+    if stored and stored.get('endpoint_status') != 'Queued':
+        print(f'job {job_name} already {stored.get("endpoint_status")}, skipped')
+        return
+
+    resume = receive_count > 1
+    try:
+        if job_type == job_handler.JobType.Train.value:
+            updates = job_handler.submit_train_job(job, resume=resume)
+        elif job_type == job_handler.JobType.Transform.value:
+            updates = job_handler.submit_transform_job(job, resume=resume)
+        else:
+            updates = job_handler.submit_serve_job(project_name, job, resume=resume)
+    except job_handler.JobError as error:
+        # retrying will not help, fail the job and drop the message
+        dynamo_handler.update_job(job_name, {'endpoint_status': 'Failed', 'error_message': error.message},
+                                  forward_only=True)
+        return
+    updates.setdefault('endpoint_status', 'ModelCreatedOnly')
+    dynamo_handler.update_job(job_name, updates, forward_only=True)
+
+
+def process_jobs(event, context=None):
+    """
+    sqs triggered worker for jobs queued by the api.
+    a failed message fails the invocation so the batch is delivered again, jobs no longer Queued are skipped.
+    after job_max_receive_count deliveries the job is marked Failed and the queue moves the message to its dead-letter queue
+        :param event: sqs lambda event
+        :param context: lambda context
+    """
+    failures = []
+    with metrics.scope('cron process_jobs'):
+        for record in event.get('Records', []):
+            receive_count = int(record.get('attributes', {}).get('ApproximateReceiveCount', 1))
+            job = {}
+            try:
+                job_type, project_name, job = sqs_handler.parse_job(record['body'])
+                run_job(job_type, project_name, job, receive_count)
+            except Exception as error:  # pylint: disable=broad-except
+                print(f"message {record.get('messageId')} attempt {receive_count} failed: {error}")
+                if receive_count >= SYS_CONFIG.job_max_receive_count and job.get('job_name'):
+                    dynamo_handler.update_job(job['job_name'],
+                                              {'endpoint_status': 'Failed', 'error_message': str(error)},
+                                              forward_only=True)
+                failures.append({'itemIdentifier': record['messageId']})
+    return sqs_handler.batch_response(failures)
@@ -0,0 +1,82 @@
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+
+# seconds kept back from the lambda timeout for writing the checkpoint
+SAFETY_MARGIN_SECONDS = 10
+
+ReconcileResult = namedtuple('ReconcileResult', ['reconciled', 'failed', 'pending'])
+
+
+def deadline_from(context, time_budget):
+    """
+    monotonic deadline of a reconciliation pass
+        :param context: lambda context, None when running outside lambda
+        :param time_budget: seconds a pass is allowed to run
+    """
+    budget = time_budget
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        budget = min(budget, context.get_remaining_time_in_millis() / 1000.0 - SAFETY_MARGIN_SECONDS)
+    return time.monotonic() + max(budget, 0)
+
+
+def resume_order(jobs, pending_job_names):
+    """
+    move jobs left over by an unfinished pass to the front, keeping the rest in order
+        :param jobs: job items
+        :param pending_job_names: job names from the checkpoint
+    """
+    pending = set(pending_job_names)
+    return sorted(jobs, key=lambda job: job.get('job_name') not in pending)
+
+
+def project_variant_key(job):
+    return job.get('project_name'), job.get('variant_name')
+
+
+class Reconciler:
+    """
+    reconcile jobs through a bounded worker pool.
+    jobs sharing a group key (project, variant) run sequentially in one worker,
+    so promoting and retiring models of the same variant never race each other
+        :param reconcile: function taking a job item
+        :param max_workers: size of the worker pool
+        :param group_key: function mapping a job item to its group
+    """
+    def __init__(self, reconcile, max_workers=8, group_key=project_variant_key):
+        self.reconcile = reconcile
+        self.max_workers = max_workers
+        self.group_key = group_key
+
+    def run(self, jobs, deadline):
+        """
+        reconcile jobs until done or the deadline is reached
+            :param jobs: job items, in priority order
+            :param deadline: time.monotonic() value to stop at
+        """
+        groups = OrderedDict()
+        for job in jobs:
+            groups.setdefault(self.group_key(job), []).append(job)
+
+        result = ReconcileResult([], [], [])
+        if not groups:
+            return result
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self._run_group, group, deadline, result) for group in groups.values()]
+            for future in futures:
+                future.result()
+        return result
+
+    def _run_group(self, group, deadline, result):
+        for index, job in enumerate(group):
+            if time.monotonic() >= deadline:
+                result.pending.extend(pending.get('job_name') for pending in group[index:])
+                return
+            try:
+                self.reconcile(job)
+                result.reconciled.append(job.get('job_name'))
+            except Exception as error:  # pylint: disable=broad-except
+                print(f"reconcile {job.get('job_name')} failed: {error}")
+                result.failed.append(job.get('job_name'))
@@ -1,32 +1,215 @@
-import boto3
-from sagemaker_svc_wrapper.handlers import dynamo_handler, sagemaker_handler
-
-
-def jobs_update():
-    job_status = ['Creating', 'Updating']
-    for status in job_status:
-        for job in dynamo_handler.list_jobs_by_status(status):
-            endpoint = sagemaker_handler.describe_endpoint(job.get('job_name'))
-            if endpoint.get('EndpointStatus') == 'InService':
-                # update job status
-                dynamo_handler.update_job(job.get('job_name'), {'endpoint_status': 'InService'})
-
-                existing_project_model = dynamo_handler.get_project_model(job.get('project_name'), job.get('variant_name'))
-                #retire existing model
-                if existing_project_model.get('latest_model'):
-                    sagemaker_handler.delete_endpoint(existing_project_model['latest_model'])
-                    dynamo_handler.update_job(existing_project_model['latest_model'], {'endpoint_status': 'Retired'})
-                # update project model latest
-                dynamo_handler.update_project_model(job.get('project_name'), job.get('variant_name'), {'latest_model': job.get('job_name')})
-                # update project pointer
-                dynamo_handler.update_project(job.get('project_name'), {'serving_endpoint': job.get('job_name')})
-            elif endpoint.get('EndpointStatus') == 'Failed':
-                # update job status
-                dynamo_handler.update_job(job.get('job_name'), {'endpoint_status': 'Failed'})
-            else:
-                pass
-            print(endpoint)
-
-
-# if __name__ == '__main__':
-#     get_jobs_in_progress()
+import json
+import maya
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+from sagemaker_svc_wrapper.configs.settings import SYS_CONFIG
+from sagemaker_svc_wrapper.configs import metrics
+from sagemaker_svc_wrapper.handlers import dynamo_handler, sagemaker_handler, util_handler, autoscaling_handler, \
+    sweep_handler, job_handler
+from cron import reconciler
+
+IN_FLIGHT_STATUSES = ['Creating', 'Updating']
+TRAINING_STATUS = 'Training'
+TRAINING_DONE_STATUSES = ['Completed', 'Failed', 'Stopped']
+TRANSFORM_STATUS = 'Transforming'
+TRANSFORM_DONE_STATUSES = ['Completed', 'Failed', 'Stopped']
+# job types tracked by a sagemaker job status, not an endpoint
+JOB_STATUS_TYPES = {
+    'Train': TRAINING_STATUS,
+    'Transform': TRANSFORM_STATUS,
+}
+# seconds subtracted from the earliest queued job when filtering list calls by creation time
+CREATION_TIME_SLACK = 300
+
+
+def recorded_config(endpoint_name):
+    """
+    endpoint config variants recorded at deployment, [] for endpoints without a record
+    """
+    return json.loads(dynamo_handler.get_endpoint(endpoint_name).get('endpoint_config') or '[]')
+
+
+def promote_job(job, throttle):
+    """
+    job endpoint is InService: point project model and project to the job, retire previous model.
+    every step is a conditional UpdateItem so concurrent ticks and api calls cannot undo each other
+        :param job: job item
+        :param throttle: AdaptiveThrottle for sagemaker calls
+    """
+    # update job status, nothing to do when another writer already moved the job on
+    if not dynamo_handler.update_job(job.get('job_name'), {'endpoint_status': 'InService'}, forward_only=True):
+        return
+
+    # autoscaling needs the endpoint InService
+    throttle.call(autoscaling_handler.apply_endpoint_scaling, job.get('job_name'),
+                  recorded_config(job.get('job_name')))
+
+    # swap project model latest, the replaced pointer comes back with the same call
+    replaced = dynamo_handler.update_project_model(job.get('project_name'), job.get('variant_name'),
+                                                   {'latest_model': job.get('job_name')},
+                                                   return_values='UPDATED_OLD')
+    # update project pointer before the previous endpoint goes, the invoke proxy resolves through it.
+    # a dedicated endpoint takes no TargetModel, one left from multi model hosting is cleared
+    dynamo_handler.update_project(job.get('project_name'), {'serving_endpoint': job.get('job_name'),
+                                                            'target_model': None})
+    #retire existing model
+    previous_model = replaced.get('latest_model')
+    if previous_model and previous_model != job.get('job_name'):
+        previous_job = dynamo_handler.get_job(previous_model)
+        if previous_job.get('target_model'):
+            # the project moved over from a multi model endpoint, only its artifact goes
+            job_handler.delete_target_model(previous_job)
+        else:
+            throttle.call(autoscaling_handler.remove_endpoint_scaling, previous_model,
+                          recorded_config(previous_model))
+            throttle.call(sagemaker_handler.delete_endpoint, previous_model)
+        dynamo_handler.update_job(previous_model, {'endpoint_status': 'Retired'}, forward_only=True)
+
+
+def reschedule_child(job):
+    """
+    sweep child claimed for training without a training job, e.g. the submitting lambda timed out in between.
+    claims older than CREATION_TIME_SLACK go back to Scheduled, the next sweep pass submits them with resume
+        :param job: child job item
+        :return: endpoint_status of the child
+    """
+    rescheduled = dynamo_handler.update_job(
+        job.get('job_name'), {'endpoint_status': sweep_handler.SCHEDULED_STATUS},
+        condition=Attr('endpoint_status').eq(TRAINING_STATUS) &
+        Attr('time_updated').lt(maya.now().epoch - CREATION_TIME_SLACK))
+    return sweep_handler.SCHEDULED_STATUS if rescheduled else job.get('endpoint_status')
+
+
+def reconcile_training_job(job, throttle):
+    status = job.get('observed_status')
+    if status is None:
+        try:
+            status = throttle.call(sagemaker_handler.describe_training_job,
+                                   job.get('job_name')).get('TrainingJobStatus')
+        except ClientError as error:
+            if job.get('parent_job') and sagemaker_handler.resource_missing(error):
+                return reschedule_child(job)
+            raise
+    if status in TRAINING_DONE_STATUSES:
+        updated = dynamo_handler.update_job(job.get('job_name'), {'endpoint_status': status}, forward_only=True)
+        if updated and job.get('parent_job'):
+            # a slot of the sweep is free
+            sweep_handler.schedule_sweep(job['parent_job'], throttle)
+    return status
+
+
+def reconcile_transform_job(job, throttle):
+    status = job.get('observed_status')
+    if status is None:
+        status = throttle.call(sagemaker_handler.describe_transform_job, job.get('job_name')).get('TransformJobStatus')
+    if status in TRANSFORM_DONE_STATUSES:
+        dynamo_handler.update_job(job.get('job_name'), {'endpoint_status': status}, forward_only=True)
+    return status
+
+
+def reconcile_job(job, throttle):
+    """
+    sync one in-flight job with sagemaker,
+    uses observed_status from a bulk listing when present, describes the job otherwise
+        :param job: job item
+        :param throttle: AdaptiveThrottle for sagemaker calls
+    """
+    if job.get('job_type') == 'Train':
+        return reconcile_training_job(job, throttle)
+    if job.get('job_type') == 'Transform':
+        return reconcile_transform_job(job, throttle)
+    if job.get('job_type') == 'Sweep':
+        return sweep_handler.schedule_sweep(job.get('job_name'), throttle)
+
+    status = job.get('observed_status')
+    if status is None:
+        status = throttle.call(sagemaker_handler.describe_endpoint, job.get('job_name')).get('EndpointStatus')
+    elif status == 'Failed':
+        # describe_endpoint cleans up failed endpoints, bulk listing does not
+        throttle.call(sagemaker_handler.delete_endpoint, job.get('job_name'))
+
+    if status == 'InService':
+        promote_job(job, throttle)
+    elif status == 'Failed':
+        # update job status
+        dynamo_handler.update_job(job.get('job_name'), {'endpoint_status': 'Failed'}, forward_only=True)
+    elif status in IN_FLIGHT_STATUSES and status != job.get('endpoint_status'):
+        dynamo_handler.update_job(job.get('job_name'), {'endpoint_status': status})
+    return status
+
+
+def list_in_flight_jobs():
+    statuses = IN_FLIGHT_STATUSES + list(JOB_STATUS_TYPES.values()) + [sweep_handler.SWEEP_STATUS]
+    return [job for status in statuses for job in dynamo_handler.list_jobs_by_status(status)]
+
+
+def _earliest_creation_time(jobs):
+    timestamps = [int(job['timestamp_queued']) for job in jobs if job.get('timestamp_queued')]
+    if len(timestamps) < len(jobs) or not timestamps:
+        return None
+    return min(timestamps) - CREATION_TIME_SLACK
+
+
+def bulk_changed_jobs(jobs, throttle):
+    """
+    diff job records against paged endpoint and training job listings,
+    keeps only jobs whose status changed. jobs missing from a listing are kept without observed_status
+    so they fall back to a describe call, sweeps are not listed and always kept for a scheduling pass
+        :param jobs: in-flight job items
+        :param throttle: AdaptiveThrottle for sagemaker calls
+    """
+    training_jobs = [job for job in jobs if job.get('job_type') == 'Train']
+    transform_jobs = [job for job in jobs if job.get('job_type') == 'Transform']
+    endpoint_jobs = [job for job in jobs if job.get('job_type') not in JOB_STATUS_TYPES
+                     and job.get('job_type') != 'Sweep']
+
+    observed = {}
+    if endpoint_jobs:
+        observed.update(throttle.call(sagemaker_handler.list_endpoint_statuses,
+                                      creation_time_after=_earliest_creation_time(endpoint_jobs)))
+    if training_jobs:
+        observed.update(throttle.call(sagemaker_handler.list_training_job_statuses,
+                                      creation_time_after=_earliest_creation_time(training_jobs)))
+    if transform_jobs:
+        observed.update(throttle.call(sagemaker_handler.list_transform_job_statuses,
+                                      creation_time_after=_earliest_creation_time(transform_jobs)))
+
+    changed = []
+    for job in jobs:
+        status = observed.get(job.get('job_name'))
+        if status is None:
+            changed.append(job)
+        elif status == 'InProgress' and job.get('job_type') in JOB_STATUS_TYPES:
+            # still running, recorded as Training or Transforming
+            continue
+        elif status != job.get('endpoint_status'):
+            changed.append(dict(job, observed_status=status))
+    return changed
+
+
+def jobs_update(event=None, context=None):
+    """
+    scheduled status pass over in-flight jobs, resumes from the checkpoint of an unfinished pass
+        :param event: scheduled event
+        :param context: lambda context
+    """
+    with metrics.scope('cron jobs_update'):
+        deadline = reconciler.deadline_from(context, SYS_CONFIG.cron_time_budget_seconds)
+        throttle = util_handler.AdaptiveThrottle(rate=SYS_CONFIG.sagemaker_calls_per_second)
+
+        jobs = list_in_flight_jobs()
+        if SYS_CONFIG.cron_mode == 'bulk':
+            jobs = bulk_changed_jobs(jobs, throttle)
+        checkpoint = dynamo_handler.get_checkpoint(SYS_CONFIG.cron_checkpoint_name)
+        jobs = reconciler.resume_order(jobs, checkpoint)
+
+        # workers report their aws calls to this tick
+        engine = reconciler.Reconciler(metrics.propagate(lambda job: reconcile_job(job, throttle)),
+                                       max_workers=SYS_CONFIG.cron_max_workers)
+        result = engine.run(jobs, deadline)
+
+        if result.pending or checkpoint:
+            dynamo_handler.save_checkpoint(SYS_CONFIG.cron_checkpoint_name, result.pending)
+        print(f'jobs reconciled: {len(result.reconciled)}, failed: {len(result.failed)}, '
+              f'pending: {len(result.pending)}, throttled: {throttle.throttled}')
+    return result
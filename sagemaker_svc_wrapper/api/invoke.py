@@ -0,0 +1,46 @@
+from flask import request, Response
+from flask_restplus import Resource, Namespace
+from botocore.exceptions import ClientError
+from ..handlers import runtime_handler
+
+invoke_ns = Namespace('invoke', description='inference proxy to the serving endpoint of a project',
+                      strict_slashes=False)
+
+CUSTOM_ATTRIBUTES_HEADER = 'X-Amzn-SageMaker-Custom-Attributes'
+DEFAULT_CONTENT_TYPE = 'application/json'
+
+invoke_parser = invoke_ns.parser()
+invoke_parser.add_argument('variant', type=str, location='args',
+                           help='production variant to invoke, weighted routing without')
+
+
+@invoke_ns.route('/<string:project_name>')
+class Invoke(Resource):
+    @staticmethod
+    @invoke_ns.expect(invoke_parser)
+    def post(project_name):
+        """
+        forward the request body to the project serving endpoint, content type and accept pass through
+        """
+        try:
+            result = runtime_handler.invoke(project_name, request.get_data(),
+                                            request.content_type or DEFAULT_CONTENT_TYPE,
+                                            accept=request.headers.get('Accept'),
+                                            variant_name=request.args.get('variant'),
+                                            custom_attributes=request.headers.get(CUSTOM_ATTRIBUTES_HEADER))
+        except ClientError as error:
+            # model errors come back as 424, throttling as 429, keep the status sagemaker gave
+            status_code = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') or 502
+            return {'message': error.response.get('Error', {}).get('Message'),
+                    'code': error.response.get('Error', {}).get('Code')}, status_code
+        except runtime_handler.BatchSplitError as error:
+            return {'message': str(error)}, 502
+        if result is None:
+            return {'message': f'project {project_name} has no serving endpoint'}, 404
+
+        headers = {'X-Invoked-Endpoint': result.endpoint_name}
+        if result.variant_name:
+            headers['X-Invoked-Variant'] = result.variant_name
+        if result.custom_attributes:
+            headers[CUSTOM_ATTRIBUTES_HEADER] = result.custom_attributes
+        return Response(result.body, content_type=result.content_type, headers=headers)
@@ -1,29 +1,40 @@
 import json
-from enum import Enum
+from collections import namedtuple
 import requests
-import maya
-from flask import request, abort
-from flask_restplus import Resource, Namespace, fields
-from ..handlers import sagemaker_handler, dynamo_handler
+from flask import request, abort, Response
+from werkzeug.http import is_resource_modified
+from flask_restplus import Resource, Namespace, fields, inputs
+from ..configs.settings import SYS_CONFIG
+from ..handlers import sagemaker_handler, dynamo_handler, util_handler, job_handler, sweep_handler
+from ..handlers.job_handler import JobStatus, JobType
 
-class JobStatus(Enum):
-    """
-    job status
-    """
-    Inactive = 0
-    Running = 1
-    Ready = 2
-
-class JobType(Enum):
-    Train = "Train"
-    Serve = "Serve"
+job_ns = Namespace('job', description='sagemaker training job', strict_slashes=False)
 
+INPUT_MODES = ['File', 'Pipe', 'FastFile']
+DISTRIBUTION_TYPES = ['FullyReplicated', 'ShardedByS3Key']
+COMPRESSION_TYPES = ['None', 'Gzip']
 
-job_ns = Namespace('job', description='sagemaker training job', strict_slashes=False)
+TRAIN_CHANNEL = job_ns.model('train_channel', model={
+    'channel_name': fields.String(required=True, description='e.g. train, validation, test'),
+    'data_input': fields.String(required=True, description='s3 prefix or manifest file of the channel'),
+    'input_mode': fields.String(required=False, enum=INPUT_MODES, description='overrides the job input_mode'),
+    'distribution': fields.String(required=False, enum=DISTRIBUTION_TYPES),
+    'compression': fields.String(required=False, enum=COMPRESSION_TYPES),
+    'content_type': fields.String(required=False),
+    'record_wrapper': fields.String(required=False, enum=['None', 'RecordIO'], description='RecordIO for pipe mode'),
+    's3_data_type': fields.String(required=False, enum=['S3Prefix', 'ManifestFile']),
+})
 
 TRAIN_JOB_PAYLOAD = job_ns.model('job', model={
     'project_name': fields.String(required=True, description='project name'),
-    'data_input': fields.String(required=True, description='input data s3 path for training'),
+    'data_input': fields.String(required=False, description='input data s3 path of the train channel'),
+    'channels': fields.List(fields.Nested(TRAIN_CHANNEL), required=False,
+                            description='named input channels, instead of data_input'),
+    'input_mode': fields.String(required=False, enum=INPUT_MODES,
+                                description='Pipe and FastFile stream from s3 instead of copying it first'),
+    'distribution': fields.String(required=False, enum=DISTRIBUTION_TYPES,
+                                  description='ShardedByS3Key splits the objects across instances'),
+    'compression': fields.String(required=False, enum=COMPRESSION_TYPES),
     'model_output': fields.String(required=False, description='trained model output s3 path'),
     'image_train': fields.String(required=False),
     'spec_train': fields.Raw(required=False),
@@ -32,6 +43,33 @@ TRAIN_JOB_PAYLOAD = job_ns.model('job', model={
     # 'hyperparameters': fields.Raw(required=False),
 })
 
+SWEEP_OBJECTIVE = job_ns.model('sweep_objective', model={
+    'metric_name': fields.String(required=True, description='final metric reported by the training jobs'),
+    'type': fields.String(required=False, enum=sweep_handler.OBJECTIVE_TYPES, default='Minimize'),
+    'regex': fields.String(required=False, description='parses the metric from the training logs'),
+})
+
+SWEEP_JOB_PAYLOAD = job_ns.model('sweep_job', model={
+    'strategy': fields.String(required=False, enum=sweep_handler.STRATEGIES, default='random'),
+    'search_space': fields.Raw(required=True, description='hyperparameter name to a list of values or '
+                                                          '{"type", "min", "max", "scale"}'),
+    'objective': fields.Nested(SWEEP_OBJECTIVE, required=True),
+    'max_jobs': fields.Integer(required=False, min=1, max=sweep_handler.MAX_SWEEP_JOBS,
+                               description='training jobs of random and bayesian sweeps, grids run every point'),
+    'max_parallel_jobs': fields.Integer(required=False, min=1,
+                                        description='training jobs of the sweep at a time, '
+                                                    'never more than the free account slots'),
+    'seed': fields.Integer(required=False),
+    'hyperparameters': fields.Raw(required=False, description='fixed hyperparameters of every training job'),
+    'data_input': fields.String(required=False, description='input data s3 path of the train channel'),
+    'channels': fields.List(fields.Nested(TRAIN_CHANNEL), required=False),
+    'input_mode': fields.String(required=False, enum=INPUT_MODES),
+    'model_output': fields.String(required=False, description='trained model output s3 path'),
+    'image_train': fields.String(required=False),
+    'spec_train': fields.Raw(required=False),
+    'variant_name': fields.String(required=True, default='default'),
+})
+
 SERVE_JOB_PAYLOAD = job_ns.model('job', model={
     'image_serve': fields.String(required=True, description='serving docker container from ECS'),
     'model_artifacts': fields.String(required=False, description='saved model artifacts'),
@@ -39,46 +77,110 @@ SERVE_JOB_PAYLOAD = job_ns.model('job', model={
     'variant_name': fields.String(required=True, default='default'),
 })
 
+TRANSFORM_JOB_PAYLOAD = job_ns.model('transform_job', model={
+    'data_input': fields.String(required=True, description='s3 prefix of the records to score'),
+    'data_output': fields.String(required=True, description='s3 path for the results'),
+    'variant_name': fields.String(required=True, default='default', description='scored with its latest_model'),
+    'instance_type': fields.String(required=False, description='defaults to the spec_serve InstanceType'),
+    'instance_count': fields.Integer(required=False, min=1, default=1),
+    'batch_strategy': fields.String(required=False, enum=['MultiRecord', 'SingleRecord'], default='MultiRecord',
+                                    description='MultiRecord packs records into payloads up to max_payload_mb'),
+    'max_payload_mb': fields.Integer(required=False, min=0, max=100, description='payload size per invocation'),
+    'max_concurrent_transforms': fields.Integer(required=False, min=0,
+                                                description='parallel invocations per instance'),
+    'split_type': fields.String(required=False, enum=['None', 'Line', 'RecordIO'], default='Line',
+                                description='how input files are cut into records'),
+    'content_type': fields.String(required=False, description='mime type of the records'),
+    'accept': fields.String(required=False, description='mime type of the results'),
+    'assemble_with': fields.String(required=False, enum=['None', 'Line']),
+    'env_transform': fields.Raw(required=False),
+})
+
 
-@job_ns.route('/<string:job_name>', defaults={'job_name':''})
+Validator = namedtuple('Validator', ['etag', 'last_modified'])
+
+
+def with_validators(response, validator):
+    response.set_etag(validator.etag)
+    if validator.last_modified:
+        response.last_modified = validator.last_modified
+    return response
+
+
+def conditional_get(cache_key, read):
+    """
+    json item response with ETag and Last-Modified. a conditional request matching the cached validators
+    is answered 304 without reading or serializing the item
+        :param cache_key: dynamo_handler.validator_cache key of the item
+        :param read: function returning the dynamo item, {} when missing
+        :return: flask response, None when the item is missing
+    """
+    validator = dynamo_handler.validator_cache.get(cache_key)
+    if validator and not is_resource_modified(request.environ, etag=validator.etag,
+                                              last_modified=validator.last_modified):
+        return with_validators(Response(status=304), validator)
+
+    item = read()
+    if not item:
+        return None
+    last_modified = util_handler.item_last_modified(item)
+    body = json.dumps(util_handler.dynamo_item_json_parser(item))
+    validator = Validator(util_handler.body_etag(body), last_modified)
+    dynamo_handler.validator_cache.set(cache_key, validator)
+    response = with_validators(Response(body, mimetype='application/json'), validator)
+    # validators expired from the cache can still match the fresh item
+    return response.make_conditional(request)
+
+
+@job_ns.route('/<string:job_name>')
 class Job(Resource):
     """
     """
     def get(self, job_name):
-        response = dynamo_handler.get_job(job_name)
-        if response:
+        response = conditional_get(('job', job_name), lambda: dynamo_handler.get_job(job_name))
+        if response is not None:
             return response
         abort(404)
 
 
+submit_parser = job_ns.parser()
+submit_parser.add_argument('async', type=inputs.boolean, location='args',
+                           help='queue the job and return 202, sagemaker calls run in the job queue worker')
+
+
+def is_async():
+    value = submit_parser.parse_args().get('async')
+    return SYS_CONFIG.async_submission if value is None else value
+
+
+def job_error_response(error):
+    if error.body is not None:
+        return error.body, error.status_code
+    return abort(error.status_code, error.message)
+
+
+def queued_response(job_type, project_name, job):
+    job_name = job_handler.queue_job(job_type, project_name, job)
+    return {'job_name': job_name, 'endpoint_status': 'Queued'}, 202
+
+
 @job_ns.route('/<string:project_name>/train')
 class JobTrain(Resource):
     """"""
     # NOTE: WIP
     @staticmethod
-    @job_ns.expect(TRAIN_JOB_PAYLOAD, validate=True)
+    @job_ns.expect(TRAIN_JOB_PAYLOAD, submit_parser, validate=True)
     def post(project_name):
         job_request = request.json
         project_name = job_request['project_name']
-        project_description = dynamo_handler.get_project_model(project_name)
-        if not job_request.get('image_train'):
-            job_request['image_train'] = json.loads(project_description.get('image_train'))
-        if not job_request.get('spec_train'):
-            job_request['spec_train'] = json.loads(project_description.get('spec_train'))
-        
-        timestamp = maya.now().epoch
-        job_type = JobType.Train.value
-        job_request['project_name'] = project_name
-        job_request['timestamp_queued'] = timestamp
-        job_name = f'{project_name}-{job_type}-{timestamp}'
-
-        sagemaker_handler.create_training_job(job_name=job_name,
-                                              image_train=job_request['image_train'],
-                                              spec_train=job_request['spec_train'],
-                                              input_data_location=job_request['data_input'],
-                                              output_model_location=job_request['model_output'],
-                                              hyperparameters=job_request.get('hyperparameters', {}),)
-        job_request['status'] = JobStatus.Running.value
+        try:
+            job_request = job_handler.prepare_train_job(project_name, job_request)
+            if is_async():
+                return queued_response(JobType.Train.value, project_name, job_request)
+            job_request.update(job_handler.submit_train_job(job_request))
+        except job_handler.JobError as error:
+            return job_error_response(error)
+        job_request.pop('project_name')
 
         job_name = dynamo_handler.log_job(project_name, JobType.Train.value, **job_request)
         if job_name:
@@ -90,87 +192,15 @@ class JobTrain(Resource):
 class JobServe(Resource):
     """"""
     @staticmethod
-    @job_ns.expect(SERVE_JOB_PAYLOAD, validate=True)
+    @job_ns.expect(SERVE_JOB_PAYLOAD, submit_parser, validate=True)
     def post(project_name):
-
-        job_request = request.json
-        variant_name = job_request.get('variant_name', 'default')
-        # formated job name versioned by timestamp
-        timestamp = maya.now().epoch
-        job_type = JobType.Serve.value
-        job_name = f'{project_name}-{job_type}-{timestamp}'
-
-        project_model_settings = dynamo_handler.get_project_model(project_name, variant_name)
-        if not project_model_settings:
-            abort(400, f'no model: {project_name} found')
-
-        project = dynamo_handler.get_project(project_name)
-        if not project:
-            abort(400, f'no project: {project_name} found')
-
-        if not job_request.get('image_serve') and project_model_settings.get('image_serve'):
-            job_request['image_serve'] = json.loads(project_model_settings['image_serve'])
-        if not job_request.get('env_serve') and project_model_settings.get('env_serve'):
-            job_request['env_serve'] = json.loads(project_model_settings['env_serve'])
-
-        # creating model
-        job_request['timestamp_queued'] = timestamp
-        job_request['job_name'] = job_name
-
-
-        sagemaker_model = sagemaker_handler.create_model(job_name,
-                                                         job_request['image_serve'],
-                                                         model_artifacts=job_request.get('model_artifacts'),
-                                                         enviroment_variable=job_request.get('env_serve')
-                                                        )
-        if not sagemaker_model or not sagemaker_model.arn:
-            return "unable to create model", 400
-
-        variants = json.loads(project['variants'])
-        config_variants = []
-
-        if project.get('is_auto_deploy') and (variant_name in variants):
-            #deploy is required
-            for variant, weight in variants.items():
-                project_model_settings = dynamo_handler.get_project_model(project_name, variant)
-                if project_model_settings.get('spec_serve'):
-                    job_spec_serve = json.loads(project_model_settings['spec_serve'])
-                    job_spec_serve['VariantName'] = variant
-                    job_spec_serve['InitialVariantWeight'] = weight
-                    if variant == variant_name:
-                        job_spec_serve['ModelName'] = sagemaker_model.model_name
-                        config_variants.append(job_spec_serve)
-                    elif project_model_settings.get('latest_model'):
-                        job_spec_serve['ModelName'] = project_model_settings['latest_model']
-                        config_variants.append(job_spec_serve)
-
-        if config_variants:
-            endpoint_config_arn = sagemaker_handler.create_endpoint_config(job_name, config_variants)
-            if not endpoint_config_arn:
-                return abort(400, 'endpoint config failed')
-            else:
-                job_request['endpoint_config_arn'] = endpoint_config_arn.arn
-                job_request['endpoint_config'] = json.dumps(config_variants)
-            # check exiting endpoint status
-            endpoint_status = sagemaker_handler.describe_endpoint(job_name)
-            if endpoint_status:
-                status = endpoint_status.get('EndpointStatus')
-                if status in ['Creating', 'Updating']:
-                    #NOTE: when sagemaker endpoint is in update or creating status, 
-                    #endpoints are unable to respond to other command
-                    return {'status': f'endpoint is {status}'}, 400
-                #update existing
-                endpoint_status = sagemaker_handler.update_endpoint(job_name)
-            else:
-                endpoint_status = sagemaker_handler.create_endpoint(job_name)
-
-            if endpoint_status:
-                job_request['endpoint_status'] = endpoint_status.get('EndpointStatus')
-        else:
-            #TODO: TBD when to promote to project model level
-            # job_request['endpoint_status'] = 'ModelCreatedOnly'
-            # dynamo_handler.update_project_model(project_name, variant_name, {'latest_model': job_name})
-            pass
+        try:
+            job_request, project, project_models = job_handler.prepare_serve_job(project_name, request.json)
+            if is_async():
+                return queued_response(JobType.Serve.value, project_name, job_request)
+            job_request.update(job_handler.submit_serve_job(project_name, job_request, project, project_models))
+        except job_handler.JobError as error:
+            return job_error_response(error)
 
         response = dynamo_handler.log_job(project_name, JobType.Serve.value, **job_request)
         if response:
@@ -179,6 +209,47 @@ class JobServe(Resource):
         return abort(500, 'somthing went wrong in creating endpoint')
 
 
+@job_ns.route('/<string:project_name>/transform')
+class JobTransform(Resource):
+    """"""
+    @staticmethod
+    @job_ns.expect(TRANSFORM_JOB_PAYLOAD, submit_parser, validate=True)
+    def post(project_name):
+        try:
+            job_request = job_handler.prepare_transform_job(project_name, request.json)
+            if is_async():
+                return queued_response(JobType.Transform.value, project_name, job_request)
+            job_request.update(job_handler.submit_transform_job(job_request))
+        except job_handler.JobError as error:
+            return job_error_response(error)
+
+        job_name = dynamo_handler.log_job(project_name, JobType.Transform.value, **job_request)
+        if job_name:
+            return {'job_name': job_name, 'endpoint_status': job_request['endpoint_status']}, 201
+        abort(500, "job not created")
+
+
+@job_ns.route('/<string:project_name>/sweep')
+class JobSweep(Resource):
+    """"""
+    @staticmethod
+    @job_ns.expect(SWEEP_JOB_PAYLOAD, submit_parser, validate=True)
+    def post(project_name):
+        try:
+            sweep = sweep_handler.create_sweep(project_name, request.json)
+        except job_handler.JobError as error:
+            return job_error_response(error)
+        response = {'job_name': sweep['job_name'], 'endpoint_status': sweep['endpoint_status'],
+                    'max_jobs': sweep['max_jobs']}
+        if is_async():
+            # the status cron runs the first scheduling pass
+            return response, 202
+
+        throttle = util_handler.AdaptiveThrottle(rate=SYS_CONFIG.sagemaker_calls_per_second)
+        response['endpoint_status'] = sweep_handler.schedule_sweep(sweep['job_name'], throttle)
+        return response, 201
+
+
 @job_ns.route('/rerun')
 class JobRerun(Resource):
     @staticmethod
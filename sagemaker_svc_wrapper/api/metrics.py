@@ -0,0 +1,41 @@
+from flask import request
+from flask_restplus import Resource, Namespace
+from ..configs import metrics, profiling
+from ..handlers.cache_handler import cache_stats
+
+metrics_ns = Namespace('metrics', description='aws call and request metrics of this container', strict_slashes=False)
+
+
+def begin_request():
+    metrics.begin(f'{request.method} {request.url_rule or request.path}')
+
+
+def end_request(response):
+    """
+    after_request hook, logs one json line with the aws calls the request made
+        :param response:
+    """
+    metrics.end(status=response.status_code)
+    return response
+
+
+def init_app(app):
+    """
+    register per request instrumentation on the flask app
+        :param app:
+    """
+    app.before_request(begin_request)
+    app.after_request(end_request)
+
+
+@metrics_ns.route('')
+class Metrics(Resource):
+    def get(self):
+        """
+        latency histograms by aws operation and by route, cache counters and startup timings,
+        for this container since it started
+        """
+        snapshot = metrics.snapshot()
+        snapshot['caches'] = cache_stats()
+        snapshot['startup_ms'] = profiling.TIMINGS
+        return snapshot
@@ -1,6 +1,7 @@
 from flask import request, abort
 from flask_restplus import Resource, Namespace, fields
 from ..handlers import dynamo_handler, util_handler
+from .jobs import conditional_get
 
 project_model_ns = Namespace('models', description='models per project', strict_slashes=False)
 
@@ -10,12 +11,33 @@ spec_train = project_model_ns.model('train_spec', model={
     'InstanceType': fields.String(required=True, description='instance type'),
     'VolumeSizeInGB': fields.Integer(required=True, default=50),
     'HyperParameters': fields.Raw(required=False),
+    'TrainingInputMode': fields.String(required=False, enum=['File', 'Pipe', 'FastFile'], default='File'),
+    'S3DataDistributionType': fields.String(required=False, enum=['FullyReplicated', 'ShardedByS3Key'],
+                                            default='FullyReplicated'),
+    'CompressionType': fields.String(required=False, enum=['None', 'Gzip'], default='None'),
+    })
+
+
+autoscaling_spec = project_model_ns.model('autoscaling_spec', model={
+    'MinCapacity': fields.Integer(required=True, min=1, default=1),
+    'MaxCapacity': fields.Integer(required=True, min=1, default=2),
+    'TargetInvocationsPerInstance': fields.Float(required=True, description='invocations per instance per minute'),
+    'ScaleInCooldown': fields.Integer(required=False, min=0, description='seconds'),
+    'ScaleOutCooldown': fields.Integer(required=False, min=0, description='seconds'),
     })
 
 
 spec_serve = project_model_ns.model('serve_spec', model={
     'InitialInstanceCount': fields.Integer(required=True, default=1),
     'InstanceType': fields.String(required=True, description='instance type', default='ml.m4.xlarge'),
+    'AutoScaling': fields.Nested(autoscaling_spec, required=False,
+                                 description='instance count bounds, registered once the endpoint is InService'),
+    })
+
+
+batching_spec = project_model_ns.model('batching_spec', model={
+    'max_batch_size': fields.Integer(required=True, min=1, default=16, description='records per batched invocation'),
+    'max_wait_ms': fields.Integer(required=True, min=0, default=5, description='longest wait for a batch to fill'),
     })
 
 
@@ -25,6 +47,8 @@ model_payload = project_model_ns.model('model', model={
     'spec_serve': fields.Nested(required=False, model=spec_serve, description='serving'),
     'env_train': fields.Raw(required=False, description='training enviroment variable'),
     'env_serve': fields.Raw(required=False, description='serving enviroment variable'),
+    'batching': fields.Nested(batching_spec, required=False,
+                              description='merge concurrent /invoke requests into batched invocations'),
     })
 
 
@@ -40,6 +64,9 @@ class ProjectModel(Resource):
         if not util_handler.is_valid_sagemaker_naming(project_name):
             abort(400, "bad endpoint name")
         new_project_model = request.json
+        scaling = (new_project_model.get('spec_serve') or {}).get('AutoScaling')
+        if scaling and scaling['MinCapacity'] > scaling['MaxCapacity']:
+            abort(400, "AutoScaling MinCapacity above MaxCapacity")
         new_project_model['project_name'] = project_name
         new_project_model['variant_name'] = new_project_model.get('variant_name', 'default')
         response = dynamo_handler.create_project_model(**new_project_model)
@@ -54,5 +81,8 @@ class ProjectModelDetails(Resource):
     def get(project_name, variant_name):
         if not util_handler.is_valid_sagemaker_naming(project_name):
             abort(400, "bad endpoint name")
-        response = dynamo_handler.get_project_model(project_name, variant_name=variant_name)
-        return util_handler.dynamo_item_json_parser(response or {}), 200
+        response = conditional_get(('project_model', project_name, variant_name),
+                                   lambda: dynamo_handler.get_project_model(project_name, variant_name=variant_name))
+        if response is not None:
+            return response
+        return {}, 200
@@ -1,6 +1,7 @@
-from flask import request, abort
-from flask_restplus import Resource, Namespace, fields
-from ..handlers import dynamo_handler, util_handler
+from flask import request, abort, Response, stream_with_context
+from flask_restplus import Resource, Namespace, fields, inputs
+from ..handlers import dynamo_handler, util_handler, job_handler
+from .jobs import submit_parser, is_async, job_error_response, conditional_get
 
 project_ns = Namespace('project', description='ML pipeline service', strict_slashes=False)
 
@@ -9,37 +10,130 @@ project_payload = project_ns.model('project', model={
     'variants': fields.Raw(),
     'is_auto_deploy': fields.Boolean(required=True, default=True),
     'is_active': fields.Boolean(required=True, default=True),
+    'hosting_mode': fields.String(enum=[mode.value for mode in job_handler.HostingMode],
+                                  default=job_handler.HostingMode.Dedicated.value,
+                                  description='MultiModel serves the project from a shared endpoint'),
+    'multi_model_endpoint': fields.String(description='shared endpoint of a MultiModel project, '
+                                                      'the service default without'),
     })
 
+traffic_payload = project_ns.model('traffic', model={
+    'variants': fields.Raw(required=True, description='variant name to traffic weight'),
+    'instance_counts': fields.Raw(required=False, description='variant name to instance count'),
+    })
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+MAX_PAGE_SIZE = 1000
+
+list_parser = project_ns.parser()
+list_parser.add_argument('limit', type=inputs.int_range(1, MAX_PAGE_SIZE), location='args',
+                         help='page size, response becomes {items, next_token}')
+list_parser.add_argument('next_token', type=str, location='args', help='continuation token of previous page')
+list_parser.add_argument('stream', type=inputs.boolean, location='args', default=False,
+                         help='stream all items as newline delimited json')
+
+job_list_parser = list_parser.copy()
+job_list_parser.add_argument('since', type=util_handler.epoch_seconds, location='args',
+                             help='jobs queued at or after, epoch seconds or iso 8601')
+job_list_parser.add_argument('until', type=util_handler.epoch_seconds, location='args',
+                             help='jobs queued at or before, epoch seconds or iso 8601')
+job_list_parser.add_argument('job_type', choices=[job_type.value for job_type in job_handler.JobType],
+                             location='args')
+job_list_parser.add_argument('variant_name', type=str, location='args')
+job_list_parser.add_argument('order', choices=['desc', 'asc'], default='desc', location='args',
+                             help='by time queued, newest first by default')
+
+
+def list_response(list_all, list_page):
+    """
+    paged, streamed or full listing depending on request args
+        :param list_all: function(start_key) returning an item generator
+        :param list_page: function(limit, start_key) returning (items, last key)
+    """
+    args = list_parser.parse_args()
+    try:
+        start_key = util_handler.decode_page_token(args['next_token'])
+    except ValueError:
+        abort(400, 'bad next_token')
+
+    if args['stream'] or request.accept_mimetypes.best == NDJSON_MIMETYPE:
+        return Response(stream_with_context(util_handler.ndjson_lines(list_all(start_key))),
+                        mimetype=NDJSON_MIMETYPE)
+
+    if not args['limit'] and not start_key:
+        return [util_handler.dynamo_item_json_parser(r) for r in list_all(None)]
+
+    items, last_key = list_page(args['limit'] or MAX_PAGE_SIZE, start_key)
+    return {
+        'items': [util_handler.dynamo_item_json_parser(r) for r in items],
+        'next_token': util_handler.encode_page_token(last_key),
+    }
+
 
 @project_ns.route('/<string:project_name>/jobs')
 class ProjectJobs(Resource):
+    @project_ns.expect(job_list_parser)
     def get(self, project_name):
-        # variant_name = request.args.get('variant_name', 'default')
-        response = dynamo_handler.list_jobs(project_name)
-        return [util_handler.dynamo_item_json_parser(r) for r in response]
+        args = job_list_parser.parse_args()
+        filters = {name: args[name] for name in ('since', 'until', 'job_type', 'variant_name')}
+        filters['newest_first'] = args['order'] == 'desc'
+        return list_response(
+            lambda start_key: dynamo_handler.list_jobs(project_name, start_key=start_key, **filters),
+            lambda limit, start_key: dynamo_handler.list_jobs_page(project_name, limit, start_key, **filters))
 
 
 @project_ns.route('/<string:project_name>/models')
 class ProjectModels(Resource):
+    @project_ns.expect(list_parser)
     def get(self, project_name):
         # variant_name = request.args.get('variant_name', 'default')
-        response = dynamo_handler.list_project_models(project_name)
-        return [util_handler.dynamo_item_json_parser(r) for r in response]
+        return list_response(lambda start_key: dynamo_handler.list_project_models(project_name, start_key=start_key),
+                             lambda limit, start_key: dynamo_handler.list_project_models_page(project_name, limit, start_key))
+
+
+@project_ns.route('/<string:project_name>/traffic')
+class ProjectTraffic(Resource):
+    @staticmethod
+    @project_ns.expect(traffic_payload, submit_parser, validate=True)
+    def put(project_name):
+        """
+        shift traffic between variants. the live endpoint is updated in place when the variant set is unchanged,
+        a new variant set is rolled out by a serve job (202)
+            :param project_name: project name
+        """
+        try:
+            result = job_handler.shift_traffic(project_name, request.json['variants'],
+                                               request.json.get('instance_counts'))
+            if result['mode'] != 'redeploy':
+                return result, 200
+            job = result.pop('job')
+            if is_async():
+                result['job_name'] = job_handler.queue_job(job_handler.JobType.Serve.value, project_name, job)
+            else:
+                job.update(job_handler.submit_serve_job(project_name, job))
+                result['job_name'] = dynamo_handler.log_job(project_name, job_handler.JobType.Serve.value, **job)
+        except job_handler.JobError as error:
+            return job_error_response(error)
+        return result, 202
 
 
 @project_ns.route('/<string:project_name>')
 class Project(Resource):
     @staticmethod
     def get(project_name):
-        response = dynamo_handler.get_project(project_name)
-        return util_handler.dynamo_item_json_parser(response), 200
+        response = conditional_get(('project', project_name), lambda: dynamo_handler.get_project(project_name))
+        if response is not None:
+            return response
+        return {}, 200
 
     @staticmethod
     @project_ns.expect(project_payload)
     def post(project_name):
         request_item = request.json
-        response_name = dynamo_handler.create_project(project_name, **request_item)
+        try:
+            response_name = dynamo_handler.create_project(project_name, **request_item)
+        except ValueError as error:
+            return abort(400, str(error))
         if response_name:
             return project_name, 200
         return f'unable to create project {project_name}', 400
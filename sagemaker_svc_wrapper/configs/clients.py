@@ -0,0 +1,273 @@
+import importlib.util
+import socket
+import threading
+import time
+from collections import deque
+import boto3
+from botocore.config import Config
+from .settings import SYS_CONFIG
+from . import profiling, metrics
+from .throttling import AdaptiveThrottle, THROTTLING_ERROR_CODES
+
+RETRY_MODES = ('standard', 'adaptive')
+# botocore learnt retry modes in 1.15 and tcp_keepalive in Config in 1.27, the pinned one has neither
+NATIVE_RETRY_MODES = importlib.util.find_spec('botocore.retries') is not None
+NATIVE_KEEPALIVE = 'tcp_keepalive' in Config.OPTION_DEFAULTS
+KEEPALIVE_OPTION = (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+# one boto3 session per process, clients and resources are created on first use
+_lock = threading.RLock()
+_session = None
+_clients = {}
+_resources = {}
+_tables = {}
+# service name to functions run on its client when built, e.g. extra event hooks
+_customizers = {}
+
+
+def client_config(service_name=None):
+    """
+    connection pool, timeouts, retries and keep-alive shared by every client of the process
+        :param service_name: sagemaker-runtime gets short timeouts and a single retry, inference callers wait on it
+    """
+    if SYS_CONFIG.retry_mode not in RETRY_MODES:
+        raise ValueError(f'retry_mode must be one of {", ".join(RETRY_MODES)}, got {SYS_CONFIG.retry_mode}')
+    if service_name == 'sagemaker-runtime':
+        options = dict(connect_timeout=SYS_CONFIG.invoke_connect_timeout_seconds,
+                       read_timeout=SYS_CONFIG.invoke_read_timeout_seconds,
+                       retries={'max_attempts': SYS_CONFIG.invoke_max_retry_attempts})
+    else:
+        options = dict(connect_timeout=SYS_CONFIG.connect_timeout_seconds,
+                       read_timeout=SYS_CONFIG.read_timeout_seconds,
+                       retries={'max_attempts': SYS_CONFIG.max_retry_attempts})
+    if NATIVE_RETRY_MODES:
+        options['retries']['mode'] = SYS_CONFIG.retry_mode
+    if NATIVE_KEEPALIVE:
+        options['tcp_keepalive'] = SYS_CONFIG.tcp_keepalive
+    return Config(max_pool_connections=SYS_CONFIG.max_pool_connections, **options)
+
+
+def enable_keepalive(client):
+    """
+    turn on tcp keep-alive for new connections of a client, older botocore only reads it from ~/.aws/config
+        :param client: botocore client, e.g. resource.meta.client
+    """
+    http_session = client._endpoint.http_session  # pylint: disable=protected-access
+    if KEEPALIVE_OPTION not in http_session._socket_options:  # pylint: disable=protected-access
+        http_session._socket_options = http_session._socket_options + [KEEPALIVE_OPTION]  # pylint: disable=protected-access
+        http_session._manager.connection_pool_kw['socket_options'] = http_session._socket_options  # pylint: disable=protected-access
+    return client
+
+
+class AdaptiveRetries:
+    """
+    client side rate limiting for older botocore, like its adaptive retry mode.
+    calls go out unlimited until a throttling error, then at the rate sent in the last second halved,
+    halved again on throttling and recovering on success, unlimited again once back at max_rate
+        :param max_rate: calls per second at which the limit is lifted
+        :param window: seconds, throttling errors of calls sent within one window halve the rate once
+    """
+    def __init__(self, max_rate, window=0.5):
+        self.max_rate = float(max_rate)
+        self.window = window
+        self.throttle = None
+        self.throttled = 0
+        self._sent = deque()
+        self._last_cut = 0.0
+        self._lock = threading.Lock()
+
+    def before_send(self, **kwargs):
+        throttle = self.throttle
+        if throttle is not None:
+            throttle.acquire()
+        now = time.monotonic()
+        with self._lock:
+            self._sent.append(now)
+            while self._sent[0] < now - 1.0:
+                self._sent.popleft()
+
+    def needs_retry(self, response=None, **kwargs):
+        if response is None:
+            return
+        if response[1].get('Error', {}).get('Code') not in THROTTLING_ERROR_CODES:
+            throttle = self.throttle
+            if throttle is not None:
+                throttle.on_success()
+                if throttle.rate >= self.max_rate:
+                    self.throttle = None
+            return
+        with self._lock:
+            self.throttled += 1
+            now = time.monotonic()
+            if now - self._last_cut < self.window:
+                return
+            self._last_cut = now
+            if self.throttle is None:
+                self.throttle = AdaptiveThrottle(rate=len(self._sent) or 1, max_rate=self.max_rate)
+            throttle = self.throttle
+        throttle.on_throttle()
+
+
+def adaptive_retries(client, max_rate=None):
+    """
+    hook AdaptiveRetries into a client
+        :param client: botocore client, e.g. resource.meta.client
+        :param max_rate: client_max_calls_per_second by default
+    """
+    limiter = AdaptiveRetries(max_rate or SYS_CONFIG.client_max_calls_per_second)
+    events = client.meta.events
+    events.register('before-send.*.*', limiter.before_send, unique_id='adaptive-before-send')
+    events.register('needs-retry.*.*', limiter.needs_retry, unique_id='adaptive-needs-retry')
+    client.meta.adaptive_retries = limiter
+    return client
+
+
+def tune(client):
+    """
+    what client_config can't set on the installed botocore
+        :param client: botocore client, e.g. resource.meta.client
+    """
+    if SYS_CONFIG.tcp_keepalive and not NATIVE_KEEPALIVE:
+        enable_keepalive(client)
+    if SYS_CONFIG.retry_mode == 'adaptive' and not NATIVE_RETRY_MODES:
+        adaptive_retries(client)
+    return client
+
+
+def new_client(service_name, session=None, **kwargs):
+    """
+    tuned and instrumented low level client, not shared
+        :param service_name: e.g. 'sagemaker'
+        :param session: boto3 session, the shared one by default
+        :param kwargs: passed on to session.client, e.g. endpoint_url
+    """
+    session = session or get_session()
+    client = session.client(service_name, config=client_config(service_name), **kwargs)
+    client = metrics.instrument(tune(client))
+    for customize_client in _customizers.get(service_name, []):
+        customize_client(client)
+    return client
+
+
+def get_session():
+    global _session
+    with _lock:
+        if _session is None:
+            with profiling.timed('boto3 session'):
+                _session = boto3.session.Session()
+        return _session
+
+
+def get_client(service_name):
+    """
+    shared low level client, built on first use
+        :param service_name: e.g. 'sagemaker'
+    """
+    client = _clients.get(service_name)
+    if client is None:
+        with _lock:
+            if service_name not in _clients:
+                with profiling.timed(f'client {service_name}'):
+                    _clients[service_name] = new_client(service_name)
+            client = _clients[service_name]
+    return client
+
+
+def get_resource(service_name):
+    """
+    shared resource, built on first use
+        :param service_name: e.g. 'dynamodb'
+    """
+    resource = _resources.get(service_name)
+    if resource is None:
+        with _lock:
+            if service_name not in _resources:
+                with profiling.timed(f'resource {service_name}'):
+                    _resources[service_name] = get_session().resource(service_name, config=client_config())
+                    metrics.instrument(tune(_resources[service_name].meta.client))
+            resource = _resources[service_name]
+    return resource
+
+
+def get_table(table_name):
+    table = _tables.get(table_name)
+    if table is None:
+        with _lock:
+            if table_name not in _tables:
+                _tables[table_name] = get_resource('dynamodb').Table(table_name)
+            table = _tables[table_name]
+    return table
+
+
+def customize(service_name, func):
+    """
+    run func on the client of service_name whenever it is built, registered stand-ins are left alone
+        :param service_name: 
+        :param func: function(client)
+    """
+    with _lock:
+        _customizers.setdefault(service_name, []).append(func)
+
+
+def register(service_name, client=None, resource=None):
+    """
+    replace the client or resource of a service, e.g. with a local stand-in
+        :param service_name: 
+        :param client: 
+        :param resource: 
+    """
+    with _lock:
+        if client is not None:
+            _clients[service_name] = client
+        if resource is not None:
+            _resources[service_name] = resource
+            if service_name == 'dynamodb':
+                _tables.clear()
+
+
+def reset():
+    """
+    drop every client, resource and the session, they are rebuilt on next use
+    """
+    global _session
+    with _lock:
+        _session = None
+        _clients.clear()
+        _resources.clear()
+        _tables.clear()
+
+
+class LazyClient:
+    """
+    module level stand-in for a client, resolves the shared client on attribute access
+        :param service_name: 
+    """
+    def __init__(self, service_name):
+        self.service_name = service_name
+
+    def __getattr__(self, attribute):
+        return getattr(get_client(self.service_name), attribute)
+
+
+class LazyResource:
+    """
+    module level stand-in for a resource, resolves the shared resource on attribute access
+        :param service_name: 
+    """
+    def __init__(self, service_name):
+        self.service_name = service_name
+
+    def __getattr__(self, attribute):
+        return getattr(get_resource(self.service_name), attribute)
+
+
+class LazyTable:
+    """
+    module level stand-in for a dynamo table, the name is known without touching aws
+        :param table_name: 
+    """
+    def __init__(self, table_name):
+        self.name = table_name
+
+    def __getattr__(self, attribute):
+        return getattr(get_table(self.name), attribute)
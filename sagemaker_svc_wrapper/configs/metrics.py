@@ -0,0 +1,259 @@
+import json
+import time
+import threading
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager
+from .throttling import THROTTLING_ERROR_CODES
+from .settings import SYS_CONFIG
+
+# one aws call as seen by botocore, retries and throttles are per call not per attempt
+CallRecord = namedtuple('CallRecord', ['service', 'operation', 'latency_ms', 'retries', 'throttles', 'error'])
+
+# upper bounds in milliseconds, the last bucket takes everything above
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_local = threading.local()
+
+
+class Histogram:
+    """
+    thread safe latency histogram with fixed buckets, plus retry, throttle and error counters
+        :param name: e.g. 'sagemaker.DescribeEndpoint' or 'GET /job/<string:job_name>'
+    """
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.retries = 0
+        self.throttles = 0
+        self.errors = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self._lock = threading.Lock()
+
+    def observe(self, latency_ms, retries=0, throttles=0, error=False):
+        index = len(LATENCY_BUCKETS_MS)
+        for position, bound in enumerate(LATENCY_BUCKETS_MS):
+            if latency_ms <= bound:
+                index = position
+                break
+        with self._lock:
+            self.count += 1
+            self.total_ms += latency_ms
+            self.max_ms = max(self.max_ms, latency_ms)
+            self.retries += retries
+            self.throttles += throttles
+            self.errors += 1 if error else 0
+            self.buckets[index] += 1
+
+    def snapshot(self):
+        with self._lock:
+            labels = [f'le_{bound}' for bound in LATENCY_BUCKETS_MS] + ['le_inf']
+            return {
+                'count': self.count,
+                'mean_ms': self.total_ms / self.count if self.count else 0.0,
+                'max_ms': self.max_ms,
+                'retries': self.retries,
+                'throttles': self.throttles,
+                'errors': self.errors,
+                'buckets': OrderedDict(zip(labels, self.buckets)),
+            }
+
+
+class Registry:
+    """
+    histograms by name, created on first observation
+    """
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, latency_ms, **counters):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram(name))
+        histogram.observe(latency_ms, **counters)
+
+    def snapshot(self):
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+        return OrderedDict((name, histogram.snapshot()) for name, histogram in histograms)
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+# aws calls by 'service.Operation', api requests by route, cron ticks by name
+AWS_CALLS = Registry()
+SCOPES = Registry()
+
+
+class Scope:
+    """
+    aws calls made while handling one api request or cron tick,
+    shared by every thread the scope is bound to
+        :param name: route or cron function name
+    """
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.records = []
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self, **fields):
+        """
+        one flat dict for the structured log line
+            :param fields: extra fields, e.g. status code
+        """
+        with self._lock:
+            records = list(self.records)
+        calls = OrderedDict()
+        for record in records:
+            key = f'{record.service}.{record.operation}'
+            calls[key] = calls.get(key, 0) + 1
+        summary = OrderedDict([
+            ('scope', self.name),
+            ('duration_ms', round((time.perf_counter() - self.start) * 1000, 2)),
+            ('aws_calls', len(records)),
+            ('aws_ms', round(sum(record.latency_ms for record in records), 2)),
+            ('retries', sum(record.retries for record in records)),
+            ('throttles', sum(record.throttles for record in records)),
+            ('errors', sum(1 for record in records if record.error)),
+            ('calls', calls),
+        ])
+        summary.update(fields)
+        return summary
+
+
+def current_scope():
+    return getattr(_local, 'scope', None)
+
+
+def bind(scope):
+    """
+    make scope current on this thread, returns the scope it replaces
+        :param scope: Scope or None
+    """
+    previous = current_scope()
+    _local.scope = scope
+    return previous
+
+
+def begin(name):
+    scope = Scope(name)
+    bind(scope)
+    return scope
+
+
+def end(**fields):
+    """
+    close the current scope: record its duration and print the summary log line unless log_request_metrics is off
+        :param fields: extra fields for the log line
+        :return: summary dict, None without a current scope
+    """
+    scope = bind(None)
+    if scope is None:
+        return None
+    summary = scope.summary(**fields)
+    SCOPES.observe(scope.name, summary['duration_ms'])
+    if SYS_CONFIG.log_request_metrics:
+        print(json.dumps(summary))
+    return summary
+
+
+@contextmanager
+def scope(name):
+    """
+    collect aws calls of the block, e.g. a cron tick
+        :param name:
+    """
+    previous = current_scope()
+    current = begin(name)
+    try:
+        yield current
+    finally:
+        end()
+        bind(previous)
+
+
+def propagate(func):
+    """
+    wrap func to run under the scope current at wrap time, for thread pool workers
+        :param func:
+    """
+    owner = current_scope()
+
+    def bound(*args, **kwargs):
+        previous = bind(owner)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            bind(previous)
+    return bound
+
+
+def _before_call(model, context, **kwargs):
+    context['metrics_start'] = time.perf_counter()
+    context['metrics_throttles'] = 0
+
+
+def _needs_retry(response, request_dict, **kwargs):
+    if response is None:
+        return
+    code = response[1].get('Error', {}).get('Code')
+    context = request_dict.get('context', {})
+    if code in THROTTLING_ERROR_CODES and 'metrics_throttles' in context:
+        context['metrics_throttles'] += 1
+
+
+def _after_call(http_response, parsed, model, context, **kwargs):
+    start = context.get('metrics_start')
+    if start is None:
+        return
+    record = CallRecord(service=model.service_model.service_name,
+                        operation=model.name,
+                        latency_ms=(time.perf_counter() - start) * 1000,
+                        retries=parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0),
+                        throttles=context.get('metrics_throttles', 0),
+                        error=http_response.status_code >= 300)
+    record_call(record)
+
+
+def record_call(record):
+    """
+    add one aws call to the histograms and the current scope
+        :param record: CallRecord
+    """
+    AWS_CALLS.observe(f'{record.service}.{record.operation}', record.latency_ms, retries=record.retries,
+                      throttles=record.throttles, error=record.error)
+    current = current_scope()
+    if current is not None:
+        current.add(record)
+
+
+def instrument(client):
+    """
+    hook botocore call events of a client, every call lands in AWS_CALLS and the current scope
+        :param client: botocore client, e.g. resource.meta.client
+    """
+    events = client.meta.events
+    # first on the most specific node, handlers answering before-call (e.g. Stubber) would skip it otherwise
+    events.register_first('before-call.*.*', _before_call, unique_id='metrics-before-call')
+    events.register('needs-retry.*.*', _needs_retry, unique_id='metrics-needs-retry')
+    events.register('after-call.*.*', _after_call, unique_id='metrics-after-call')
+    return client
+
+
+def snapshot():
+    return {'aws_calls': AWS_CALLS.snapshot(), 'scopes': SCOPES.snapshot()}
+
+
+def clear():
+    AWS_CALLS.clear()
+    SCOPES.clear()
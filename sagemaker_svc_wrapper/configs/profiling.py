@@ -0,0 +1,35 @@
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# set environment variable profile_startup to print import and initialization times
+ENABLED = bool(os.environ.get('profile_startup'))
+
+# label to milliseconds, in the order things were first timed
+TIMINGS = OrderedDict()
+
+
+@contextmanager
+def timed(label):
+    """
+    record how long the block takes under label
+        :param label: e.g. 'import sagemaker_svc_wrapper.api.jobs' or 'client sagemaker'
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000
+        TIMINGS[label] = TIMINGS.get(label, 0.0) + elapsed
+        if ENABLED:
+            print(f'startup profile: {label} {elapsed:.1f} ms')
+
+
+def report():
+    """
+    timings recorded so far, printed as one summary line when profiling is enabled
+    """
+    if ENABLED:
+        print('startup profile total: ' + ', '.join(f'{label} {elapsed:.1f} ms' for label, elapsed in TIMINGS.items()))
+    return dict(TIMINGS)
@@ -6,6 +6,56 @@ dev = {
     'job_table': 's-ml-pipeline-job',
     'endpoint_table': 's-ml-pipeline-endpoint',
     'project_models_table': 's-ml-pipeline-project-models',
+    'max_pool_connections': 16,
+    # threads running independent aws calls of one request, e.g. the steps of a serve job
+    'request_max_workers': 4,
+    'max_retry_attempts': 4,
+    # standard or adaptive, adaptive also slows the client down after throttling
+    'retry_mode': 'adaptive',
+    # calls per second of one client at which adaptive retries stop limiting it again
+    'client_max_calls_per_second': 100,
+    'connect_timeout_seconds': 5,
+    'read_timeout_seconds': 30,
+    'tcp_keepalive': True,
+    # project and project model configs, writes of other containers (e.g. the cron) show within this window
+    'cache_ttl_seconds': 60,
+    # serving endpoint per project of the inference proxy. promotions by the cron and event lambdas only clear
+    # the cache of their own container, api and /invoke containers keep the old endpoint for up to this long.
+    # a deleted one is re-read right away, one still running keeps getting the traffic until the entry expires
+    'serving_endpoint_ttl_seconds': 5,
+    'cache_max_size': 512,
+    # how long a 304 may be answered without reading the item again
+    'validator_ttl_seconds': 5,
+    'cron_mode': 'bulk',
+    'cron_max_workers': 8,
+    'cron_time_budget_seconds': 50,
+    'cron_checkpoint_name': 'cron-status-checkpoint',
+    'sagemaker_calls_per_second': 10,
+    'log_request_metrics': True,
+    'async_submission': False,
+    'job_queue_url': 'https://sqs.ap-southeast-2.amazonaws.com/570761704186/s-ml-pipeline-jobs',
+    'job_max_receive_count': 5,
+    'invoke_connect_timeout_seconds': 2,
+    'invoke_read_timeout_seconds': 60,
+    'invoke_max_retry_attempts': 1,
+    # concurrent training jobs of the account, sweeps never start more
+    'training_job_slots': 10,
+    # retired and failed jobs older than this move to compressed jsonl on s3
+    'archive_bucket': 's-ml-pipeline-job-archive',
+    'archive_prefix': 'jobs',
+    'archive_after_days': 90,
+    'archive_max_jobs': 5000,
+    # unreferenced models and endpoint configs older than this are deleted
+    'gc_retention_days': 7,
+    'gc_max_deletions': 500,
+    'gc_dry_run': False,
+    # projects with hosting_mode MultiModel serve from this endpoint unless they name their own,
+    # model artifacts are copied under s3://{multi_model_bucket}/{endpoint name}/.
+    # the stack only creates s-ml-pipeline-multi-model with MultiModelImage set, '' turns the shared endpoint off
+    'multi_model_endpoint': '',
+    'multi_model_bucket': 's-ml-pipeline-multi-model',
+    # buckets multi model serve jobs may copy model_artifacts from, ModelArtifactBucket of the stack
+    'model_artifact_buckets': [],
 }
 
 stage = {} or dev
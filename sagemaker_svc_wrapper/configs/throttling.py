@@ -0,0 +1,86 @@
+import random
+import threading
+import time
+
+# error codes of throttled aws calls, shared by the client hooks, metrics and the handlers
+THROTTLING_ERROR_CODES = {
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestThrottled',
+    'RequestThrottledException',
+    'TooManyRequestsException',
+    'ProvisionedThroughputExceededException',
+    'RequestLimitExceeded',
+    'SlowDown',
+}
+
+
+def is_throttling_error(error):
+    """
+    check whether a botocore ClientError is caused by aws throttling
+        :param error: exception raised by a boto3 call
+    """
+    response = getattr(error, 'response', None) or {}
+    return response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+
+
+class AdaptiveThrottle:
+    """
+    client side rate limiter shared between worker threads.
+    the call rate is halved on every throttling error and recovers step by step on success
+        :param rate: initial calls per second
+        :param min_rate: lower bound of calls per second
+        :param max_rate: upper bound of calls per second
+        :param max_attempts: attempts per call before the throttling error is raised
+        :param backoff_base: base seconds of the jittered exponential backoff
+        :param backoff_cap: max seconds to sleep between attempts
+    """
+    def __init__(self, rate=10.0, min_rate=0.5, max_rate=50.0,
+                 max_attempts=5, backoff_base=0.2, backoff_cap=5.0):
+        self.rate = float(rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.throttled = 0
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.rate
+        if slot > now:
+            time.sleep(slot - now)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.min_rate)
+
+    def on_throttle(self):
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def call(self, func, *args, **kwargs):
+        """
+        run func within the rate limit, retrying throttled calls with backoff
+            :param func: boto3 call or handler function
+        """
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as error:  # pylint: disable=broad-except
+                attempt += 1
+                if not is_throttling_error(error) or attempt >= self.max_attempts:
+                    raise
+                self.on_throttle()
+                time.sleep(random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt)))
+                continue
+            self.on_success()
+            return result
@@ -0,0 +1,110 @@
+import botocore
+from sagemaker_svc_wrapper.configs import clients
+from sagemaker_svc_wrapper.handlers import util_handler
+
+# resolved on first use through the shared client registry
+autoscaling = clients.LazyClient('application-autoscaling')
+
+SERVICE_NAMESPACE = 'sagemaker'
+SCALABLE_DIMENSION = 'sagemaker:variant:DesiredInstanceCount'
+INVOCATIONS_METRIC = 'SageMakerVariantInvocationsPerInstance'
+
+
+def resource_id(endpoint_name, variant_name):
+    return f'endpoint/{endpoint_name}/variant/{variant_name}'
+
+
+def register_variant_scaling(endpoint_name, variant_name, scaling):
+    """
+    scalable target and invocations per instance target tracking policy of one endpoint variant
+        :param endpoint_name: InService endpoint
+        :param variant_name:
+        :param scaling: AutoScaling of spec_serve, MinCapacity, MaxCapacity, TargetInvocationsPerInstance,
+                        optional ScaleInCooldown and ScaleOutCooldown in seconds
+    """
+    variant_resource = resource_id(endpoint_name, variant_name)
+    autoscaling.register_scalable_target(ServiceNamespace=SERVICE_NAMESPACE,
+                                         ResourceId=variant_resource,
+                                         ScalableDimension=SCALABLE_DIMENSION,
+                                         MinCapacity=int(scaling['MinCapacity']),
+                                         MaxCapacity=int(scaling['MaxCapacity']))
+    policy = {
+        'TargetValue': float(scaling['TargetInvocationsPerInstance']),
+        'PredefinedMetricSpecification': {'PredefinedMetricType': INVOCATIONS_METRIC},
+    }
+    for cooldown in ('ScaleInCooldown', 'ScaleOutCooldown'):
+        if scaling.get(cooldown) is not None:
+            policy[cooldown] = int(scaling[cooldown])
+    autoscaling.put_scaling_policy(PolicyName=f'{endpoint_name}-{variant_name}-invocations',
+                                   ServiceNamespace=SERVICE_NAMESPACE,
+                                   ResourceId=variant_resource,
+                                   ScalableDimension=SCALABLE_DIMENSION,
+                                   PolicyType='TargetTrackingScaling',
+                                   TargetTrackingScalingPolicyConfiguration=policy)
+
+
+def deregister_variant_scaling(endpoint_name, variant_name):
+    """
+    remove scalable target of one endpoint variant, its policies go with it
+        :return: False when there was nothing registered
+    """
+    try:
+        autoscaling.deregister_scalable_target(ServiceNamespace=SERVICE_NAMESPACE,
+                                               ResourceId=resource_id(endpoint_name, variant_name),
+                                               ScalableDimension=SCALABLE_DIMENSION)
+    except botocore.exceptions.ClientError as error:
+        if error.response.get('Error', {}).get('Code') == 'ObjectNotFoundException':
+            return False
+        raise
+    return True
+
+
+def scaled_variants(config_variants):
+    """
+    :param config_variants: recorded endpoint config, spec_serve of each variant
+    :return: variant name to AutoScaling for variants that have it
+    """
+    return {variant['VariantName']: variant['AutoScaling']
+            for variant in config_variants if variant.get('AutoScaling')}
+
+
+def apply_endpoint_scaling(endpoint_name, config_variants):
+    """
+    register autoscaling of every variant that asks for it, best effort:
+    a failed variant keeps its fixed instance count and is reported, throttling errors are raised
+        :param endpoint_name: InService endpoint
+        :param config_variants: recorded endpoint config
+        :return: variant names registered
+    """
+    registered = []
+    for variant_name, scaling in scaled_variants(config_variants).items():
+        try:
+            register_variant_scaling(endpoint_name, variant_name, scaling)
+            registered.append(variant_name)
+        except botocore.exceptions.ClientError as error:
+            # registering again is harmless, let the caller back off and retry
+            if util_handler.is_throttling_error(error):
+                raise
+            print(f'autoscaling of {endpoint_name} {variant_name} not registered: {error}')
+    return registered
+
+
+def remove_endpoint_scaling(endpoint_name, config_variants):
+    """
+    deregister autoscaling of an endpoint before it is deleted
+        :param endpoint_name:
+        :param config_variants: recorded endpoint config
+    """
+    for variant_name in scaled_variants(config_variants):
+        try:
+            deregister_variant_scaling(endpoint_name, variant_name)
+        except botocore.exceptions.ClientError as error:
+            print(f'autoscaling of {endpoint_name} {variant_name} not removed: {error}')
+
+
+def sagemaker_variant(spec_serve):
+    """
+    production variant for create_endpoint_config, without the keys only this service reads
+        :param spec_serve: variant spec with VariantName, ModelName, ...
+    """
+    return {key: value for key, value in spec_serve.items() if key != 'AutoScaling'}
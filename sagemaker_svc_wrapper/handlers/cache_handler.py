@@ -0,0 +1,77 @@
+import copy
+import time
+import threading
+from collections import OrderedDict
+
+# every TTLCache by name, for inspecting hit/miss counters
+CACHES = {}
+
+
+class TTLCache:
+    """
+    thread safe in-process LRU cache with a time to live per entry.
+    lives as long as the lambda container, values are copied in and out so callers can't mutate entries
+        :param name: name the cache is registered under in CACHES
+        :param max_size: entries kept before the least recently used one is evicted
+        :param ttl: seconds an entry stays valid
+    """
+    def __init__(self, name, max_size=512, ttl=60):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        CACHES[name] = self
+
+    def get(self, key):
+        """
+        cached value or None when missing or expired
+            :param key:
+        """
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._items[key]
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._items),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+def cache_stats():
+    """
+    hit/miss counters of every cache in this process
+    """
+    return {name: cache.stats() for name, cache in CACHES.items()}
@@ -0,0 +1,57 @@
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from sagemaker_svc_wrapper.configs.settings import SYS_CONFIG
+from sagemaker_svc_wrapper.configs import metrics
+
+# func takes the dict of results of the steps it needs
+Step = namedtuple('Step', ['needs', 'func'])
+
+# one pool per process, boto3 clients are thread safe and share their connection pool
+_lock = threading.Lock()
+_executor = None
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=SYS_CONFIG.request_max_workers)
+        return _executor
+
+
+def submit(func, *args, **kwargs):
+    """
+    run a dynamo_handler or sagemaker_handler call in the pool, its aws calls count towards the current metrics scope
+        :return: Future
+    """
+    return get_executor().submit(metrics.propagate(func), *args, **kwargs)
+
+
+def run_graph(steps):
+    """
+    run steps as soon as the steps they need are done, independent steps at the same time.
+    steps must not run graphs themselves, the pool could run out of workers waiting on each other
+        :param steps: dict of step name to Step(needs, func), a step of None is left out
+        :return: dict of step name to result
+        raises the error of the first failed step once running steps are done, steps needing it never start
+    """
+    steps = {name: step for name, step in steps.items() if step is not None}
+    results = {}
+    running = {}
+    while steps or running:
+        ready = [name for name, step in steps.items() if all(need in results for need in step.needs)]
+        for name in ready:
+            step = steps.pop(name)
+            needed = {need: results[need] for need in step.needs}
+            running[submit(step.func, needed)] = name
+        if not running:
+            raise ValueError(f'steps need unknown steps: {", ".join(sorted(steps))}')
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            name = running.pop(future)
+            if future.exception() is not None:
+                wait(running)
+                raise future.exception()
+            results[name] = future.result()
+    return results
@@ -1,55 +1,204 @@
-import boto3
+import time
+import random
+import itertools
+from collections import namedtuple
 import maya
 import json
 from boto3.dynamodb.conditions import Key, Attr
 from botocore.exceptions import ClientError
 from ..configs.settings import SYS_CONFIG
-
-project_table = boto3.resource('dynamodb').Table(SYS_CONFIG.project_table)
-project_models_table = boto3.resource('dynamodb').Table(SYS_CONFIG.project_models_table)
-job_table = boto3.resource('dynamodb').Table(SYS_CONFIG.job_table)
-endpoint_table = boto3.resource('dynamodb').Table(SYS_CONFIG.endpoint_table)
-
-def create_project(project_name, variants={'default':1}, is_auto_deploy=True, is_active=True, **kwargs):
+from ..configs import clients
+from .cache_handler import TTLCache
+
+# resolved on first use through the shared client registry
+dynamodb = clients.LazyResource('dynamodb')
+project_table = clients.LazyTable(SYS_CONFIG.project_table)
+project_models_table = clients.LazyTable(SYS_CONFIG.project_models_table)
+job_table = clients.LazyTable(SYS_CONFIG.job_table)
+endpoint_table = clients.LazyTable(SYS_CONFIG.endpoint_table)
+
+# project and project model configs change rarely, cached per container and invalidated by our own writes
+project_cache = TTLCache('project', max_size=SYS_CONFIG.cache_max_size, ttl=SYS_CONFIG.cache_ttl_seconds)
+project_model_cache = TTLCache('project_model', max_size=SYS_CONFIG.cache_max_size, ttl=SYS_CONFIG.cache_ttl_seconds)
+# serving endpoint and multi model target per project for the inference proxy, invalidated by project writes.
+# short lived, promotions of other containers only show once the entry expires
+serving_endpoint_cache = TTLCache('serving_endpoint', max_size=SYS_CONFIG.cache_max_size,
+                                  ttl=SYS_CONFIG.serving_endpoint_ttl_seconds)
+# ETag validators of api reads by ('project', name), ('project_model', name, variant) or ('job', name),
+# invalidated by our own writes, writes of other containers show within validator_ttl_seconds
+validator_cache = TTLCache('validators', max_size=SYS_CONFIG.cache_max_size, ttl=SYS_CONFIG.validator_ttl_seconds)
+
+# time ordered job indexes, range key timestamp_queued. a variant or job type filter picks the index
+# hashed on it, so filters and time ranges are key conditions
+JOBS_INDEX = 'project_name-timestamp_queued-index'
+JOBS_BY_VARIANT_INDEX = 'project_variant-timestamp_queued-index'
+JOBS_BY_TYPE_INDEX = 'project_job_type-timestamp_queued-index'
+# index of deployments without the time ordered ones, queried with the filters as filter expressions
+LEGACY_JOBS_INDEX = 'project_name-index'
+
+# target_model is the artifact of a multi model endpoint to invoke, '' on dedicated endpoints
+ServingTarget = namedtuple('ServingTarget', ['endpoint_name', 'target_model'])
+# values of job_handler.HostingMode, projects with anything else would silently serve as Dedicated
+HOSTING_MODES = ('Dedicated', 'MultiModel')
+
+# BatchGetItem accepts at most 100 keys per call
+BATCH_GET_MAX_KEYS = 100
+BATCH_GET_MAX_ATTEMPTS = 5
+
+# order of job endpoint_status, forward only updates never move a job to a lower rank
+ENDPOINT_STATUS_RANK = {
+    'Queued': 0,
+    'Scheduled': 0,
+    'ModelCreatedOnly': 1,
+    'Training': 1,
+    'Transforming': 1,
+    'Sweeping': 1,
+    'Creating': 2,
+    'Updating': 2,
+    'InService': 3,
+    'Completed': 3,
+    'Failed': 3,
+    'Stopped': 3,
+    'Reused': 3,
+    'Retired': 4,
+}
+
+
+def _update_item(table, key, update_partial, condition=None, return_values='ALL_NEW'):
+    """
+    SET the given attributes and time_updated in a single UpdateItem,
+    only when the item exists and the optional condition holds
+        :param table: dynamo table
+        :param key: item key
+        :param update_partial: attributes to set, key attributes are ignored
+        :param condition: boto3 condition on the stored item
+        :param return_values: UpdateItem ReturnValues
+        :return: returned attributes, {} when the item is missing or the condition failed
+    """
+    update_partial = dict(update_partial, time_updated=maya.now().epoch)
+    names, values, assignments = {}, {}, []
+    for index, (attribute, value) in enumerate(update_partial.items()):
+        if attribute in key:
+            continue
+        # boto3 uses #n/:v placeholders for conditions
+        names[f'#u{index}'] = attribute
+        values[f':u{index}'] = value
+        assignments.append(f'#u{index} = :u{index}')
+
+    condition_expression = Attr(next(iter(key))).exists()
+    if condition is not None:
+        condition_expression = condition_expression & condition
+    try:
+        response = table.update_item(
+            Key=key,
+            UpdateExpression='SET ' + ', '.join(assignments),
+            ConditionExpression=condition_expression,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValues=return_values,
+        )
+    except ClientError as error:
+        if error.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+            return {}
+        raise
+    return response.get('Attributes', {})
+
+
+def create_project(project_name, variants={'default':1}, is_auto_deploy=True, is_active=True,
+                   hosting_mode='Dedicated', multi_model_endpoint=None, **kwargs):
     """
     create project into dynamo
         :param project_name: 
         :param variants={'default':1}: 
         :param is_auto_deploy=True: 
         :param is_active=True: 
+        :param hosting_mode: Dedicated endpoint per serve job, or MultiModel on a shared endpoint
+        :param multi_model_endpoint: shared endpoint of a MultiModel project, multi_model_endpoint in settings without
     """
+    if hosting_mode not in HOSTING_MODES:
+        raise ValueError(f'hosting_mode {hosting_mode} is not one of {", ".join(HOSTING_MODES)}')
     project = {
         'project_name': project_name,
         'variants': json.dumps(variants),
         'is_auto_deploy': is_auto_deploy,
         'is_active': is_active,
+        'hosting_mode': hosting_mode,
         'date_created': maya.now().epoch,
     }
+    if multi_model_endpoint:
+        project['multi_model_endpoint'] = multi_model_endpoint
 
     response = project_table.put_item(Item=project)
+    project_cache.invalidate(project_name)
+    serving_endpoint_cache.invalidate(project_name)
+    validator_cache.invalidate(('project', project_name))
     if response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 200:
         return project['project_name']
     return ''
 
 
-def get_project(project_name):
-    response = project_table.get_item(Key={'project_name': project_name})
-    if response.get('Item',{}).get('is_active'):
-        return response.get('Item')
+def get_project(project_name, consistent_read=False, cached=True):
+    """
+    active project, served from the container cache unless consistent_read is set
+        :param project_name: 
+        :param consistent_read: bypass the cache and read strongly consistent
+        :param cached: False reads the table and refreshes the cache, e.g. for the shorter lived serving endpoint
+    """
+    item = None if consistent_read or not cached else project_cache.get(project_name)
+    if item is None:
+        response = project_table.get_item(Key={'project_name': project_name}, ConsistentRead=consistent_read)
+        item = response.get('Item') or {}
+        if item:
+            project_cache.set(project_name, item)
+    if item.get('is_active'):
+        return item
     return {}
 
 
-def update_project(project_name, update_partial):
+def list_projects():
     """
-    docstring here
+    every project, a scan for housekeeping crons
+    """
+    return _scan_items(project_table)
+
+
+def update_project(project_name, update_partial, condition=None):
+    """
+    partial update of an existing project
         :param project_name: 
         :param update_partial={}: 
+        :param condition: optional boto3 condition on the stored project
+        :return: updated project, {} if missing or condition failed
+    """
+    response = _update_item(project_table, {'project_name': project_name}, update_partial, condition=condition)
+    project_cache.invalidate(project_name)
+    serving_endpoint_cache.invalidate(project_name)
+    validator_cache.invalidate(('project', project_name))
+    return response
+
+
+def get_serving_target(project_name, consistent_read=False):
+    """
+    live endpoint and multi model target of an active project, served from the container cache
+    unless consistent_read is set
+        :param project_name: 
+        :param consistent_read: bypass the caches and read strongly consistent
+        :return: ServingTarget, endpoint_name '' when the project is missing or serves nothing yet
+    """
+    target = None if consistent_read else serving_endpoint_cache.get(project_name)
+    if target is None:
+        project = get_project(project_name, consistent_read=consistent_read, cached=False)
+        target = ServingTarget(project.get('serving_endpoint') or '', project.get('target_model') or '')
+        serving_endpoint_cache.set(project_name, target)
+    return target
+
+
+def get_serving_endpoint(project_name, consistent_read=False):
     """
-    item = get_project(project_name)
-    for key, value in update_partial.items():
-        item[key] = value
-    item['time_updated'] = maya.now().epoch
-    project_table.put_item(Item=item)
+    live endpoint name of an active project, see get_serving_target
+        :return: endpoint name, '' when the project is missing or serves nothing yet
+    """
+    return get_serving_target(project_name, consistent_read=consistent_read).endpoint_name
 
 
 def create_project_model(project_name,
@@ -58,6 +207,7 @@ def create_project_model(project_name,
                          spec_serve=[],
                          env_train={},
                          env_serve={},
+                         batching={},
                          **kwargs):
     """
     docstring here
@@ -67,6 +217,7 @@ def create_project_model(project_name,
         :param image_serve: 
         :param spec_train: 
         :param spec_serve: list of endpoint spects
+        :param batching: max_batch_size and max_wait_ms of the invoke proxy
         
         :param input_data_path: 
         :param output_model_path: 
@@ -85,40 +236,240 @@ def create_project_model(project_name,
         project_model_data['env_train'] = json.dumps(env_train)
     if env_serve:
         project_model_data['env_serve'] = json.dumps(env_serve)
+    if batching:
+        project_model_data['batching'] = json.dumps(batching)
 
     project_model_data.update(kwargs)
 
     response = project_models_table.put_item(Item=project_model_data)
+    project_model_cache.invalidate((project_name, variant_name))
+    validator_cache.invalidate(('project_model', project_name, variant_name))
     return response
 
 
-def get_project_model(project_name, variant_name='default'):
+def get_project_model(project_name, variant_name='default', consistent_read=False):
     """
-    docstring here
+    project model, served from the container cache unless consistent_read is set
         :param project_name: 
         :param variant_name='default:
+        :param consistent_read: bypass the cache and read strongly consistent
     """
-    response = project_models_table.get_item(Key={'project_name': project_name, 'variant_name':variant_name})
-    return response.get('Item') or {}
+    item = None if consistent_read else project_model_cache.get((project_name, variant_name))
+    if item is None:
+        response = project_models_table.get_item(Key={'project_name': project_name, 'variant_name':variant_name},
+                                                  ConsistentRead=consistent_read)
+        item = response.get('Item') or {}
+        if item:
+            project_model_cache.set((project_name, variant_name), item)
+    return item
+
+
+def _batch_get_items(request_items):
+    """
+    BatchGetItem across tables, retrying unprocessed keys with backoff
+        :param request_items: dict of table name to {'Keys': [...]}, BATCH_GET_MAX_KEYS keys at most
+        :return: (dict of table name to items, request items still unprocessed)
+    """
+    responses = {}
+    for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+        response = dynamodb.batch_get_item(RequestItems=request_items)
+        for table_name, items in response.get('Responses', {}).items():
+            responses.setdefault(table_name, []).extend(items)
+        request_items = response.get('UnprocessedKeys') or {}
+        if not request_items:
+            break
+        time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+    return responses, request_items
+
+
+def _batch_get(table, keys, consistent_read=False):
+    """
+    items of one table by key, keys still unprocessed after the retries are read one by one
+        :param table: dynamo table
+        :param keys: list of key dicts
+        :param consistent_read: strongly consistent reads
+        :return: list of found items
+    """
+    items = []
+    for index in range(0, len(keys), BATCH_GET_MAX_KEYS):
+        responses, unprocessed = _batch_get_items({table.name: {'Keys': keys[index:index + BATCH_GET_MAX_KEYS],
+                                                                'ConsistentRead': consistent_read}})
+        items.extend(responses.get(table.name, []))
+        for key in unprocessed.get(table.name, {}).get('Keys', []):
+            item = table.get_item(Key=key, ConsistentRead=consistent_read).get('Item')
+            if item:
+                items.append(item)
+    return items
+
+
+def batch_get_project_models(keys, consistent_read=False):
+    """
+    project models of many (project_name, variant_name) pairs, cached ones first then as few calls as possible
+        :param keys: iterable of (project_name, variant_name)
+        :param consistent_read: bypass the cache and read strongly consistent
+        :return: dict of (project_name, variant_name) to project model
+    """
+    project_models = {}
+    missing_keys = []
+    for key in set(keys):
+        item = None if consistent_read else project_model_cache.get(key)
+        if item is None:
+            missing_keys.append({'project_name': key[0], 'variant_name': key[1]})
+        else:
+            project_models[key] = item
+    for item in _batch_get(project_models_table, missing_keys, consistent_read=consistent_read):
+        key = (item['project_name'], item['variant_name'])
+        project_model_cache.set(key, item)
+        project_models[key] = item
+    return project_models
+
+
+def get_project_with_models(project_name, variant_names=(), all_variants=True, consistent_read=False):
+    """
+    project and its variant models: cached records are used first, then one BatchGetItem
+    for the project and variant_names, a second one for the remaining variants of the project
+        :param project_name: 
+        :param variant_names: variants known up front, read together with the project
+        :param all_variants: also load every variant listed in project['variants']
+        :param consistent_read: bypass the cache and read strongly consistent
+        :return: (project, dict of variant_name to project model)
+    """
+    project = None if consistent_read else project_cache.get(project_name)
+    project_models = {}
+    for variant_name in set(variant_names):
+        item = None if consistent_read else project_model_cache.get((project_name, variant_name))
+        if item is not None:
+            project_models[variant_name] = item
+
+    request_items = {}
+    if project is None:
+        request_items[project_table.name] = {'Keys': [{'project_name': project_name}],
+                                             'ConsistentRead': consistent_read}
+    missing_variants = set(variant_names) - set(project_models)
+    if missing_variants:
+        request_items[project_models_table.name] = {'Keys': [{'project_name': project_name, 'variant_name': variant_name}
+                                                             for variant_name in missing_variants],
+                                                    'ConsistentRead': consistent_read}
+    responses, unprocessed = _batch_get_items(request_items) if request_items else ({}, {})
+
+    if project is None:
+        if unprocessed.get(project_table.name):
+            project = get_project(project_name, consistent_read=True)
+        else:
+            projects = responses.get(project_table.name, [])
+            project = projects[0] if projects else {}
+            if project:
+                project_cache.set(project_name, project)
+    if not project.get('is_active'):
+        project = {}
+
+    for item in responses.get(project_models_table.name, []):
+        project_model_cache.set((project_name, item['variant_name']), item)
+        project_models[item['variant_name']] = item
+    missing_variants = {key['variant_name'] for key in unprocessed.get(project_models_table.name, {}).get('Keys', [])}
+    if project and all_variants:
+        missing_variants.update(set(json.loads(project.get('variants') or '{}')) - set(variant_names))
+    for (_, variant_name), item in batch_get_project_models(((project_name, variant_name)
+                                                             for variant_name in missing_variants),
+                                                            consistent_read=consistent_read).items():
+        project_models[variant_name] = item
+    return project, project_models
+
+
+def update_project_model(project_name, variant_name, update_partial, condition=None, return_values='ALL_NEW'):
+    """
+    partial update of an existing project model
+        :param project_name: 
+        :param variant_name: 
+        :param update_partial: 
+        :param condition: optional boto3 condition on the stored project model
+        :param return_values: 'UPDATED_OLD' returns the replaced values, e.g. the previous latest_model
+        :return: returned attributes, {} if missing or condition failed
+    """
+    response = _update_item(project_models_table, {'project_name': project_name, 'variant_name': variant_name},
+                            update_partial, condition=condition, return_values=return_values)
+    project_model_cache.invalidate((project_name, variant_name))
+    validator_cache.invalidate(('project_model', project_name, variant_name))
+    return response
+
+
+def _query_items(table, start_key=None, **query_kwargs):
+    """
+    generator over all items of a query, following LastEvaluatedKey page by page
+        :param table: dynamo table
+        :param start_key: ExclusiveStartKey to resume from
+        :param **query_kwargs: table.query arguments
+    """
+    while True:
+        if start_key:
+            query_kwargs['ExclusiveStartKey'] = start_key
+        response = table.query(**query_kwargs)
+        for item in response.get('Items', []):
+            yield item
+        start_key = response.get('LastEvaluatedKey')
+        if not start_key:
+            return
+
+
+def _scan_items(table, start_key=None, **scan_kwargs):
+    """
+    generator over all items of a scan, following LastEvaluatedKey page by page
+        :param table: dynamo table
+        :param start_key: ExclusiveStartKey to resume from
+        :param **scan_kwargs: table.scan arguments
+    """
+    while True:
+        if start_key:
+            scan_kwargs['ExclusiveStartKey'] = start_key
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            yield item
+        start_key = response.get('LastEvaluatedKey')
+        if not start_key:
+            return
+
+
+def _query_page(table, limit, start_key=None, **query_kwargs):
+    """
+    up to limit items of a query
+        :param table: dynamo table
+        :param limit: max items returned
+        :param start_key: ExclusiveStartKey to resume from
+        :param **query_kwargs: table.query arguments
+        :return: (items, LastEvaluatedKey or None when exhausted)
+    """
+    items = []
+    while True:
+        if start_key:
+            query_kwargs['ExclusiveStartKey'] = start_key
+        response = table.query(Limit=limit - len(items), **query_kwargs)
+        items.extend(response.get('Items', []))
+        start_key = response.get('LastEvaluatedKey')
+        if not start_key or len(items) >= limit:
+            return items, start_key
+
+
+def _project_models_query(project_name):
+    return {
+        'IndexName': 'project_name-index',
+        'KeyConditionExpression': Key('project_name').eq(project_name),
+        'ConsistentRead': False,
+    }
 
 
-def update_project_model(project_name, variant_name, update_partial):
-    item = get_project_model(project_name, variant_name)
-    for key, value in update_partial.items():
-        item[key] = value
-    item['time_updated'] = maya.now().epoch
-    project_models_table.put_item(Item=item)
+def list_project_models(project_name, start_key=None):
+    return _query_items(project_models_table, start_key=start_key, **_project_models_query(project_name))
 
 
-def list_project_models(project_name):
-    response = project_models_table.query(
-        IndexName='project_name-index',
-        KeyConditionExpression=Key('project_name').eq(project_name),
-        ConsistentRead=False,
-    )
-    if response:
-        return response.get('Items', [])
-    return []
+def list_all_project_models():
+    """
+    project models of every project, a scan for housekeeping crons
+    """
+    return _scan_items(project_models_table)
+
+
+def list_project_models_page(project_name, limit, start_key=None):
+    return _query_page(project_models_table, limit, start_key=start_key, **_project_models_query(project_name))
 
 
 def log_job(project_name, job_type, variant_name='default', endpoint_status='ModelCreatedOnly', **kwargs):
@@ -136,6 +487,8 @@ def log_job(project_name, job_type, variant_name='default', endpoint_status='Mod
     job_item['project_name'] = project_name
     job_item['variant_name'] = variant_name
     job_item['endpoint_status'] = endpoint_status
+    job_item.setdefault('timestamp_queued', maya.now().epoch)
+    job_item.update(job_index_keys(project_name, job_type, variant_name))
 
     if job_item.get('spec_serve'):
         job_item['spec_serve'] = json.dumps(job_item['spec_serve'])
@@ -145,8 +498,11 @@ def log_job(project_name, job_type, variant_name='default', endpoint_status='Mod
         job_item['env_train'] = json.dumps(job_item['env_train'])
     if job_item.get('env_serve'):
         job_item['env_serve'] = json.dumps(job_item['env_serve'])
+    if job_item.get('env_transform'):
+        job_item['env_transform'] = json.dumps(job_item['env_transform'])
 
     response = job_table.put_item(Item=job_item)
+    validator_cache.invalidate(('job', job_item['job_name']))
     if response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 200:
         return job_item['job_name']
 
@@ -160,52 +516,289 @@ def get_job(job_name):
         :param project_name: 
     """
     response = job_table.get_item(Key={'job_name': job_name})
-    return response['Item']
+    return response.get('Item') or {}
 
 
-def update_job(job_name, partial_update_item={}):
+def batch_get_jobs(job_names, consistent_read=False):
     """
-    docstring here
+    jobs by name in as few calls as possible, missing jobs are left out
+        :param job_names:
+        :param consistent_read: strongly consistent reads
+    """
+    return _batch_get(job_table, [{'job_name': job_name} for job_name in job_names], consistent_read=consistent_read)
+
+
+def update_job(job_name, partial_update_item={}, forward_only=False, condition=None):
+    """
+    partial update of an existing job
         :param job_name: 
         :param partial_update_item={}: 
+        :param forward_only: only apply when endpoint_status moves up ENDPOINT_STATUS_RANK,
+                             keeps concurrent status writers from undoing each other
+        :param condition: optional boto3 condition on the stored job
+        :return: updated job, {} if missing or condition failed
     """
-    item = get_job(job_name)
-    for key, value in partial_update_item.items():
-        item[key] = value
-    item['time_updated']=maya.now().epoch
-    job_table.put_item(Item=item)
+    new_status = partial_update_item.get('endpoint_status')
+    if forward_only and new_status in ENDPOINT_STATUS_RANK:
+        lower_statuses = [status for status, rank in ENDPOINT_STATUS_RANK.items()
+                          if rank < ENDPOINT_STATUS_RANK[new_status]]
+        forward = Attr('endpoint_status').not_exists()
+        if lower_statuses:
+            forward = forward | Attr('endpoint_status').is_in(lower_statuses)
+        condition = forward if condition is None else condition & forward
+    response = _update_item(job_table, {'job_name': job_name}, partial_update_item, condition=condition)
+    validator_cache.invalidate(('job', job_name))
+    return response
+
+
+def job_index_keys(project_name, job_type, variant_name):
+    """
+    hash keys of the filtered job indexes
+        :param project_name: 
+        :param job_type: 
+        :param variant_name: 
+    """
+    return {
+        'project_variant': f'{project_name}/{variant_name}',
+        'project_job_type': f'{project_name}/{job_type}',
+    }
+
+
+def _jobs_query(project_name, since=None, until=None, job_type=None, variant_name=None, newest_first=True):
+    """
+    query of a project's jobs in time order, filters and the time range pushed down as key conditions
+        :param since: epoch seconds, jobs queued at or after
+        :param until: epoch seconds, jobs queued at or before
+        :param job_type: only jobs of this type
+        :param variant_name: only jobs of this variant, with job_type as well the type becomes a filter expression
+        :param newest_first: descending timestamp_queued
+    """
+    query = {'ScanIndexForward': not newest_first, 'ConsistentRead': False}
+    if variant_name is not None:
+        query['IndexName'] = JOBS_BY_VARIANT_INDEX
+        key = Key('project_variant').eq(job_index_keys(project_name, job_type, variant_name)['project_variant'])
+        if job_type is not None:
+            query['FilterExpression'] = Attr('job_type').eq(job_type)
+    elif job_type is not None:
+        query['IndexName'] = JOBS_BY_TYPE_INDEX
+        key = Key('project_job_type').eq(job_index_keys(project_name, job_type, variant_name)['project_job_type'])
+    else:
+        query['IndexName'] = JOBS_INDEX
+        key = Key('project_name').eq(project_name)
+
+    queued = Key('timestamp_queued')
+    if since is not None and until is not None:
+        key = key & queued.between(since, until)
+    elif since is not None:
+        key = key & queued.gte(since)
+    elif until is not None:
+        key = key & queued.lte(until)
+    query['KeyConditionExpression'] = key
+    return query
+
+
+def _legacy_jobs_query(project_name, since=None, until=None, job_type=None, variant_name=None, newest_first=True):
+    """
+    query of a project's jobs on project_name-index, for tables without the time ordered indexes.
+    filters and the time range are filter expressions and jobs come back in index order, newest_first is ignored
+    """
+    conditions = []
+    if variant_name is not None:
+        conditions.append(Attr('variant_name').eq(variant_name))
+    if job_type is not None:
+        conditions.append(Attr('job_type').eq(job_type))
+    if since is not None:
+        conditions.append(Attr('timestamp_queued').gte(since))
+    if until is not None:
+        conditions.append(Attr('timestamp_queued').lte(until))
+
+    query = {
+        'IndexName': LEGACY_JOBS_INDEX,
+        'KeyConditionExpression': Key('project_name').eq(project_name),
+        'ConsistentRead': False,
+    }
+    if conditions:
+        query['FilterExpression'] = conditions[0]
+        for condition in conditions[1:]:
+            query['FilterExpression'] = query['FilterExpression'] & condition
+    return query
+
 
+def _missing_index(error):
+    """
+    query of an index the table does not have, or not yet: created indexes are queryable once backfilled
+        :param error: ClientError
+    """
+    return error.response.get('Error', {}).get('Code') == 'ValidationException' \
+        and 'specified index' in error.response.get('Error', {}).get('Message', '')
 
-def list_jobs(project_name, variant_name='default'):
+
+def list_jobs(project_name, start_key=None, **filters):
     """
-    list jobs belongs to same project
+    list jobs belongs to same project, newest first, lazily paged.
+    the first page is read right away, on a table without the time ordered indexes it comes from project_name-index
         :param project_name: 
-        :param variant_name='default': 
+        :param start_key: continue after this key
+        :param **filters: since, until, job_type, variant_name, newest_first
     """ 
-    #TODO: filter jobs based on variant_name
-    response = job_table.query(
-        IndexName='project_name-index',
-        KeyConditionExpression=Key('project_name').eq(project_name),
-        ConsistentRead=False,
-    )
-    if response:
-        return response.get('Items', [])
-    return []
+    jobs = _query_items(job_table, start_key=start_key, **_jobs_query(project_name, **filters))
+    try:
+        first = next(jobs)
+    except StopIteration:
+        return iter(())
+    except ClientError as error:
+        if not _missing_index(error):
+            raise
+        print(f'job indexes missing, listing jobs of {project_name} from {LEGACY_JOBS_INDEX}')
+        return _query_items(job_table, start_key=start_key, **_legacy_jobs_query(project_name, **filters))
+    return itertools.chain([first], jobs)
+
+
+def list_jobs_page(project_name, limit, start_key=None, **filters):
+    """
+    one page of jobs belongs to same project, newest first.
+    on a table without the time ordered indexes the page comes from project_name-index
+        :param project_name: 
+        :param limit: max jobs returned
+        :param start_key: continue after this key
+        :param **filters: since, until, job_type, variant_name, newest_first
+        :return: (jobs, last evaluated key)
+    """
+    try:
+        return _query_page(job_table, limit, start_key=start_key, **_jobs_query(project_name, **filters))
+    except ClientError as error:
+        if not _missing_index(error):
+            raise
+        print(f'job indexes missing, listing jobs of {project_name} from {LEGACY_JOBS_INDEX}')
+        return _query_page(job_table, limit, start_key=start_key, **_legacy_jobs_query(project_name, **filters))
 
 
-def list_jobs_by_status(endpoint_status):
-    response = job_table.query(
+def list_jobs_by_status(endpoint_status, until=None):
+    """
+    jobs in a status across projects
+        :param endpoint_status: 
+        :param until: epoch seconds, only jobs queued at or before
+    """
+    query = {}
+    if until is not None:
+        query['FilterExpression'] = Attr('timestamp_queued').lte(until)
+    return _query_items(
+        job_table,
         IndexName='endpoint_status-index',
         KeyConditionExpression=Key('endpoint_status').eq(endpoint_status),
         ConsistentRead=False,
+        **query
     )
-    if response:
-        return response.get('Items', [])
-    return []
+
+
+def delete_jobs(job_names):
+    """
+    delete jobs with BatchWriteItem, 25 per call, unprocessed deletes are retried by the batch writer
+        :param job_names: 
+    """
+    with job_table.batch_writer() as batch:
+        for job_name in job_names:
+            batch.delete_item(Key={'job_name': job_name})
+    for job_name in job_names:
+        validator_cache.invalidate(('job', job_name))
+
+
+def backfill_job_index_keys(limit=None):
+    """
+    set the filtered index keys on jobs logged before they existed
+        :param limit: max jobs updated
+        :return: number of jobs updated
+    """
+    updated = 0
+    jobs = _scan_items(job_table, FilterExpression=Attr('project_name').exists() & Attr('project_variant').not_exists())
+    for job in jobs:
+        if limit is not None and updated >= limit:
+            break
+        job_type = job.get('job_type')
+        _update_item(job_table, {'job_name': job['job_name']},
+                     job_index_keys(job['project_name'], job_type, job.get('variant_name', 'default')))
+        updated += 1
+    return updated
 
 
 def create_endpoint(endpoint_name, **kwargs):
+    """
+    record what an endpoint was deployed with
+        :param endpoint_name: 
+        :param **kwargs: config_hash, model_fingerprints, endpoint_config, project_name
+    """
     item = kwargs
     item['endpoint_name'] = endpoint_name
+    item['time_created'] = maya.now().epoch
     response = endpoint_table.put_item(Item=item)
     return response
+
+
+def get_endpoint(endpoint_name):
+    """
+    deployment record of an endpoint, {} for endpoints deployed before records were kept
+        :param endpoint_name: 
+    """
+    response = endpoint_table.get_item(Key={'endpoint_name': endpoint_name})
+    return response.get('Item') or {}
+
+
+def batch_get_endpoints(endpoint_names):
+    """
+    deployment records by endpoint name in as few calls as possible, endpoints without a record are left out
+        :param endpoint_names:
+    """
+    return _batch_get(endpoint_table, [{'endpoint_name': endpoint_name} for endpoint_name in endpoint_names])
+
+
+def update_endpoint(endpoint_name, update_partial):
+    """
+    partial update of an endpoint record
+        :param endpoint_name: 
+        :param update_partial: 
+        :return: updated record, {} if there is no record
+    """
+    return _update_item(endpoint_table, {'endpoint_name': endpoint_name}, update_partial)
+
+
+def log_gc_run(run_name, report, timestamp):
+    """
+    record what a garbage collection run deleted, kept out of the project and status indexes like checkpoints
+        :param run_name: record name in job table
+        :param report: deleted_models, deleted_endpoint_configs and failed resource names
+        :param timestamp: epoch seconds of the run
+    """
+    job_table.put_item(Item={
+        'job_name': run_name,
+        'job_type': 'GarbageCollection',
+        'timestamp_queued': timestamp,
+        'deleted_models': json.dumps(report.get('deleted_models', [])),
+        'deleted_endpoint_configs': json.dumps(report.get('deleted_endpoint_configs', [])),
+        'failed': json.dumps(report.get('failed', [])),
+    })
+
+
+def get_checkpoint(checkpoint_name):
+    """
+    job names left over by an unfinished status pass
+        :param checkpoint_name: checkpoint record name in job table
+    """
+    response = job_table.get_item(Key={'job_name': checkpoint_name})
+    return json.loads(response.get('Item', {}).get('pending_jobs') or '[]')
+
+
+def save_checkpoint(checkpoint_name, pending_jobs):
+    """
+    persist job names not reconciled within the time budget, clear checkpoint when nothing is pending
+        :param checkpoint_name: checkpoint record name in job table
+        :param pending_jobs: list of job names
+    """
+    if not pending_jobs:
+        job_table.delete_item(Key={'job_name': checkpoint_name})
+        return
+    job_table.put_item(Item={
+        'job_name': checkpoint_name,
+        'job_type': 'Checkpoint',
+        'pending_jobs': json.dumps(pending_jobs),
+        'time_updated': maya.now().epoch,
+    })
@@ -0,0 +1,573 @@
+import json
+from enum import Enum
+import maya
+from botocore.exceptions import ClientError
+from sagemaker_svc_wrapper.configs.settings import SYS_CONFIG
+from sagemaker_svc_wrapper.handlers import sagemaker_handler, dynamo_handler, sqs_handler, autoscaling_handler, \
+    concurrent_handler, s3_handler
+from sagemaker_svc_wrapper.handlers.concurrent_handler import Step
+
+IN_FLIGHT_STATUSES = ['Creating', 'Updating']
+# sagemaker rejects transform jobs where max_concurrent_transforms * max_payload_mb exceeds this
+MAX_TRANSFORM_PAYLOAD_MB = 100
+
+
+class JobStatus(Enum):
+    """
+    job status
+    """
+    Inactive = 0
+    Running = 1
+    Ready = 2
+
+
+class JobType(Enum):
+    Train = "Train"
+    Serve = "Serve"
+    Transform = "Transform"
+    Sweep = "Sweep"
+
+
+class HostingMode(Enum):
+    """
+    where serve jobs of a project run: an endpoint of their own, or as target models of a shared endpoint
+    """
+    Dedicated = "Dedicated"
+    MultiModel = "MultiModel"
+
+
+class JobError(Exception):
+    """
+    job request that can not be carried out, not worth retrying
+        :param message: error message
+        :param status_code: http status for api callers
+        :param body: response body for api callers, abort(status_code, message) when None
+    """
+    def __init__(self, message, status_code=400, body=None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.body = body
+
+
+def _already_exists(error):
+    message = error.response.get('Error', {}).get('Message', '')
+    return error.response.get('Error', {}).get('Code') in ('ValidationException', 'ResourceInUse') \
+        and 'exist' in message
+
+
+def _resumable(call, resume, *args, **kwargs):
+    """
+    run a sagemaker create call, when resuming an earlier attempt the resource may already exist
+        :return: call result, None when the resource was created by an earlier attempt
+    """
+    try:
+        return call(*args, **kwargs)
+    except ClientError as error:
+        if resume and _already_exists(error):
+            return None
+        raise
+
+
+def train_channels(job, spec_train):
+    """
+    input channels of a train job, the single data_input becomes the train channel.
+    job level input_mode, distribution and compression come first, then the spec_train defaults
+        :param job: train payload
+        :param spec_train: spec_train of the job or the project model
+        :return: list of channel dicts, every setting filled in
+    """
+    channels = job.get('channels') or [{'channel_name': 'train', 'data_input': job.get('data_input')}]
+    distribution = job.get('distribution') or spec_train.get('S3DataDistributionType', 'FullyReplicated')
+    compression = job.get('compression') or spec_train.get('CompressionType', 'None')
+
+    names = [channel.get('channel_name') for channel in channels]
+    if len(set(names)) != len(names):
+        raise JobError('channel names must be unique')
+    if any(not channel.get('data_input') for channel in channels):
+        raise JobError('data_input required for every channel')
+
+    filled = []
+    for channel in channels:
+        channel = dict(channel)
+        channel.setdefault('distribution', distribution)
+        channel.setdefault('compression', compression)
+        filled.append(channel)
+    return filled
+
+
+def prepare_train_job(project_name, job_request):
+    """
+    validate a train request and fill in defaults of the project model
+        :param project_name:
+        :param job_request: train payload
+        :return: job dict with job_name, channels, input_mode and timestamp_queued
+    """
+    job = dict(job_request)
+    project_description = dynamo_handler.get_project_model(project_name, job.get('variant_name', 'default'))
+    if not job.get('image_train'):
+        job['image_train'] = json.loads(project_description.get('image_train'))
+    if not job.get('spec_train'):
+        job['spec_train'] = json.loads(project_description.get('spec_train'))
+    job['channels'] = train_channels(job, job['spec_train'])
+    if not job.get('model_output'):
+        raise JobError('model_output required, the s3 path of the trained model')
+    job['input_mode'] = job.get('input_mode') or job['spec_train'].get('TrainingInputMode', 'File')
+
+    timestamp = maya.now().epoch
+    job['project_name'] = project_name
+    job['timestamp_queued'] = timestamp
+    job['job_name'] = f'{project_name}-{JobType.Train.value}-{timestamp}'
+    return job
+
+
+def submit_train_job(job, resume=False):
+    """
+    start the sagemaker training job
+        :param job: job dict from prepare_train_job
+        :param resume: an earlier attempt may have started the training job already
+        :return: job attributes to record
+    """
+    # jobs queued before channels were recorded carry data_input only
+    job_channels = job.get('channels') or train_channels(job, job['spec_train'])
+    channels = [sagemaker_handler.training_channel(channel['channel_name'], channel['data_input'],
+                                                   distribution_type=channel['distribution'],
+                                                   compression_type=channel['compression'],
+                                                   input_mode=channel.get('input_mode'),
+                                                   content_type=channel.get('content_type'),
+                                                   record_wrapper_type=channel.get('record_wrapper', 'None'),
+                                                   s3_data_type=channel.get('s3_data_type', 'S3Prefix'))
+                for channel in job_channels]
+    _resumable(sagemaker_handler.create_training_job, resume,
+               job_name=job['job_name'],
+               image_train=job['image_train'],
+               spec_train=job['spec_train'],
+               output_model_location=job['model_output'],
+               hyperparameters=job.get('hyperparameters', {}),
+               training_input_mode=job.get('input_mode', 'File'),
+               channels=channels,
+               metric_definitions=job.get('metric_definitions'))
+    # training progress is tracked by the status cron through the endpoint_status index
+    return {'status': JobStatus.Running.value, 'endpoint_status': 'Training'}
+
+
+def prepare_transform_job(project_name, job_request):
+    """
+    validate a transform request against the project model, the job scores with its latest_model
+        :param project_name:
+        :param job_request: transform payload
+        :return: job dict with job_name, model_name and timestamp_queued
+    """
+    job = dict(job_request)
+    variant_name = job.get('variant_name', 'default')
+    project, project_models = dynamo_handler.get_project_with_models(project_name, [variant_name],
+                                                                     all_variants=False)
+    if not project:
+        raise JobError(f'no project: {project_name} found')
+    project_model_settings = project_models.get(variant_name)
+    if not project_model_settings:
+        raise JobError(f'no model: {project_name} found')
+    if not project_model_settings.get('latest_model'):
+        raise JobError(f'no serving model for {project_name} {variant_name} yet', status_code=409)
+
+    if not job.get('instance_type'):
+        spec_serve = json.loads(project_model_settings.get('spec_serve') or '{}')
+        job['instance_type'] = spec_serve.get('InstanceType') if isinstance(spec_serve, dict) else None
+        if not job['instance_type']:
+            raise JobError('instance_type required, the model has no spec_serve InstanceType')
+    payload_mb = (job.get('max_concurrent_transforms') or 1) * (job.get('max_payload_mb') or 0)
+    if payload_mb > MAX_TRANSFORM_PAYLOAD_MB:
+        raise JobError(f'max_concurrent_transforms * max_payload_mb above {MAX_TRANSFORM_PAYLOAD_MB}')
+
+    timestamp = maya.now().epoch
+    job['variant_name'] = variant_name
+    job['model_name'] = project_model_settings['latest_model']
+    job['timestamp_queued'] = timestamp
+    job['job_name'] = f'{project_name}-{JobType.Transform.value}-{timestamp}'
+    return job
+
+
+def submit_transform_job(job, resume=False):
+    """
+    start the sagemaker batch transform job
+        :param job: job dict from prepare_transform_job
+        :param resume: an earlier attempt may have started the transform job already
+        :return: job attributes to record
+    """
+    _resumable(sagemaker_handler.create_transform_job, resume,
+               job_name=job['job_name'],
+               model_name=job['model_name'],
+               input_data_location=job['data_input'],
+               output_data_location=job['data_output'],
+               instance_type=job['instance_type'],
+               instance_count=job.get('instance_count', 1),
+               batch_strategy=job.get('batch_strategy', 'MultiRecord'),
+               max_payload_mb=job.get('max_payload_mb'),
+               max_concurrent_transforms=job.get('max_concurrent_transforms'),
+               split_type=job.get('split_type', 'Line'),
+               content_type=job.get('content_type'),
+               accept=job.get('accept'),
+               assemble_with=job.get('assemble_with'),
+               enviroment_variable=job.get('env_transform'))
+    # tracked like training jobs, by the status cron and state change events
+    return {'status': JobStatus.Running.value, 'endpoint_status': 'Transforming'}
+
+
+def multi_model_endpoint(project):
+    """
+    shared endpoint of a MultiModel project, '' for dedicated hosting
+        :param project: project item
+    """
+    if project.get('hosting_mode') != HostingMode.MultiModel.value:
+        return ''
+    endpoint_name = project.get('multi_model_endpoint') or SYS_CONFIG.multi_model_endpoint
+    if not endpoint_name:
+        raise JobError('multi model hosting is not configured, no multi_model_endpoint in settings or project',
+                       status_code=409)
+    return endpoint_name
+
+
+def check_artifact_source(model_artifacts):
+    """
+    multi model serve jobs copy their artifact, only from the buckets the lambda role may read
+        :param model_artifacts: s3:// uri of a model.tar.gz
+    """
+    try:
+        bucket, _ = s3_handler.split_uri(str(model_artifacts or ''))
+    except ValueError:
+        raise JobError('model_artifacts must be the s3 uri of a model.tar.gz for multi model hosting')
+    if bucket not in SYS_CONFIG.model_artifact_buckets:
+        raise JobError(f'model_artifacts bucket {bucket} is not one of model_artifact_buckets in settings')
+
+
+def target_model_location(endpoint_name, project_name, job_name):
+    """
+    where a serve job puts its artifact on a multi model endpoint
+        :return: (bucket, key, TargetModel), TargetModel is the key relative to the endpoint prefix
+    """
+    target_model = f'{project_name}/{job_name}.tar.gz'
+    return SYS_CONFIG.multi_model_bucket, f'{endpoint_name}/{target_model}', target_model
+
+
+def delete_target_model(job):
+    """
+    remove the artifact a retired multi model job copied under the shared endpoint prefix,
+    sagemaker would otherwise keep it listed and loadable
+        :param job: job item with multi_model_endpoint and target_model
+    """
+    s3_handler.delete_object(SYS_CONFIG.multi_model_bucket, f"{job['multi_model_endpoint']}/{job['target_model']}")
+
+
+def prepare_serve_job(project_name, job_request):
+    """
+    validate a serve request against the project and its variant model
+        :param project_name:
+        :param job_request: serve payload
+        :return: (job dict, project, project models by variant)
+    """
+    job = dict(job_request)
+    variant_name = job.get('variant_name', 'default')
+    # formated job name versioned by timestamp
+    timestamp = maya.now().epoch
+    job_name = f'{project_name}-{JobType.Serve.value}-{timestamp}'
+
+    # project and all variant models in one or two batch reads
+    project, project_models = dynamo_handler.get_project_with_models(project_name, [variant_name])
+    project_model_settings = project_models.get(variant_name)
+    if not project_model_settings:
+        raise JobError(f'no model: {project_name} found')
+
+    if not project:
+        raise JobError(f'no project: {project_name} found')
+
+    if not job.get('image_serve') and project_model_settings.get('image_serve'):
+        job['image_serve'] = json.loads(project_model_settings['image_serve'])
+    if not job.get('env_serve') and project_model_settings.get('env_serve'):
+        job['env_serve'] = json.loads(project_model_settings['env_serve'])
+    if multi_model_endpoint(project):
+        check_artifact_source(job.get('model_artifacts'))
+
+    job['timestamp_queued'] = timestamp
+    job['job_name'] = job_name
+    return job, project, project_models
+
+
+def submit_serve_job(project_name, job, project=None, project_models=None, resume=False):
+    """
+    create model and endpoint config of the job, then create or update the endpoint, independent calls run concurrently.
+    when the project endpoint already serves the same variants, specs and model contents nothing is deployed
+        :param project_name:
+        :param job: job dict from prepare_serve_job
+        :param project: project item, read when None
+        :param project_models: project models by variant, read when None
+        :param resume: an earlier attempt may have created some of the resources already
+        :return: job attributes to record
+    """
+    job_name = job['job_name']
+    variant_name = job.get('variant_name', 'default')
+    if project is None or project_models is None:
+        project, project_models = dynamo_handler.get_project_with_models(project_name, [variant_name])
+        if not project:
+            raise JobError(f'no project: {project_name} found')
+
+    if multi_model_endpoint(project):
+        return submit_multi_model_serve_job(project_name, job, project)
+
+    variants = json.loads(project['variants'])
+    config_variants = []
+
+    if project.get('is_auto_deploy') and (variant_name in variants):
+        #deploy is required
+        for variant, weight in variants.items():
+            project_model_settings = project_models.get(variant, {})
+            if project_model_settings.get('spec_serve'):
+                job_spec_serve = json.loads(project_model_settings['spec_serve'])
+                job_spec_serve['VariantName'] = variant
+                job_spec_serve['InitialVariantWeight'] = weight
+                if variant == variant_name:
+                    job_spec_serve['ModelName'] = job_name
+                    config_variants.append(job_spec_serve)
+                elif project_model_settings.get('latest_model'):
+                    job_spec_serve['ModelName'] = project_model_settings['latest_model']
+                    config_variants.append(job_spec_serve)
+
+    # identical deployment already serving: record the job, skip every sagemaker call
+    fingerprints = {job_name: sagemaker_handler.model_fingerprint(job['image_serve'], job.get('model_artifacts'),
+                                                                  job.get('env_serve'))}
+    config_hash = None
+    if config_variants:
+        live_endpoint = dynamo_handler.get_endpoint(project['serving_endpoint']) \
+            if project.get('serving_endpoint') else {}
+        fingerprints = dict(json.loads(live_endpoint.get('model_fingerprints') or '{}'), **fingerprints)
+        config_hash = sagemaker_handler.production_variants_hash(config_variants, fingerprints)
+        if live_endpoint.get('config_hash') == config_hash and \
+                sagemaker_handler.describe_endpoint(live_endpoint['endpoint_name']).get('EndpointStatus') == 'InService':
+            return {'endpoint_status': 'Reused', 'reused_endpoint': live_endpoint['endpoint_name'],
+                    'config_hash': config_hash}
+
+    def create_model(results):
+        sagemaker_model = _resumable(sagemaker_handler.create_model, resume, job_name,
+                                     job['image_serve'],
+                                     model_artifacts=job.get('model_artifacts'),
+                                     enviroment_variable=job.get('env_serve'))
+        # None: created by an earlier attempt
+        if sagemaker_model is not None and not sagemaker_model.arn:
+            raise JobError('unable to create model', body='unable to create model')
+        return sagemaker_model
+
+    if not config_variants:
+        create_model({})
+        #TODO: TBD when to promote to project model level
+        # job_request['endpoint_status'] = 'ModelCreatedOnly'
+        # dynamo_handler.update_project_model(project_name, variant_name, {'latest_model': job_name})
+        return {}
+
+    def create_endpoint_config(results):
+        # AutoScaling stays in the recorded config, it is applied once the endpoint is InService
+        endpoint_config = _resumable(sagemaker_handler.create_endpoint_config, resume, job_name,
+                                     [autoscaling_handler.sagemaker_variant(variant) for variant in config_variants])
+        if endpoint_config is not None and not endpoint_config.arn:
+            raise JobError('endpoint config failed')
+        return endpoint_config
+
+    def existing_endpoint(results):
+        # check exiting endpoint status
+        endpoint_status = sagemaker_handler.describe_endpoint(job_name)
+        status = endpoint_status.get('EndpointStatus')
+        if status in IN_FLIGHT_STATUSES and not resume:
+            #NOTE: when sagemaker endpoint is in update or creating status,
+            #endpoints are unable to respond to other command
+            raise JobError(f'endpoint is {status}', body={'status': f'endpoint is {status}'})
+        return endpoint_status
+
+    def deploy(results):
+        endpoint_status = results['existing']
+        if not endpoint_status:
+            return sagemaker_handler.create_endpoint(job_name)
+        if endpoint_status.get('EndpointStatus') in IN_FLIGHT_STATUSES:
+            # started by an earlier attempt
+            return endpoint_status
+        #update existing
+        return sagemaker_handler.update_endpoint(job_name)
+
+    def record_endpoint(results):
+        dynamo_handler.create_endpoint(job_name,
+                                       project_name=project_name,
+                                       config_hash=config_hash,
+                                       model_fingerprints=json.dumps(
+                                           {variant['ModelName']: fingerprints.get(variant['ModelName'],
+                                                                                   variant['ModelName'])
+                                            for variant in config_variants}),
+                                       endpoint_config=json.dumps(config_variants))
+
+    # model and endpoint config are created while the job endpoint is looked up,
+    # the deployment record is only written once sagemaker accepted the endpoint
+    results = concurrent_handler.run_graph({
+        'model': Step((), create_model),
+        'endpoint_config': Step(('model',), create_endpoint_config),
+        'existing': Step((), existing_endpoint),
+        'endpoint': Step(('endpoint_config', 'existing'), deploy),
+        'record': Step(('endpoint',), record_endpoint),
+    })
+
+    updates = {'endpoint_config': json.dumps(config_variants), 'config_hash': config_hash}
+    if results['endpoint_config'] is not None:
+        updates['endpoint_config_arn'] = results['endpoint_config'].arn
+    if results['endpoint']:
+        updates['endpoint_status'] = results['endpoint'].get('EndpointStatus')
+    return updates
+
+
+def submit_multi_model_serve_job(project_name, job, project):
+    """
+    serve job of a MultiModel project: the model artifact is copied under the shared endpoint prefix
+    and the project points at it as TargetModel, no model or endpoint is created. sagemaker loads the
+    artifact on the first invocation, so the job is InService right away
+        :param project_name:
+        :param job: job dict from prepare_serve_job
+        :param project: project item
+        :return: job attributes to record
+    """
+    job_name = job['job_name']
+    variant_name = job.get('variant_name', 'default')
+    endpoint_name = multi_model_endpoint(project)
+    status = sagemaker_handler.describe_endpoint(endpoint_name).get('EndpointStatus')
+    if status not in ('InService', 'Updating'):
+        raise JobError(f"multi model endpoint {endpoint_name} is {status or 'missing'}", status_code=409)
+
+    bucket, key, target_model = target_model_location(endpoint_name, project_name, job_name)
+    # artifacts already under the prefix are registered as they are, copying again is harmless on resume
+    if job['model_artifacts'] != f's3://{bucket}/{key}':
+        check_artifact_source(job['model_artifacts'])
+        s3_handler.copy_object(job['model_artifacts'], bucket, key)
+    updates = {'multi_model_endpoint': endpoint_name, 'target_model': target_model}
+
+    if not (project.get('is_auto_deploy') and variant_name in json.loads(project['variants'])):
+        return dict(updates, endpoint_status='ModelCreatedOnly')
+
+    # same pointer order as a dedicated promotion: project model, project, then the previous model retires
+    replaced = dynamo_handler.update_project_model(project_name, variant_name, {'latest_model': job_name},
+                                                   return_values='UPDATED_OLD')
+    dynamo_handler.update_project(project_name, {'serving_endpoint': endpoint_name, 'target_model': target_model})
+    previous_model = replaced.get('latest_model')
+    if previous_model and previous_model != job_name:
+        previous_job = dynamo_handler.get_job(previous_model)
+        if previous_job.get('target_model'):
+            delete_target_model(previous_job)
+        else:
+            # the project moved over from a dedicated endpoint
+            previous_config = json.loads(dynamo_handler.get_endpoint(previous_model).get('endpoint_config') or '[]')
+            autoscaling_handler.remove_endpoint_scaling(previous_model, previous_config)
+            sagemaker_handler.delete_endpoint(previous_model)
+        dynamo_handler.update_job(previous_model, {'endpoint_status': 'Retired'}, forward_only=True)
+    return dict(updates, endpoint_status='InService')
+
+
+def _record_traffic(endpoint_name, variants, instance_counts):
+    """
+    keep the endpoint record and its config hash in line with weights changed in place
+    """
+    record = dynamo_handler.get_endpoint(endpoint_name)
+    if not record.get('endpoint_config'):
+        return
+    config_variants = json.loads(record['endpoint_config'])
+    for variant in config_variants:
+        variant['InitialVariantWeight'] = variants[variant['VariantName']]
+        if variant['VariantName'] in instance_counts:
+            variant['InitialInstanceCount'] = instance_counts[variant['VariantName']]
+    fingerprints = json.loads(record.get('model_fingerprints') or '{}')
+    dynamo_handler.update_endpoint(endpoint_name, {
+        'endpoint_config': json.dumps(config_variants),
+        'config_hash': sagemaker_handler.production_variants_hash(config_variants, fingerprints),
+    })
+
+
+def redeploy_job(project_name, project_models, variants):
+    """
+    serve job that redeploys the live models of the project under a new endpoint,
+    the model of one variant is cloned under the job name so promotion and retirement work as for any serve job
+        :return: job dict for submit_serve_job or queue_job, None when no variant has a model yet
+    """
+    variant_name = next((variant for variant in variants if project_models.get(variant, {}).get('latest_model')), None)
+    if variant_name is None:
+        return None
+    container = sagemaker_handler.describe_model(project_models[variant_name]['latest_model'])['PrimaryContainer']
+    job, _, _ = prepare_serve_job(project_name, {'variant_name': variant_name,
+                                                 'image_serve': container['Image'],
+                                                 'model_artifacts': container.get('ModelDataUrl'),
+                                                 'env_serve': container.get('Environment')})
+    return job
+
+
+def shift_traffic(project_name, variants, instance_counts=None):
+    """
+    change variant weights (and instance counts) of the project.
+    the live endpoint is updated in place when it serves the same variant set,
+    a new variant set needs a redeploy: the returned job is to be submitted or queued by the caller
+        :param project_name:
+        :param variants: variant name to weight
+        :param instance_counts: optional variant name to instance count
+        :return: dict with mode 'saved' (no live endpoint), 'in_place' or 'redeploy' (with 'job')
+    """
+    instance_counts = instance_counts or {}
+    if not variants or any(not isinstance(weight, (int, float)) or weight < 0 for weight in variants.values()):
+        raise JobError('variants must map variant names to non negative weights')
+    if set(instance_counts) - set(variants):
+        raise JobError('instance_counts for variants not in variants')
+
+    project, project_models = dynamo_handler.get_project_with_models(project_name, list(variants),
+                                                                     consistent_read=True)
+    if not project:
+        raise JobError(f'no project: {project_name} found', status_code=404)
+    if multi_model_endpoint(project):
+        raise JobError('a multi model project serves a single target model, traffic needs dedicated hosting',
+                       status_code=409)
+    missing = [variant for variant in variants if variant not in project_models]
+    if missing:
+        raise JobError(f'no model for variants: {", ".join(missing)}')
+
+    endpoint_name = project.get('serving_endpoint')
+    endpoint = sagemaker_handler.describe_endpoint(endpoint_name) if endpoint_name else {}
+    live_variants = {variant['VariantName'] for variant in endpoint.get('ProductionVariants', [])}
+
+    if endpoint and live_variants == set(variants):
+        if endpoint.get('EndpointStatus') != 'InService':
+            raise JobError(f"endpoint is {endpoint.get('EndpointStatus')}", status_code=409)
+        desired = []
+        for variant, weight in variants.items():
+            desired_variant = {'VariantName': variant, 'DesiredWeight': weight}
+            if variant in instance_counts:
+                desired_variant['DesiredInstanceCount'] = instance_counts[variant]
+            desired.append(desired_variant)
+        sagemaker_handler.update_endpoint_weights_and_capacities(endpoint_name, desired)
+        dynamo_handler.update_project(project_name, {'variants': json.dumps(variants)})
+        _record_traffic(endpoint_name, variants, instance_counts)
+        return {'mode': 'in_place', 'endpoint_name': endpoint_name, 'variants': variants}
+
+    dynamo_handler.update_project(project_name, {'variants': json.dumps(variants)})
+    job = redeploy_job(project_name, project_models, variants) if endpoint else None
+    if job is None:
+        return {'mode': 'saved', 'variants': variants}
+    return {'mode': 'redeploy', 'variants': variants, 'job': job}
+
+
+def queue_job(job_type, project_name, job):
+    """
+    record the job as Queued and hand it to the job queue worker
+        :param job_type: JobType value
+        :param project_name:
+        :param job: job dict from prepare_train_job, prepare_serve_job or prepare_transform_job
+        :return: job name
+    """
+    record = {key: value for key, value in job.items() if key != 'project_name'}
+    record['endpoint_status'] = 'Queued'
+    job_name = dynamo_handler.log_job(project_name, job_type, **record)
+    if not job_name:
+        raise JobError('job not created', status_code=500)
+    try:
+        sqs_handler.send_job(job_type, project_name, job)
+    except Exception:
+        dynamo_handler.update_job(job_name, {'endpoint_status': 'Failed', 'error_message': 'not queued'},
+                                  forward_only=True)
+        raise
+    return job_name
@@ -0,0 +1,277 @@
+import json
+import threading
+from collections import namedtuple
+from botocore.exceptions import ClientError
+from sagemaker_svc_wrapper.configs import clients
+from sagemaker_svc_wrapper.handlers import dynamo_handler
+
+RUNTIME_SERVICE = 'sagemaker-runtime'
+TARGET_VARIANT_HEADER = 'X-Amzn-SageMaker-Target-Variant'
+TARGET_MODEL_HEADER = 'X-Amzn-SageMaker-Target-Model'
+# invoke_endpoint parameters newer than the pinned botocore models, sent as the headers the service reads
+HEADER_PARAMS = {
+    'TargetVariant': TARGET_VARIANT_HEADER,
+    'TargetModel': TARGET_MODEL_HEADER,
+}
+
+# resolved on first use through the shared client registry, one keep-alive connection pool per container
+runtime = clients.LazyClient(RUNTIME_SERVICE)
+
+InvokeResult = namedtuple('InvokeResult', ['endpoint_name', 'variant_name', 'content_type', 'body',
+                                           'custom_attributes'])
+
+# max_batch_size records, max_wait seconds
+BatchingConfig = namedtuple('BatchingConfig', ['max_batch_size', 'max_wait'])
+
+JSON_CONTENT_TYPE = 'application/json'
+CSV_CONTENT_TYPE = 'text/csv'
+
+
+class BatchSplitError(ValueError):
+    """
+    a batched response that does not hold one output per record
+    """
+
+
+def _pop_header_params(params, model, context, **kwargs):
+    # the pinned botocore models predate TargetVariant and TargetModel, carry them over to headers
+    for name in HEADER_PARAMS:
+        if name in params and name not in model.input_shape.members:
+            context.setdefault('header_params', {})[name] = params.pop(name)
+
+
+def _add_header_params(params, context, **kwargs):
+    for name, value in context.get('header_params', {}).items():
+        if value:
+            params['headers'][HEADER_PARAMS[name]] = value
+
+
+def target_variant_hooks(client):
+    """
+    let invoke_endpoint take TargetVariant and TargetModel whether or not the botocore model knows them
+        :param client: sagemaker-runtime botocore client
+    """
+    events = client.meta.events
+    events.register('before-parameter-build.sagemaker-runtime.InvokeEndpoint', _pop_header_params,
+                    unique_id='runtime-pop-target-variant')
+    events.register('before-call.sagemaker-runtime.InvokeEndpoint', _add_header_params,
+                    unique_id='runtime-add-target-variant')
+    return client
+
+
+clients.customize(RUNTIME_SERVICE, target_variant_hooks)
+
+
+def _endpoint_missing(error):
+    message = error.response.get('Error', {}).get('Message', '')
+    return error.response.get('Error', {}).get('Code') == 'ValidationError' and 'not found' in message
+
+
+def _invoke(target, params):
+    if target.target_model:
+        params = dict(params, TargetModel=target.target_model)
+    response = runtime.invoke_endpoint(EndpointName=target.endpoint_name, **params)
+    return InvokeResult(endpoint_name=target.endpoint_name,
+                        variant_name=response.get('InvokedProductionVariant'),
+                        content_type=response.get('ContentType'),
+                        body=response['Body'].read(),
+                        custom_attributes=response.get('CustomAttributes'))
+
+
+def _invoke_serving(project_name, target, params):
+    """
+    invoke the ServingTarget, on a stale endpoint name read the project again and retry once
+        :return: InvokeResult, None when the project serves no endpoint any more
+    """
+    try:
+        return _invoke(target, params)
+    except ClientError as error:
+        if not _endpoint_missing(error):
+            raise
+        current = dynamo_handler.get_serving_target(project_name, consistent_read=True)
+        if not current.endpoint_name:
+            return None
+        if current == target:
+            raise
+        return _invoke(current, params)
+
+
+def batching_config(project_name, variant_name=None):
+    """
+    batching of the models a request can land on, the tightest of them when weighted routing picks the variant
+        :param project_name:
+        :param variant_name: invoked variant, every variant of the project without
+        :return: BatchingConfig, None when one of the models does not batch
+    """
+    _, project_models = dynamo_handler.get_project_with_models(project_name,
+                                                               [variant_name] if variant_name else (),
+                                                               all_variants=not variant_name)
+    if not project_models:
+        return None
+    configs = [json.loads(model.get('batching') or 'null') for model in project_models.values()]
+    if not all(configs):
+        return None
+    return BatchingConfig(max_batch_size=min(int(config['max_batch_size']) for config in configs),
+                          max_wait=min(int(config['max_wait_ms']) for config in configs) / 1000.0)
+
+
+def mime_type(content_type):
+    return (content_type or '').split(';')[0].strip().lower()
+
+
+def payload_records(content_type, body):
+    """
+    records of a batchable payload: {"instances": [...]} json or csv lines
+        :return: list of records, None when the payload can't be merged with others
+    """
+    content_type = mime_type(content_type)
+    if content_type == JSON_CONTENT_TYPE:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return None
+        if isinstance(payload, dict) and list(payload) == ['instances'] and isinstance(payload['instances'], list):
+            return payload['instances'] or None
+        return None
+    if content_type == CSV_CONTENT_TYPE:
+        return [line for line in body.splitlines() if line.strip()] or None
+    return None
+
+
+def merge_records(content_type, records):
+    if mime_type(content_type) == JSON_CONTENT_TYPE:
+        return json.dumps({'instances': records}).encode()
+    return b'\n'.join(records) + b'\n'
+
+
+def split_outputs(content_type, body, counts):
+    """
+    cut a batched response into one body per request
+        :param content_type: response content type
+        :param body: response body
+        :param counts: records of each request in batch order
+    """
+    if mime_type(content_type) == JSON_CONTENT_TYPE:
+        outputs = json.loads(body)
+        outputs = outputs.get('predictions') if isinstance(outputs, dict) else outputs
+        parts = [json.dumps({'predictions': outputs[sum(counts[:index]):sum(counts[:index + 1])]}).encode()
+                 for index in range(len(counts))] if isinstance(outputs, list) else []
+    else:
+        outputs = [line for line in body.splitlines() if line.strip()]
+        parts = [b'\n'.join(outputs[sum(counts[:index]):sum(counts[:index + 1])]) + b'\n'
+                 for index in range(len(counts))]
+    if not isinstance(outputs, list) or len(outputs) != sum(counts):
+        raise BatchSplitError(f'batched response of {len(outputs or [])} outputs for {sum(counts)} records')
+    return parts
+
+
+class _Batch:
+    def __init__(self):
+        self.requests = []
+        self.size = 0
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    merges concurrent requests with the same key. the first request of a batch waits up to max_wait
+    for others to join, then sends the batch for everyone, a full batch goes out at once.
+    only concurrent requests of one process meet here, e.g. behind a threaded server
+    """
+    def __init__(self):
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, records, config, send):
+        """
+        :param key: requests with equal keys share a batch
+        :param records: records of this request
+        :param config: BatchingConfig
+        :param send: function(list of records per request) returning one result per request
+        :return: result of this request
+        """
+        with self._lock:
+            batch = self._open.get(key)
+            if batch is not None and batch.size + len(records) > config.max_batch_size:
+                # no room, let the open batch go and start a new one
+                del self._open[key]
+                batch.full.set()
+                batch = None
+            leader = batch is None
+            if leader:
+                batch = _Batch()
+                self._open[key] = batch
+            index = len(batch.requests)
+            batch.requests.append(records)
+            batch.size += len(records)
+            if batch.size >= config.max_batch_size:
+                self._open.pop(key, None)
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(config.max_wait)
+            with self._lock:
+                if self._open.get(key) is batch:
+                    del self._open[key]
+            try:
+                batch.results = send(batch.requests)
+            except Exception as error:  # pylint: disable=broad-except
+                batch.error = error
+            batch.done.set()
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[index]
+
+
+batcher = MicroBatcher()
+
+
+def _send_batch(project_name, target, params, requests):
+    counts = [len(records) for records in requests]
+    batch_params = dict(params, Body=merge_records(params['ContentType'],
+                                                   [record for records in requests for record in records]))
+    result = _invoke_serving(project_name, target, batch_params)
+    if result is None:
+        return [None] * len(requests)
+    return [result._replace(body=part) for part in split_outputs(result.content_type, result.body, counts)]
+
+
+def invoke(project_name, body, content_type, accept=None, variant_name=None, custom_attributes=None):
+    """
+    forward a payload to the serving endpoint of a project.
+    the endpoint name is cached per container, a promotion done by another container
+    deletes the cached endpoint, then the name is read again and the call retried once.
+    projects on a multi model endpoint invoke it with their TargetModel.
+    with batching configured on the models, concurrent json instances or csv payloads go out as one invocation
+        :param project_name:
+        :param body: request payload bytes
+        :param content_type: mime type of body
+        :param accept: mime type wanted back
+        :param variant_name: production variant to invoke, weighted routing without
+        :param custom_attributes: opaque string passed to the model container
+        :return: InvokeResult, None when the project serves no endpoint
+    """
+    params = {'Body': body, 'ContentType': content_type}
+    if accept:
+        params['Accept'] = accept
+    if variant_name:
+        params['TargetVariant'] = variant_name
+    if custom_attributes:
+        params['CustomAttributes'] = custom_attributes
+
+    target = dynamo_handler.get_serving_target(project_name)
+    if not target.endpoint_name:
+        return None
+    config = batching_config(project_name, variant_name)
+    records = payload_records(content_type, body) if config else None
+    if not records:
+        return _invoke_serving(project_name, target, params)
+    key = (target, variant_name, content_type, accept, custom_attributes)
+    return batcher.submit(key, records, config,
+                          lambda requests: _send_batch(project_name, target, params, requests))
@@ -0,0 +1,63 @@
+import gzip
+import json
+from sagemaker_svc_wrapper.configs import clients
+from .util_handler import ndjson_lines
+
+# resolved on first use through the shared client registry
+s3 = clients.LazyClient('s3')
+
+
+def split_uri(uri):
+    """
+    (bucket, key) of an s3:// uri
+        :param uri: 
+    """
+    if not uri or not uri.startswith('s3://') or '/' not in uri[len('s3://'):]:
+        raise ValueError(f'not an s3 object uri: {uri}')
+    bucket, key = uri[len('s3://'):].split('/', 1)
+    return bucket, key
+
+
+def copy_object(source_uri, bucket, key):
+    """
+    server side copy, the bytes never pass through the caller
+        :param source_uri: s3:// uri of the object
+        :param bucket: destination bucket
+        :param key: destination key
+    """
+    source_bucket, source_key = split_uri(source_uri)
+    s3.copy_object(Bucket=bucket, Key=key, CopySource={'Bucket': source_bucket, 'Key': source_key})
+    return f's3://{bucket}/{key}'
+
+
+def delete_object(bucket, key):
+    """
+    delete an object, a key that is already gone is not an error
+        :param bucket: 
+        :param key: 
+    """
+    s3.delete_object(Bucket=bucket, Key=key)
+
+
+def put_jsonl_gz(bucket, key, items):
+    """
+    write dynamo items as gzipped newline delimited json
+        :param bucket: 
+        :param key: object key, e.g. ending in .jsonl.gz
+        :param items: iterable of dynamo items
+        :return: compressed size in bytes
+    """
+    body = gzip.compress(''.join(ndjson_lines(items)).encode())
+    s3.put_object(Bucket=bucket, Key=key, Body=body, ContentType='application/x-ndjson', ContentEncoding='gzip')
+    return len(body)
+
+
+def get_jsonl_gz(bucket, key):
+    """
+    items of an object written by put_jsonl_gz
+        :param bucket: 
+        :param key: 
+        :return: list of dicts
+    """
+    body = gzip.decompress(s3.get_object(Bucket=bucket, Key=key)['Body'].read())
+    return [json.loads(line) for line in body.decode().splitlines() if line]
@@ -1,53 +1,110 @@
 from collections import namedtuple
+from decimal import Decimal
+import hashlib
 import json
-import boto3
 import botocore
 from sagemaker_svc_wrapper.configs.settings import SYS_CONFIG
+from sagemaker_svc_wrapper.configs import clients
+from sagemaker_svc_wrapper.handlers import util_handler
 
 
-sagemaker = boto3.client('sagemaker')
+# resolved on first use through the shared client registry
+sagemaker = clients.LazyClient('sagemaker')
 
 EndpointConfig = namedtuple('EndpointConfig', ['endpoint_config_name', 'arn'])
 Endpoint = namedtuple('Endpoint', ['endpoint_name', 'arn'])
 SageMakerModel = namedtuple('SageMakerModel', ['model_name', 'arn'])
 
+# spec_train keys sent as ResourceConfig, the others hold training input defaults
+RESOURCE_CONFIG_KEYS = ('InstanceCount', 'InstanceType', 'VolumeSizeInGB', 'VolumeKmsKeyId')
+
+
+def training_channel(channel_name,
+                     input_data_location,
+                     distribution_type='FullyReplicated',
+                     compression_type='None',
+                     input_mode=None,
+                     content_type=None,
+                     record_wrapper_type='None',
+                     s3_data_type='S3Prefix'):
+    """
+    one InputDataConfig channel
+        :param channel_name: e.g. train, validation, test
+        :param input_data_location: s3 prefix or manifest file
+        :param distribution_type: ShardedByS3Key gives every instance its own part of the objects
+        :param compression_type: None or Gzip
+        :param input_mode: File, Pipe or FastFile for this channel, the job TrainingInputMode without
+        :param content_type: mime type of the records
+        :param record_wrapper_type: None or RecordIO, for pipe mode
+        :param s3_data_type: S3Prefix or ManifestFile
+    """
+    channel = {
+        'ChannelName': channel_name,
+        'DataSource': {
+            'S3DataSource': {
+                'S3DataType': s3_data_type,
+                'S3Uri': input_data_location,
+                'S3DataDistributionType': distribution_type
+            }
+        },
+        'CompressionType': compression_type,
+        'RecordWrapperType': record_wrapper_type
+    }
+    if input_mode:
+        channel['InputMode'] = input_mode
+    if content_type:
+        channel['ContentType'] = content_type
+    return channel
+
+
 def create_training_job(job_name,
                         image_train,
                         spec_train,
-                        input_data_location,
-                        output_model_location,
+                        input_data_location=None,
+                        output_model_location=None,
                         hyperparameters={},
                         input_data_distribution_type='FullyReplicated',
-                        max_runtime=3600):
+                        max_runtime=3600,
+                        training_input_mode='File',
+                        channels=None,
+                        metric_definitions=None):
+    """
+    start a training job
+        :param job_name:
+        :param image_train: training image
+        :param spec_train: InstanceCount, InstanceType, VolumeSizeInGB, input default keys are left out
+        :param input_data_location: s3 prefix of a single train channel, when channels is not given
+        :param output_model_location: s3 path for the model artifacts
+        :param hyperparameters:
+        :param input_data_distribution_type: distribution of the single train channel
+        :param max_runtime: seconds
+        :param training_input_mode: File, Pipe or FastFile. FastFile is newer than the pinned botocore model,
+                                    botocore does not validate enums so it still reaches sagemaker
+        :param channels: InputDataConfig channels from training_channel
+        :param metric_definitions: [{'Name', 'Regex'}] metrics parsed from the training logs
+    """
+    if not channels:
+        channels = [training_channel('train', input_data_location, distribution_type=input_data_distribution_type)]
 
     training_job_payload = {
         'AlgorithmSpecification': {
             'TrainingImage': image_train,
-            'TrainingInputMode': 'File'
+            'TrainingInputMode': training_input_mode
         },
         'RoleArn': SYS_CONFIG.role,
         'OutputDataConfig': {
             'S3OutputPath': output_model_location
         },
-        'ResourceConfig': spec_train,
+        'ResourceConfig': {key: value for key, value in spec_train.items() if key in RESOURCE_CONFIG_KEYS},
         'TrainingJobName': job_name,
         'StoppingCondition': {
             'MaxRuntimeInSeconds': max_runtime
         },
-        'InputDataConfig': [{
-            'ChannelName': 'train',
-            'DataSource': {
-                'S3DataSource': {
-                    'S3DataType': 'S3Prefix',
-                    'S3Uri': input_data_location,
-                    'S3DataDistributionType': input_data_distribution_type
-                }
-            },
-            'CompressionType': 'None',
-            'RecordWrapperType': 'None'
-        }]}
+        'InputDataConfig': channels}
     if hyperparameters:
         training_job_payload['HyperParameters'] = hyperparameters
+    if metric_definitions:
+        training_job_payload['AlgorithmSpecification']['MetricDefinitions'] = metric_definitions
 
     sagemaker.create_training_job(**training_job_payload)
 
@@ -55,6 +112,79 @@ def create_training_job(job_name,
     return status
 
 
+def create_transform_job(job_name,
+                         model_name,
+                         input_data_location,
+                         output_data_location,
+                         instance_type,
+                         instance_count=1,
+                         batch_strategy='MultiRecord',
+                         max_payload_mb=None,
+                         max_concurrent_transforms=None,
+                         split_type='Line',
+                         content_type=None,
+                         accept=None,
+                         assemble_with=None,
+                         enviroment_variable=None):
+    """
+    batch transform of an s3 prefix with an existing model
+        :param job_name: transform job name
+        :param model_name: sagemaker model, e.g. latest_model of a project model
+        :param input_data_location: s3 prefix of records to score
+        :param output_data_location: s3 path for the results
+        :param instance_type:
+        :param instance_count:
+        :param batch_strategy: MultiRecord packs records into payloads up to max_payload_mb, SingleRecord sends one
+        :param max_payload_mb: payload size limit per invocation
+        :param max_concurrent_transforms: parallel invocations per instance
+        :param split_type: how input files are cut into records, None, Line or RecordIO
+        :param content_type: mime type of the records
+        :param accept: mime type of the results
+        :param assemble_with: Line joins results of a file line by line
+        :param enviroment_variable: enviroment variables for the serving container
+    """
+    transform_input = {
+        'DataSource': {
+            'S3DataSource': {
+                'S3DataType': 'S3Prefix',
+                'S3Uri': input_data_location
+            }
+        },
+        'SplitType': split_type
+    }
+    if content_type:
+        transform_input['ContentType'] = content_type
+    transform_output = {'S3OutputPath': output_data_location}
+    if accept:
+        transform_output['Accept'] = accept
+    if assemble_with:
+        transform_output['AssembleWith'] = assemble_with
+
+    transform_job_payload = {
+        'TransformJobName': job_name,
+        'ModelName': model_name,
+        'BatchStrategy': batch_strategy,
+        'TransformInput': transform_input,
+        'TransformOutput': transform_output,
+        'TransformResources': {
+            'InstanceType': instance_type,
+            'InstanceCount': instance_count
+        }}
+    if max_payload_mb is not None:
+        transform_job_payload['MaxPayloadInMB'] = max_payload_mb
+    if max_concurrent_transforms is not None:
+        transform_job_payload['MaxConcurrentTransforms'] = max_concurrent_transforms
+    if enviroment_variable:
+        transform_job_payload['Environment'] = enviroment_variable
+
+    response = sagemaker.create_transform_job(**transform_job_payload)
+    return response.get('TransformJobArn', '')
+
+
+def describe_transform_job(job_name):
+    return sagemaker.describe_transform_job(TransformJobName=job_name)
+
+
 def create_model(model_name, inference_image, model_artifacts=None, enviroment_variable={}):
     """
     docstring here
@@ -97,6 +227,10 @@ def create_model(model_name, inference_image, model_artifacts=None, enviroment_v
     return SageMakerModel(model_name, create_model_response.get('ModelArn', ''))
 
 
+def describe_model(model_name):
+    return sagemaker.describe_model(ModelName=model_name)
+
+
 def create_endpoint_config(endpoint_config_name, production_variants=[]):
     # ([{
     #         'InstanceType': 'ml.m4.xlarge',
@@ -111,11 +245,179 @@ def create_endpoint_config(endpoint_config_name, production_variants=[]):
     return EndpointConfig(endpoint_config_name, create_endpoint_config_response.get('EndpointConfigArn', ''))
 
 
+def _canonical(value):
+    """
+    json friendly copy with every number as float, so 1, 1.0 and Decimal('1') compare equal
+    """
+    if isinstance(value, dict):
+        return {key: _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(_canonical(value), sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def model_fingerprint(inference_image, model_artifacts=None, enviroment_variable=None):
+    """
+    content hash of a serving container, models built from the same image, artifacts and environment share it
+        :param inference_image: containerized docker image url from ecr
+        :param model_artifacts: saved model output
+        :param enviroment_variable: enviroment variables for the serving container
+    """
+    return _digest({'Image': inference_image,
+                    'ModelDataUrl': model_artifacts or '',
+                    'Environment': enviroment_variable or {}})
+
+
+def production_variants_hash(production_variants, model_fingerprints={}):
+    """
+    canonical hash of endpoint config variants, independent of variant order and number types.
+    models are compared by fingerprint where known, by name otherwise
+        :param production_variants: ProductionVariants of create_endpoint_config
+        :param model_fingerprints: model name to model_fingerprint
+    """
+    canonical = []
+    for variant in production_variants:
+        variant = dict(variant)
+        model_name = variant.pop('ModelName', None)
+        variant['Model'] = model_fingerprints.get(model_name, model_name)
+        canonical.append(variant)
+    return _digest(sorted(canonical, key=lambda variant: variant.get('VariantName', '')))
+
+
 def describe_training_job(job_name):
     status_response = sagemaker.describe_training_job(TrainingJobName=job_name)
     return status_response
 
 
+def list_endpoint_statuses(creation_time_after=None):
+    """
+    status of all endpoints in a few paged calls
+        :param creation_time_after: only endpoints created after this time (epoch or datetime)
+        :return: dict of endpoint name to EndpointStatus
+    """
+    params = {'MaxResults': 100}
+    if creation_time_after:
+        params['CreationTimeAfter'] = creation_time_after
+    statuses = {}
+    for page in sagemaker.get_paginator('list_endpoints').paginate(**params):
+        for endpoint in page.get('Endpoints', []):
+            statuses[endpoint['EndpointName']] = endpoint['EndpointStatus']
+    return statuses
+
+
+def list_training_job_statuses(creation_time_after=None, status_equals=None):
+    """
+    status of all training jobs in a few paged calls
+        :param creation_time_after: only jobs created after this time (epoch or datetime)
+        :param status_equals: only jobs in this TrainingJobStatus
+        :return: dict of training job name to TrainingJobStatus
+    """
+    params = {'MaxResults': 100}
+    if creation_time_after:
+        params['CreationTimeAfter'] = creation_time_after
+    if status_equals:
+        params['StatusEquals'] = status_equals
+    statuses = {}
+    for page in sagemaker.get_paginator('list_training_jobs').paginate(**params):
+        for training_job in page.get('TrainingJobSummaries', []):
+            statuses[training_job['TrainingJobName']] = training_job['TrainingJobStatus']
+    return statuses
+
+
+def list_transform_job_statuses(creation_time_after=None, status_equals=None):
+    """
+    status of all transform jobs in a few paged calls
+        :param creation_time_after: only jobs created after this time (epoch or datetime)
+        :param status_equals: only jobs in this TransformJobStatus
+        :return: dict of transform job name to TransformJobStatus
+    """
+    params = {'MaxResults': 100}
+    if creation_time_after:
+        params['CreationTimeAfter'] = creation_time_after
+    if status_equals:
+        params['StatusEquals'] = status_equals
+    statuses = {}
+    # no paginator for list_transform_jobs in the pinned botocore
+    while True:
+        page = sagemaker.list_transform_jobs(**params)
+        for transform_job in page.get('TransformJobSummaries', []):
+            statuses[transform_job['TransformJobName']] = transform_job['TransformJobStatus']
+        if not page.get('NextToken'):
+            return statuses
+        params['NextToken'] = page['NextToken']
+
+
+def _creation_times(operation_name, result_key, name_key, creation_time_before=None):
+    params = {'MaxResults': 100}
+    if creation_time_before:
+        params['CreationTimeBefore'] = creation_time_before
+    creation_times = {}
+    for page in sagemaker.get_paginator(operation_name).paginate(**params):
+        for summary in page.get(result_key, []):
+            creation_times[summary[name_key]] = summary['CreationTime']
+    return creation_times
+
+
+def list_models(creation_time_before=None):
+    """
+    all models in a few paged calls
+        :param creation_time_before: only models created before this time (epoch or datetime)
+        :return: dict of model name to CreationTime
+    """
+    return _creation_times('list_models', 'Models', 'ModelName', creation_time_before)
+
+
+def list_endpoint_configs(creation_time_before=None):
+    """
+    all endpoint configs in a few paged calls
+        :param creation_time_before: only endpoint configs created before this time (epoch or datetime)
+        :return: dict of endpoint config name to CreationTime
+    """
+    return _creation_times('list_endpoint_configs', 'EndpointConfigs', 'EndpointConfigName', creation_time_before)
+
+
+def resource_missing(error):
+    """
+    sagemaker answers calls on missing resources with a ValidationException,
+    'Could not find ...' from deletes and 'Requested resource not found.' from describes
+        :param error: botocore ClientError
+    """
+    message = error.response.get('Error', {}).get('Message', '')
+    return error.response.get('Error', {}).get('Code') == 'ValidationException' and \
+        ('Could not find' in message or 'not found' in message)
+
+
+def _delete_missing_ok(delete, **kwargs):
+    try:
+        delete(**kwargs)
+        return True
+    except botocore.exceptions.ClientError as error:
+        # deleted in the meantime
+        if resource_missing(error):
+            return False
+        raise
+
+
+def delete_model(model_name):
+    """
+    :return: False when the model was already gone
+    """
+    return _delete_missing_ok(sagemaker.delete_model, ModelName=model_name)
+
+
+def delete_endpoint_config(endpoint_config_name):
+    """
+    :return: False when the endpoint config was already gone
+    """
+    return _delete_missing_ok(sagemaker.delete_endpoint_config, EndpointConfigName=endpoint_config_name)
+
+
 def describe_endpoint(endpoint_name):
     try:
         resp = sagemaker.describe_endpoint(EndpointName=endpoint_name)
@@ -123,7 +425,10 @@ def describe_endpoint(endpoint_name):
             sagemaker.delete_endpoint(EndpointName=endpoint_name)
             return {}
         return resp
-    except:
+    except botocore.exceptions.ClientError as error:
+        # throttling is surfaced so callers can back off instead of treating the endpoint as missing
+        if util_handler.is_throttling_error(error):
+            raise
         return {}
 
 
@@ -145,6 +450,17 @@ def update_endpoint(endpoint_name, endpoint_config_name=''):
     return sagemaker.describe_endpoint(EndpointName=endpoint_name)
 
 
+def update_endpoint_weights_and_capacities(endpoint_name, desired_variants):
+    """
+    change variant weights and instance counts of a live endpoint in place, no new config or instances rollout
+        :param endpoint_name:
+        :param desired_variants: [{'VariantName', 'DesiredWeight', optional 'DesiredInstanceCount'}]
+    """
+    sagemaker.update_endpoint_weights_and_capacities(EndpointName=endpoint_name,
+                                                     DesiredWeightsAndCapacities=desired_variants)
+    return sagemaker.describe_endpoint(EndpointName=endpoint_name)
+
+
 def create_endpoint(endpoint_name, endpoint_config_name=''):
     if not endpoint_config_name:
         endpoint_config_name = endpoint_name
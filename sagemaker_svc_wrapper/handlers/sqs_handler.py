@@ -1 +1,55 @@
-#todo: use SQS delayed message to check model training and serving status
\ No newline at end of file
+import json
+from sagemaker_svc_wrapper.configs.settings import SYS_CONFIG
+from sagemaker_svc_wrapper.configs import clients
+
+# resolved on first use through the shared client registry
+sqs = clients.LazyClient('sqs')
+
+
+class BatchItemFailures(Exception):
+    """
+    records of an sqs batch failed. lambda reads batchItemFailures only with ReportBatchItemFailures on the
+    event source mapping, which zappa can not set, so a returned failure would delete the message.
+    raising gets the whole batch delivered again, handlers skip the records already done
+        :param failures: [{'itemIdentifier': message id}]
+    """
+    def __init__(self, failures):
+        super().__init__(f"{len(failures)} records failed: {', '.join(f['itemIdentifier'] for f in failures)}")
+        self.failures = failures
+
+
+def batch_response(failures):
+    """
+    response of an sqs batch handler
+        :param failures: [{'itemIdentifier': message id}] of the failed records
+        :return: empty batchItemFailures, raises BatchItemFailures when a record failed
+    """
+    if failures:
+        raise BatchItemFailures(failures)
+    return {'batchItemFailures': []}
+
+
+def job_message(job_type, project_name, job):
+    return json.dumps({'job_type': job_type, 'project_name': project_name, 'job': job})
+
+
+def send_job(job_type, project_name, job):
+    """
+    queue a prepared job for the job queue worker
+        :param job_type: Train, Serve or Transform
+        :param project_name:
+        :param job: job dict, must be json serializable
+        :return: message id
+    """
+    response = sqs.send_message(QueueUrl=SYS_CONFIG.job_queue_url,
+                                MessageBody=job_message(job_type, project_name, job))
+    return response.get('MessageId')
+
+
+def parse_job(body):
+    """
+    :param body: message body written by send_job
+    :return: (job_type, project_name, job)
+    """
+    message = json.loads(body)
+    return message['job_type'], message['project_name'], message['job']
@@ -0,0 +1,514 @@
+import itertools
+import json
+import math
+import random
+import threading
+from decimal import Decimal
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+from sagemaker_svc_wrapper.configs.settings import SYS_CONFIG
+from sagemaker_svc_wrapper.handlers import dynamo_handler, sagemaker_handler, job_handler, util_handler, \
+    concurrent_handler
+from sagemaker_svc_wrapper.handlers.concurrent_handler import Step
+from sagemaker_svc_wrapper.handlers.job_handler import JobError, JobType
+
+STRATEGIES = ['grid', 'random', 'bayesian']
+OBJECTIVE_TYPES = ['Minimize', 'Maximize']
+PARAMETER_TYPES = ['continuous', 'integer', 'categorical']
+SCALES = ['linear', 'log']
+# child jobs of one sweep, each child is one job record
+MAX_SWEEP_JOBS = 100
+SWEEP_STATUS = 'Sweeping'
+SCHEDULED_STATUS = 'Scheduled'
+CHILD_DONE_STATUSES = ['Completed', 'Failed', 'Stopped']
+# the account training job limit is reached, a later scheduling pass tries again
+SLOTS_EXHAUSTED_CODES = ['ResourceLimitExceeded']
+# bayesian sweeps sample at random until this many children reported the objective
+BAYESIAN_INITIAL_JOBS = 3
+BAYESIAN_CANDIDATES = 200
+BAYESIAN_LENGTH_SCALE = 0.25
+# sweep request keys that are not train job settings
+SWEEP_KEYS = ['strategy', 'search_space', 'objective', 'max_jobs', 'max_parallel_jobs', 'seed']
+
+
+def parameter_spec(name, spec):
+    """
+    validate one search space entry, a plain list is shorthand for categorical values
+        :param name: hyperparameter name
+        :param spec: list of values, {'values': [...]} or {'type', 'min', 'max', 'scale'}
+        :return: spec dict with every key filled in
+    """
+    if isinstance(spec, list):
+        spec = {'type': 'categorical', 'values': spec}
+    if not isinstance(spec, dict):
+        raise JobError(f'search space {name}: list of values or a range expected')
+    kind = spec.get('type') or ('categorical' if 'values' in spec else 'continuous')
+    if kind not in PARAMETER_TYPES:
+        raise JobError(f'search space {name}: type one of {", ".join(PARAMETER_TYPES)}')
+    if kind == 'categorical':
+        if not spec.get('values'):
+            raise JobError(f'search space {name}: values required')
+        return {'type': kind, 'values': list(spec['values'])}
+
+    low, high, scale = spec.get('min'), spec.get('max'), spec.get('scale', 'linear')
+    numeric = all(isinstance(bound, (int, float)) and not isinstance(bound, bool) for bound in (low, high))
+    if not numeric or low > high:
+        raise JobError(f'search space {name}: numeric min <= max required')
+    if scale not in SCALES or (scale == 'log' and low <= 0):
+        raise JobError(f'search space {name}: scale linear, or log with min > 0')
+    return {'type': kind, 'min': low, 'max': high, 'scale': scale}
+
+
+def search_space(space):
+    """
+    :param space: dict of hyperparameter name to parameter spec
+    :return: validated specs ordered by name
+    """
+    if not isinstance(space, dict) or not space:
+        raise JobError('search_space maps hyperparameter names to values or ranges')
+    return {name: parameter_spec(name, space[name]) for name in sorted(space)}
+
+
+def grid_values(name, spec):
+    if spec['type'] == 'categorical':
+        return spec['values']
+    if spec['type'] == 'integer' and spec['scale'] == 'linear':
+        return list(range(int(spec['min']), int(spec['max']) + 1))
+    raise JobError(f'search space {name}: grid search needs values or a linear integer range')
+
+
+def expand_grid(space):
+    """
+    every combination of the grid, in a stable order
+        :param space: validated search space
+        :return: list of hyperparameter dicts
+    """
+    names = list(space)
+    axes = [grid_values(name, space[name]) for name in names]
+    combinations = 1
+    for axis in axes:
+        combinations *= len(axis)
+    if combinations > MAX_SWEEP_JOBS:
+        raise JobError(f'grid has {combinations} combinations, {MAX_SWEEP_JOBS} at most')
+    return [dict(zip(names, values)) for values in itertools.product(*axes)]
+
+
+def from_unit(spec, unit):
+    """
+    hyperparameter value at a position of [0, 1] along its range
+    """
+    if spec['type'] == 'categorical':
+        values = spec['values']
+        return values[min(len(values) - 1, int(unit * len(values)))]
+    low, high = spec['min'], spec['max']
+    if spec['scale'] == 'log':
+        value = math.exp(math.log(low) + unit * (math.log(high) - math.log(low)))
+    else:
+        value = low + unit * (high - low)
+    if spec['type'] == 'integer':
+        return int(min(high, max(low, round(value))))
+    return min(high, max(low, value))
+
+
+def to_unit(spec, value):
+    """
+    position of a hyperparameter value along its range, inverse of from_unit
+    """
+    if spec['type'] == 'categorical':
+        values = spec['values']
+        return (values.index(value) + 0.5) / len(values) if value in values else 0.5
+    low, high, value = float(spec['min']), float(spec['max']), float(value)
+    if high == low:
+        return 0.5
+    if spec['scale'] == 'log':
+        return (math.log(value) - math.log(low)) / (math.log(high) - math.log(low))
+    return (value - low) / (high - low)
+
+
+def sample_random(space, rng):
+    """
+    :param space: validated search space
+    :param rng: random.Random
+    :return: hyperparameter dict drawn uniformly, log ranges uniformly in log space
+    """
+    return {name: from_unit(spec, rng.random()) for name, spec in space.items()}
+
+
+class GaussianProcess:
+    """
+    gaussian process regression with an rbf kernel over points of the unit cube,
+    small enough in pure python for the hundred or so points of a sweep
+        :param points: list of unit vectors
+        :param values: observed values, normalized by the caller
+        :param length_scale: rbf length scale
+        :param noise: observation noise variance
+    """
+    def __init__(self, points, values, length_scale=BAYESIAN_LENGTH_SCALE, noise=1e-6):
+        self.points = points
+        self.length_scale = length_scale
+        covariance = [[self.kernel(a, b) + (noise if i == j else 0.0) for j, b in enumerate(points)]
+                      for i, a in enumerate(points)]
+        self.lower = self._cholesky(covariance)
+        self.alpha = self._solve_upper(self._solve_lower(values))
+
+    def kernel(self, a, b):
+        distance = sum((x - y) ** 2 for x, y in zip(a, b))
+        return math.exp(-distance / (2 * self.length_scale ** 2))
+
+    @staticmethod
+    def _cholesky(matrix):
+        size = len(matrix)
+        lower = [[0.0] * size for _ in range(size)]
+        for i in range(size):
+            for j in range(i + 1):
+                total = matrix[i][j] - sum(lower[i][k] * lower[j][k] for k in range(j))
+                if i == j:
+                    lower[i][i] = math.sqrt(max(total, 1e-12))
+                else:
+                    lower[i][j] = total / lower[j][j]
+        return lower
+
+    def _solve_lower(self, vector):
+        solution = []
+        for i, row in enumerate(self.lower):
+            solution.append((vector[i] - sum(row[k] * solution[k] for k in range(i))) / row[i])
+        return solution
+
+    def _solve_upper(self, vector):
+        size = len(vector)
+        solution = [0.0] * size
+        for i in reversed(range(size)):
+            total = vector[i] - sum(self.lower[k][i] * solution[k] for k in range(i + 1, size))
+            solution[i] = total / self.lower[i][i]
+        return solution
+
+    def predict(self, point):
+        """
+        :return: (mean, standard deviation) at point
+        """
+        weights = [self.kernel(point, other) for other in self.points]
+        mean = sum(weight * alpha for weight, alpha in zip(weights, self.alpha))
+        projected = self._solve_lower(weights)
+        variance = max(0.0, 1.0 - sum(value * value for value in projected))
+        return mean, math.sqrt(variance)
+
+
+def expected_improvement(mean, std, best):
+    """
+    expected improvement below best of a normal prediction, for minimization
+    """
+    if std <= 0:
+        return 0.0
+    z = (best - mean) / std
+    cdf = 0.5 * (1 + math.erf(z / math.sqrt(2)))
+    pdf = math.exp(-0.5 * z * z) / math.sqrt(2 * math.pi)
+    return (best - mean) * cdf + std * pdf
+
+
+def suggest_bayesian(space, observations, pending, count, rng):
+    """
+    next hyperparameters by expected improvement of a gaussian process fitted to the reported objectives.
+    pending children count as if they reported the best value so far (constant liar),
+    which keeps parallel suggestions apart
+        :param space: validated search space
+        :param observations: list of (hyperparameter dict, objective value to minimize)
+        :param pending: hyperparameter dicts of children without an objective yet
+        :param count: suggestions wanted
+        :param rng: random.Random
+        :return: list of hyperparameter dicts
+    """
+    if len(observations) < BAYESIAN_INITIAL_JOBS:
+        return [sample_random(space, rng) for _ in range(count)]
+
+    names = list(space)
+
+    def unit_point(params):
+        return [to_unit(space[name], params[name]) for name in names]
+
+    values = [float(value) for _, value in observations]
+    mean = sum(values) / len(values)
+    scale = math.sqrt(sum((value - mean) ** 2 for value in values) / len(values)) or 1.0
+    normalized = [(value - mean) / scale for value in values]
+    best = min(normalized)
+
+    points = [unit_point(params) for params, _ in observations]
+    liars = [unit_point(params) for params in pending]
+    suggestions = []
+    for _ in range(count):
+        process = GaussianProcess(points + liars, normalized + [best] * len(liars))
+        candidates = [[rng.random() for _ in names] for _ in range(BAYESIAN_CANDIDATES)]
+        # candidates snap to the values they decode to, integers and categories included
+        candidates = [unit_point({name: from_unit(space[name], unit) for name, unit in zip(names, candidate)})
+                      for candidate in candidates]
+        chosen = max(candidates, key=lambda candidate: expected_improvement(*process.predict(candidate), best))
+        params = {name: from_unit(space[name], unit) for name, unit in zip(names, chosen)}
+        suggestions.append(params)
+        liars.append(unit_point(params))
+    return suggestions
+
+
+def objective_spec(objective):
+    """
+    :param objective: {'metric_name', 'type': Minimize or Maximize, 'regex': optional log regex}
+    :return: validated objective
+    """
+    if not isinstance(objective, dict) or not objective.get('metric_name'):
+        raise JobError('objective metric_name required')
+    objective = dict(objective, type=objective.get('type', 'Minimize'))
+    if objective['type'] not in OBJECTIVE_TYPES:
+        raise JobError(f'objective type one of {", ".join(OBJECTIVE_TYPES)}')
+    return objective
+
+
+def metric_definitions(objective):
+    """
+    MetricDefinitions reporting the objective, built in algorithms report their metrics without one
+    """
+    if not objective.get('regex'):
+        return None
+    return [{'Name': objective['metric_name'], 'Regex': objective['regex']}]
+
+
+def _child_record(template, sweep_name, child_name, params):
+    child = dict(template)
+    static = template.get('hyperparameters') or {}
+    # sagemaker takes hyperparameters as strings
+    child['hyperparameters'] = dict({key: str(value) for key, value in static.items()},
+                                    **{key: str(value) for key, value in params.items()})
+    child['sweep_parameters'] = json.dumps(params)
+    child['parent_job'] = sweep_name
+    child['job_name'] = child_name
+    return child
+
+
+def _log_children(project_name, template, sweep_name, names, suggestions):
+    for child_name, params in zip(names, suggestions):
+        child = _child_record(template, sweep_name, child_name, params)
+        dynamo_handler.log_job(project_name, JobType.Train.value, endpoint_status=SCHEDULED_STATUS, **child)
+
+
+def create_sweep(project_name, sweep_request):
+    """
+    validate a sweep request and record the sweep with its scheduled children.
+    grid and random sweeps record every child up front, bayesian children are suggested while the sweep runs
+        :param project_name:
+        :param sweep_request: train payload with strategy, search_space, objective, max_jobs, max_parallel_jobs
+        :return: sweep job item
+    """
+    strategy = sweep_request.get('strategy', 'random')
+    if strategy not in STRATEGIES:
+        raise JobError(f'strategy one of {", ".join(STRATEGIES)}')
+    space = search_space(sweep_request.get('search_space'))
+    objective = objective_spec(sweep_request.get('objective'))
+    # recorded with the sweep, bayesian suggestions of later passes are seeded from it
+    seed = sweep_request.get('seed')
+    if seed is None:
+        seed = random.SystemRandom().randrange(2 ** 31)
+    rng = random.Random(seed)
+
+    if strategy == 'grid':
+        suggestions = expand_grid(space)
+        max_jobs = len(suggestions)
+    else:
+        max_jobs = sweep_request.get('max_jobs') or 10
+        if not 0 < max_jobs <= MAX_SWEEP_JOBS:
+            raise JobError(f'max_jobs between 1 and {MAX_SWEEP_JOBS}')
+        suggestions = [sample_random(space, rng) for _ in range(max_jobs)] if strategy == 'random' else []
+    max_parallel_jobs = sweep_request.get('max_parallel_jobs') or SYS_CONFIG.training_job_slots
+
+    template = job_handler.prepare_train_job(project_name, {key: value for key, value in sweep_request.items()
+                                                            if key not in SWEEP_KEYS})
+    template['metric_definitions'] = metric_definitions(objective)
+    timestamp = template['timestamp_queued']
+    sweep_name = f'{project_name}-{JobType.Sweep.value}-{timestamp}'
+    for key in ('project_name', 'job_name'):
+        template.pop(key)
+
+    names = [f'{sweep_name}-{index:03d}' for index in range(len(suggestions))]
+    _log_children(project_name, template, sweep_name, names, suggestions)
+    sweep = {
+        'job_name': sweep_name,
+        'variant_name': template.get('variant_name', 'default'),
+        'strategy': strategy,
+        'search_space': json.dumps(space),
+        'objective': json.dumps(objective),
+        'template': json.dumps(template),
+        'max_jobs': max_jobs,
+        'max_parallel_jobs': max_parallel_jobs,
+        'child_jobs': names,
+        'child_count': len(names),
+        'timestamp_queued': timestamp,
+        'seed': seed,
+    }
+    dynamo_handler.log_job(project_name, JobType.Sweep.value, endpoint_status=SWEEP_STATUS, **sweep)
+    return dict(sweep, project_name=project_name, job_type=JobType.Sweep.value, endpoint_status=SWEEP_STATUS)
+
+
+def free_training_slots(throttle):
+    """
+    training jobs the account can still start: the configured slot limit minus the jobs in progress
+        :param throttle: AdaptiveThrottle for sagemaker calls
+    """
+    in_progress = throttle.call(sagemaker_handler.list_training_job_statuses, status_equals='InProgress')
+    return max(0, SYS_CONFIG.training_job_slots - len(in_progress))
+
+
+def record_objective(child, objective, throttle):
+    """
+    record the final objective metric of a completed child
+        :return: updated child
+    """
+    training_job = throttle.call(sagemaker_handler.describe_training_job, child['job_name'])
+    reported = {metric['MetricName']: metric['Value'] for metric in training_job.get('FinalMetricDataList', [])}
+    if objective['metric_name'] in reported:
+        updates = {'objective_value': Decimal(str(reported[objective['metric_name']]))}
+    else:
+        updates = {'objective_error': f"{objective['metric_name']} not reported"}
+    dynamo_handler.update_job(child['job_name'], updates)
+    return dict(child, **updates)
+
+
+def submit_child(child, throttle):
+    """
+    claim a scheduled child and start its training job, the claim is a conditional update
+    so concurrent scheduling passes never start a child twice
+        :return: False when the account has no training slot left, True otherwise
+    """
+    job_name = child['job_name']
+    if not dynamo_handler.update_job(job_name, {'endpoint_status': 'Training'}, forward_only=True):
+        return True
+    job = dict(child, spec_train=json.loads(child['spec_train']))
+    try:
+        updates = throttle.call(job_handler.submit_train_job, job, resume=True)
+    except ClientError as error:
+        if util_handler.is_throttling_error(error) or \
+                error.response.get('Error', {}).get('Code') in SLOTS_EXHAUSTED_CODES:
+            dynamo_handler.update_job(job_name, {'endpoint_status': SCHEDULED_STATUS},
+                                      condition=Attr('endpoint_status').eq('Training'))
+            return False
+        dynamo_handler.update_job(job_name, {'endpoint_status': 'Failed', 'error_message': str(error)},
+                                  forward_only=True)
+        return True
+    except JobError as error:
+        dynamo_handler.update_job(job_name, {'endpoint_status': 'Failed', 'error_message': error.message},
+                                  forward_only=True)
+        return True
+    except (KeyError, ValueError) as error:
+        # a malformed child fails the same way on every pass, e.g. one recorded without model_output
+        dynamo_handler.update_job(job_name, {'endpoint_status': 'Failed',
+                                             'error_message': f'{type(error).__name__}: {error}'},
+                                  forward_only=True)
+        return True
+    except Exception:
+        # connection errors and timeouts leave it open whether the training job exists,
+        # the next pass submits the child again with resume
+        dynamo_handler.update_job(job_name, {'endpoint_status': SCHEDULED_STATUS},
+                                  condition=Attr('endpoint_status').eq('Training'))
+        raise
+    dynamo_handler.update_job(job_name, {'status': updates['status']})
+    return True
+
+
+def _minimized(objective, value):
+    return float(value) if objective['type'] == 'Minimize' else -float(value)
+
+
+def _suggest_children(sweep, children, count):
+    """
+    claim count new bayesian children on the sweep, then record them as scheduled.
+    the claim is conditional on child_count so concurrent passes never suggest the same child
+        :return: new children, [] when another pass claimed first
+    """
+    objective = json.loads(sweep['objective'])
+    child_count = int(sweep['child_count'])
+    count = min(count, int(sweep['max_jobs']) - child_count)
+    if count <= 0:
+        return []
+    names = [f"{sweep['job_name']}-{index:03d}" for index in range(child_count, child_count + count)]
+    if not dynamo_handler.update_job(sweep['job_name'], {'child_jobs': list(sweep['child_jobs']) + names,
+                                                         'child_count': child_count + count},
+                                     condition=Attr('child_count').eq(child_count)):
+        return []
+
+    observations = [(json.loads(child['sweep_parameters']), _minimized(objective, child['objective_value']))
+                    for child in children if 'objective_value' in child]
+    pending = [json.loads(child['sweep_parameters']) for child in children
+               if child.get('endpoint_status') not in CHILD_DONE_STATUSES]
+    # sweeps recorded without a seed fall back to their name, never to one seed shared by all of them
+    rng = random.Random(f"{sweep.get('seed', sweep['job_name'])}-{child_count}")
+    suggestions = suggest_bayesian(json.loads(sweep['search_space']), observations, pending, count, rng)
+    _log_children(sweep['project_name'], json.loads(sweep['template']), sweep['job_name'], names, suggestions)
+    return [dynamo_handler.get_job(name) for name in names]
+
+
+def best_child(children, objective):
+    """
+    :return: child with the best objective value, None when no child reported it
+    """
+    reported = [child for child in children if 'objective_value' in child]
+    if not reported:
+        return None
+    return min(reported, key=lambda child: _minimized(objective, child['objective_value']))
+
+
+def schedule_sweep(sweep_name, throttle):
+    """
+    one scheduling pass of a sweep: record objectives of completed children, start scheduled children
+    while account slots and max_parallel_jobs allow, and complete the sweep with its best child
+    once every child is done. safe to run concurrently, from the api, the status cron and child events
+        :param sweep_name: sweep job name
+        :param throttle: AdaptiveThrottle for sagemaker calls
+        :return: sweep endpoint_status after the pass
+    """
+    sweep = dynamo_handler.get_job(sweep_name)
+    if sweep.get('endpoint_status') != SWEEP_STATUS:
+        return sweep.get('endpoint_status')
+    objective = json.loads(sweep['objective'])
+    children = dynamo_handler.batch_get_jobs(sweep.get('child_jobs', []), consistent_read=True)
+
+    for index, child in enumerate(children):
+        if child.get('endpoint_status') == 'Completed' and 'objective_value' not in child \
+                and 'objective_error' not in child:
+            children[index] = record_objective(child, objective, throttle)
+
+    running = [child for child in children if child.get('endpoint_status') == 'Training']
+    scheduled = sorted((child for child in children if child.get('endpoint_status') == SCHEDULED_STATUS),
+                       key=lambda child: child['job_name'])
+    suggesting = sweep['strategy'] == 'bayesian' and int(sweep['child_count']) < int(sweep['max_jobs'])
+    capacity = int(sweep['max_parallel_jobs']) - len(running)
+    if capacity > 0 and (scheduled or suggesting):
+        capacity = min(capacity, free_training_slots(throttle))
+    if suggesting and capacity > len(scheduled):
+        suggested = _suggest_children(sweep, children, capacity - len(scheduled))
+        children += suggested
+        scheduled += suggested
+
+    # children are independent, the throttle keeps their starts within the sagemaker call rate.
+    # once a start finds no training slot left, children not started yet stay scheduled
+    slots_exhausted = threading.Event()
+
+    def start(child):
+        if slots_exhausted.is_set():
+            return False
+        if not submit_child(child, throttle):
+            slots_exhausted.set()
+            return False
+        return True
+
+    concurrent_handler.run_graph({
+        child['job_name']: Step((), lambda results, child=child: start(child))
+        for child in scheduled[:max(0, capacity)]})
+
+    updates = {}
+    best = best_child(children, objective)
+    if best is not None and best['job_name'] != sweep.get('best_job'):
+        updates.update(best_job=best['job_name'], best_objective_value=best['objective_value'])
+    # children submitted by this pass are still open, children claimed but never recorded are left out
+    done = not suggesting and all(child.get('endpoint_status') in CHILD_DONE_STATUSES for child in children)
+    if done:
+        updates['endpoint_status'] = 'Completed' if best is not None else 'Failed'
+        if best is None:
+            updates['error_message'] = f"no child job reported {objective['metric_name']}"
+    if updates:
+        dynamo_handler.update_job(sweep_name, updates, forward_only=True)
+    return updates.get('endpoint_status', SWEEP_STATUS)
@@ -1,10 +1,16 @@
 import re
+import json
+import base64
+import hashlib
 import uuid
 import sys
+import maya
 # from dateutils import parser
 from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
 from decimal import Decimal
 from datetime import datetime
+# re-exported, the throttling helpers live in configs so clients and metrics can use them
+from ..configs.throttling import THROTTLING_ERROR_CODES, is_throttling_error, AdaptiveThrottle
 
 SAGEMAKER_NAMING_PATTERN = '^[a-zA-Z0-9](-*[a-zA-Z0-9])*'
 
@@ -41,3 +47,70 @@ def dynamo_item_json_parser(item):
         else:
             item[key] = json_serial(item[key])
     return item
+
+
+# write timestamps of dynamo items, epoch seconds
+ITEM_TIMESTAMP_KEYS = ['time_updated', 'update_timestamp', 'date_created', 'timestamp_queued']
+
+
+def item_last_modified(item):
+    """
+    last write of a dynamo item from its timestamps, None when it has none
+        :param item: dynamo item
+        :return: naive utc datetime
+    """
+    timestamps = [int(item[key]) for key in ITEM_TIMESTAMP_KEYS if item.get(key)]
+    return datetime.utcfromtimestamp(max(timestamps)) if timestamps else None
+
+
+def body_etag(body):
+    """
+    strong ETag value of a response body, without quotes
+        :param body: str
+    """
+    return hashlib.sha1(body.encode()).hexdigest()
+
+
+def epoch_seconds(value):
+    """
+    epoch seconds of a query arg, given as epoch seconds or an iso 8601 date time
+        :param value: e.g. '1548041871' or '2019-01-21T03:37:51Z'
+    """
+    if str(value).isdigit():
+        return int(value)
+    try:
+        return maya.parse(value).epoch
+    except (TypeError, ValueError):
+        raise ValueError(f'{value} is neither epoch seconds nor an iso 8601 date time')
+
+
+def encode_page_token(last_evaluated_key):
+    """
+    opaque continuation token for a dynamo LastEvaluatedKey
+        :param last_evaluated_key: 
+    """
+    if not last_evaluated_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(last_evaluated_key, default=json_serial).encode()).decode()
+
+
+def decode_page_token(token):
+    """
+    LastEvaluatedKey of a continuation token, raises ValueError on malformed token
+        :param token: 
+    """
+    if not token:
+        return None
+    key = json.loads(base64.urlsafe_b64decode(token.encode()).decode(), parse_float=Decimal)
+    if not isinstance(key, dict):
+        raise ValueError('bad continuation token')
+    return key
+
+
+def ndjson_lines(items):
+    """
+    newline delimited json lines of dynamo items
+        :param items: iterable of dynamo items
+    """
+    for item in items:
+        yield json.dumps(dynamo_item_json_parser(item)) + '\n'
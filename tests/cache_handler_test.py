@@ -0,0 +1,34 @@
+import time
+from sagemaker_svc_wrapper.handlers.cache_handler import TTLCache, cache_stats
+
+
+def test_get_returns_copy_and_counts():
+    cache = TTLCache('test_copy', max_size=2, ttl=60)
+    assert cache.get('a') is None
+    cache.set('a', {'variants': '{}'})
+    cache.get('a')['variants'] = 'changed'
+    assert cache.get('a') == {'variants': '{}'}
+    assert cache_stats()['test_copy']['hits'] == 2
+    assert cache_stats()['test_copy']['misses'] == 1
+
+
+def test_lru_eviction():
+    cache = TTLCache('test_lru', max_size=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.stats()['evictions'] == 1
+
+
+def test_ttl_expiry_and_invalidate():
+    cache = TTLCache('test_ttl', ttl=0.01)
+    cache.set('a', 1)
+    time.sleep(0.02)
+    assert cache.get('a') is None
+    cache.ttl = 60
+    cache.set('a', 1)
+    cache.invalidate('a')
+    assert cache.get('a') is None
@@ -0,0 +1,135 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+pytest.importorskip('boto3')
+
+import boto3  # pylint: disable=wrong-import-position
+from botocore.awsrequest import AWSResponse  # pylint: disable=wrong-import-position
+from sagemaker_svc_wrapper.configs import clients, profiling  # pylint: disable=wrong-import-position
+from sagemaker_svc_wrapper.configs.settings import SYS_CONFIG  # pylint: disable=wrong-import-position
+
+
+class Raw:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+def session():
+    return boto3.session.Session(aws_access_key_id='k', aws_secret_access_key='s', region_name='ap-southeast-2')
+
+
+def test_clients_get_pool_timeouts_and_keepalive_from_settings(monkeypatch):
+    monkeypatch.setattr(SYS_CONFIG, 'max_pool_connections', 32)
+    monkeypatch.setattr(SYS_CONFIG, 'read_timeout_seconds', 7)
+    client = clients.new_client('sagemaker', session=session())
+
+    assert client.meta.config.max_pool_connections == 32
+    assert (client.meta.config.connect_timeout, client.meta.config.read_timeout) == (5, 7)
+    retries = client.meta.config.retries
+    if clients.NATIVE_RETRY_MODES:
+        # botocore with retry modes counts the first attempt too
+        assert retries['total_max_attempts'] == SYS_CONFIG.max_retry_attempts + 1
+        assert retries['mode'] == SYS_CONFIG.retry_mode
+    else:
+        assert retries['max_attempts'] == SYS_CONFIG.max_retry_attempts
+    if not clients.NATIVE_KEEPALIVE:
+        pool_manager = client._endpoint.http_session._manager  # pylint: disable=protected-access
+        assert clients.KEEPALIVE_OPTION in pool_manager.connection_pool_kw['socket_options']
+
+    # runtime callers wait on invocations, they keep their own short timeouts
+    runtime = clients.new_client('sagemaker-runtime', session=session())
+    assert runtime.meta.config.connect_timeout == SYS_CONFIG.invoke_connect_timeout_seconds
+
+    monkeypatch.setattr(SYS_CONFIG, 'retry_mode', 'legacy')
+    with pytest.raises(ValueError):
+        clients.client_config()
+
+
+def test_adaptive_retries_limit_the_client_after_throttling():
+    answers = [(400, {'__type': 'ThrottlingException', 'message': 'Rate exceeded'}),
+               (200, {'Endpoints': []})]
+
+    def answer(request, **kwargs):
+        status, body = answers.pop(0)
+        return AWSResponse(request.url, status, {'Content-Type': 'application/x-amz-json-1.1'},
+                           Raw(json.dumps(body).encode()))
+
+    client = session().client('sagemaker')
+    clients.adaptive_retries(client, max_rate=1000)
+    client.meta.events.register('before-send.sagemaker.ListEndpoints', answer)
+    limiter = client.meta.adaptive_retries
+    assert limiter.throttle is None
+
+    # the throttled attempt is retried, from then on the client is held to half the rate it sent at
+    assert client.list_endpoints()['Endpoints'] == []
+    assert limiter.throttled == 1
+    assert limiter.throttle is not None and limiter.throttle.rate < 1000
+
+
+def test_importing_the_app_creates_no_aws_client():
+    script = ('import app; from sagemaker_svc_wrapper.configs import clients; '
+              'print(clients._session, len(clients._clients), len(clients._resources), len(clients._tables))')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', script], cwd=root, stdout=subprocess.PIPE,
+                            check=True).stdout.decode()
+    assert output.split()[-4:] == ['None', '0', '0', '0']
+
+
+def test_lazy_proxies_resolve_registered_clients_until_reset(monkeypatch):
+    built = []
+    monkeypatch.setattr(clients, 'new_client', lambda service_name: built.append(service_name) or object())
+    monkeypatch.setattr(clients, '_clients', {})
+    monkeypatch.setattr(clients, '_resources', {})
+    monkeypatch.setattr(clients, '_tables', {})
+
+    class StandIn:
+        def __init__(self, name):
+            self.name = name
+
+        def Table(self, table_name):  # pylint: disable=invalid-name
+            return StandIn(f'{self.name}/{table_name}')
+
+    lazy_client = clients.LazyClient('sagemaker')
+    lazy_table = clients.LazyTable('jobs')
+    assert lazy_table.name == 'jobs'
+    clients.register('sagemaker', client=StandIn('first'))
+    clients.register('dynamodb', resource=StandIn('dynamo'))
+    assert lazy_client.name == 'first'
+    assert clients.get_table('jobs').name == 'dynamo/jobs'
+    clients.register('sagemaker', client=StandIn('second'))
+    assert lazy_client.name == 'second'
+
+    # reset drops every cached client, the next use builds a new one
+    clients.reset()
+    assert clients.get_client('sagemaker') is not None
+    assert built == ['sagemaker']
+    assert clients.get_client('sagemaker') is clients.get_client('sagemaker') and built == ['sagemaker']
+
+
+def test_customizers_run_on_every_new_client(monkeypatch):
+    monkeypatch.setattr(clients, '_customizers', {})
+    customized = []
+    clients.customize('sagemaker', customized.append)
+    client = clients.new_client('sagemaker', session=session())
+    assert customized == [client]
+    clients.new_client('sagemaker-runtime', session=session())
+    assert customized == [client]
+
+
+def test_profiling_adds_up_timings_per_label(monkeypatch):
+    monkeypatch.setattr(profiling, 'TIMINGS', profiling.OrderedDict())
+    for _ in range(2):
+        with profiling.timed('client sagemaker'):
+            pass
+    with pytest.raises(ValueError):
+        with profiling.timed('app init'):
+            raise ValueError
+    report = profiling.report()
+    assert list(report) == ['client sagemaker', 'app init']
+    assert all(elapsed >= 0 for elapsed in report.values())
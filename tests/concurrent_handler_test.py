@@ -0,0 +1,47 @@
+import threading
+import time
+import pytest
+
+pytest.importorskip('boto3')
+
+from sagemaker_svc_wrapper.handlers import concurrent_handler  # pylint: disable=wrong-import-position
+from sagemaker_svc_wrapper.handlers.concurrent_handler import Step  # pylint: disable=wrong-import-position
+
+
+def test_independent_steps_overlap_and_dependents_get_results():
+    both_started = threading.Barrier(2, timeout=1)
+
+    def read(value):
+        def step(results):
+            # only passes when the two reads run at the same time
+            both_started.wait()
+            return value
+        return step
+
+    results = concurrent_handler.run_graph({
+        'project': Step((), read('p')),
+        'endpoint': Step((), read('live')),
+        'deploy': Step(('project', 'endpoint'), lambda results: f"{results['project']}:{results['endpoint']}"),
+        'skipped': None,
+    })
+    assert results == {'project': 'p', 'endpoint': 'live', 'deploy': 'p:live'}
+
+
+def test_failed_step_stops_its_dependents():
+    started = []
+
+    def fail(results):
+        raise ValueError('create model failed')
+
+    def slow(results):
+        time.sleep(0.05)
+        started.append('slow')
+
+    with pytest.raises(ValueError):
+        concurrent_handler.run_graph({
+            'model': Step((), fail),
+            'lookup': Step((), slow),
+            'endpoint': Step(('model', 'lookup'), lambda results: started.append('endpoint')),
+        })
+    # the running step finished, the dependent one never started
+    assert started == ['slow']
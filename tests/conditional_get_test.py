@@ -0,0 +1,61 @@
+import pytest
+
+pytest.importorskip('boto3')
+
+from tests.fakes import install_fake_aws  # pylint: disable=wrong-import-position
+from sagemaker_svc_wrapper.handlers import dynamo_handler  # pylint: disable=wrong-import-position
+from sagemaker_svc_wrapper.configs.settings import SYS_CONFIG  # pylint: disable=wrong-import-position
+
+
+@pytest.fixture
+def fake():
+    fake = install_fake_aws()
+    dynamo_handler.create_project('p')
+    dynamo_handler.create_project_model('p', 'default', spec_serve={'InstanceType': 'ml.m4.xlarge'})
+    dynamo_handler.log_job('p', 'Serve', endpoint_status='Creating', job_name='p-Serve-1548041871',
+                           timestamp_queued=1548041871)
+    return fake
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import app
+    monkeypatch.setattr(SYS_CONFIG, 'log_request_metrics', False)
+    return app.app.test_client()
+
+
+def test_unchanged_job_polls_answer_304_without_reads(fake, client):
+    response = client.get('/job/p-Serve-1548041871')
+    assert response.status_code == 200
+    assert response.get_json()['endpoint_status'] == 'Creating'
+    etag = response.headers['ETag']
+    assert response.headers['Last-Modified'] == 'Mon, 21 Jan 2019 03:37:51 GMT'
+
+    fake.calls.reset()
+    for _ in range(3):
+        response = client.get('/job/p-Serve-1548041871', headers={'If-None-Match': etag})
+        assert response.status_code == 304 and response.headers['ETag'] == etag
+    assert fake.calls.total() == 0
+
+    # a write drops the validators, the next poll gets the new status
+    dynamo_handler.update_job('p-Serve-1548041871', {'endpoint_status': 'InService'})
+    response = client.get('/job/p-Serve-1548041871', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['endpoint_status'] == 'InService'
+    assert response.headers['ETag'] != etag
+    assert client.get('/job/missing', headers={'If-None-Match': etag}).status_code == 404
+
+
+def test_project_and_model_validators(fake, client):
+    response = client.get('/project/p')
+    etag = response.headers['ETag']
+    # validators expired from the cache: the item is read, still unchanged
+    dynamo_handler.validator_cache.clear()
+    assert client.get('/project/p', headers={'If-None-Match': etag}).status_code == 304
+
+    response = client.get('/models/p/default')
+    assert response.get_json()['spec_serve']
+    last_modified = response.headers['Last-Modified']
+    assert client.get('/models/p/default', headers={'If-Modified-Since': last_modified}).status_code == 304
+    dynamo_handler.create_project_model('p', 'default', spec_serve={'InstanceType': 'ml.c5.xlarge'})
+    assert client.get('/models/p/default', headers={'If-None-Match': response.headers['ETag']}).status_code == 200
@@ -0,0 +1,74 @@
+import pytest
+
+pytest.importorskip('boto3')
+
+from boto3.dynamodb.conditions import Attr  # pylint: disable=wrong-import-position
+from tests.fakes import install_fake_aws  # pylint: disable=wrong-import-position
+from sagemaker_svc_wrapper.handlers import dynamo_handler  # pylint: disable=wrong-import-position
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    monkeypatch.setattr(dynamo_handler.time, 'sleep', lambda seconds: None)
+    fake = install_fake_aws()
+    for variant in ('a', 'b', 'c'):
+        dynamo_handler.create_project_model('p', variant)
+    return fake
+
+
+def test_unprocessed_keys_are_retried_then_read_one_by_one(fake):
+    keys = [('p', 'a'), ('p', 'b'), ('p', 'c'), ('p', 'missing')]
+
+    # throttled once: the unprocessed keys go out again in a second batch
+    fake.dynamodb.unprocess_next(keys=2)
+    fake.calls.reset()
+    assert sorted(dynamo_handler.batch_get_project_models(keys, consistent_read=True)) == keys[:3]
+    assert fake.calls.counts['dynamodb.BatchGetItem'] == 2
+    assert fake.calls.counts['dynamodb.GetItem'] == 0
+
+    # still unprocessed after every retry: the leftovers are read with GetItem
+    fake.dynamodb.unprocess_next(keys=1, times=dynamo_handler.BATCH_GET_MAX_ATTEMPTS)
+    fake.calls.reset()
+    assert sorted(dynamo_handler.batch_get_project_models(keys, consistent_read=True)) == keys[:3]
+    assert fake.calls.counts['dynamodb.BatchGetItem'] == dynamo_handler.BATCH_GET_MAX_ATTEMPTS
+    assert fake.calls.counts['dynamodb.GetItem'] == 1
+
+
+def test_forward_only_updates_never_move_a_job_back(fake):
+    dynamo_handler.log_job('p', 'Serve', job_name='p-Serve-1', endpoint_status='Queued')
+
+    updated = dynamo_handler.update_job('p-Serve-1', {'endpoint_status': 'Creating'}, forward_only=True)
+    assert updated['endpoint_status'] == 'Creating' and updated['job_name'] == 'p-Serve-1'
+    assert dynamo_handler.update_job('p-Serve-1', {'endpoint_status': 'InService'}, forward_only=True)
+    # a late Creating event and a same rank status lose against InService, the job is left as it is
+    assert dynamo_handler.update_job('p-Serve-1', {'endpoint_status': 'Creating'}, forward_only=True) == {}
+    assert dynamo_handler.update_job('p-Serve-1', {'endpoint_status': 'Failed'}, forward_only=True) == {}
+    assert dynamo_handler.get_job('p-Serve-1')['endpoint_status'] == 'InService'
+    assert dynamo_handler.update_job('p-Serve-1', {'endpoint_status': 'Retired'}, forward_only=True)
+    # without forward_only any status is written
+    assert dynamo_handler.update_job('p-Serve-1', {'endpoint_status': 'Queued'})['endpoint_status'] == 'Queued'
+
+
+def test_conditional_updates_return_nothing_when_the_condition_fails(fake):
+    dynamo_handler.log_job('p', 'Train', job_name='p-Train-1', endpoint_status='Training')
+    training = Attr('endpoint_status').eq('Training')
+
+    assert dynamo_handler.update_job('p-Train-1', {'endpoint_status': 'Scheduled'}, condition=training)
+    assert dynamo_handler.update_job('p-Train-1', {'endpoint_status': 'Failed'}, condition=training) == {}
+    assert dynamo_handler.get_job('p-Train-1')['endpoint_status'] == 'Scheduled'
+    # with forward_only as well both have to hold
+    scheduled = Attr('endpoint_status').eq('Scheduled')
+    assert dynamo_handler.update_job('p-Train-1', {'endpoint_status': 'Queued'}, forward_only=True,
+                                     condition=scheduled) == {}
+    assert dynamo_handler.update_job('p-Train-1', {'endpoint_status': 'Training'}, forward_only=True,
+                                     condition=scheduled)['endpoint_status'] == 'Training'
+
+
+def test_updates_of_a_missing_item_create_no_record(fake):
+    fake.calls.reset()
+    assert dynamo_handler.update_job('p-Serve-404', {'endpoint_status': 'InService'}) == {}
+    assert dynamo_handler.update_job('p-Serve-404', {'endpoint_status': 'InService'}, forward_only=True) == {}
+    assert dynamo_handler.get_job('p-Serve-404') == {}
+    assert fake.calls.counts['dynamodb.UpdateItem'] == 2
+    assert dynamo_handler.update_project_model('p', 'missing', {'latest_model': 'p-Serve-404'}) == {}
+    assert dynamo_handler.get_project_model('p', 'missing') == {}
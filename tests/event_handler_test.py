@@ -0,0 +1,89 @@
+import json
+import os
+import pytest
+
+pytest.importorskip('boto3')
+
+from tests.fakes import install_fake_aws  # pylint: disable=wrong-import-position
+from cron import event_handler  # pylint: disable=wrong-import-position
+from sagemaker_svc_wrapper.handlers import dynamo_handler, sqs_handler  # pylint: disable=wrong-import-position
+
+EVENTS = os.path.join(os.path.dirname(__file__), 'events')
+PREVIOUS = 'p-Serve-1548000000'
+JOB = 'p-Serve-1548041871'
+
+
+def recorded(name):
+    with open(os.path.join(EVENTS, name)) as event_file:
+        return json.load(event_file)
+
+
+@pytest.fixture
+def fake():
+    fake = install_fake_aws()
+    dynamo_handler.create_project('p', variants={'default': 1}, serving_endpoint=PREVIOUS)
+    dynamo_handler.create_project_model('p', 'default', latest_model=PREVIOUS)
+    dynamo_handler.log_job('p', 'Serve', 'default', 'InService', job_name=PREVIOUS)
+    dynamo_handler.log_job('p', 'Serve', 'default', 'Creating', job_name=JOB)
+    dynamo_handler.log_job('p', 'Train', 'default', 'Training', job_name='p-Train-1548045000')
+    dynamo_handler.log_job('p', 'Transform', 'default', 'Transforming', job_name='p-Transform-1548052000')
+    for endpoint_name in (PREVIOUS, JOB):
+        fake.sagemaker.create_endpoint(EndpointName=endpoint_name, EndpointConfigName=endpoint_name)
+    return fake
+
+
+def test_in_service_event_promotes_job(fake):
+    assert event_handler.handle_events(recorded('endpoint_in_service.json')) == 'InService'
+
+    assert dynamo_handler.get_job(JOB)['endpoint_status'] == 'InService'
+    assert dynamo_handler.get_job(PREVIOUS)['endpoint_status'] == 'Retired'
+    assert dynamo_handler.get_project_model('p', 'default')['latest_model'] == JOB
+    assert dynamo_handler.get_project('p')['serving_endpoint'] == JOB
+    assert PREVIOUS not in fake.sagemaker.endpoints
+
+
+def test_sqs_wrapped_events(fake):
+    events = [recorded('training_job_completed.json'), recorded('endpoint_failed.json'),
+              recorded('transform_job_completed.json')]
+    response = event_handler.handle_events({'Records': [
+        {'messageId': str(index), 'body': json.dumps(event)} for index, event in enumerate(events)]})
+
+    assert response == {'batchItemFailures': []}
+    assert dynamo_handler.get_job('p-Train-1548045000')['endpoint_status'] == 'Completed'
+    assert dynamo_handler.get_job('p-Transform-1548052000')['endpoint_status'] == 'Completed'
+    assert dynamo_handler.get_job(JOB)['endpoint_status'] == 'Failed'
+    assert JOB not in fake.sagemaker.endpoints
+
+    # a failed record fails the invocation, a returned batchItemFailures would be dropped
+    with pytest.raises(sqs_handler.BatchItemFailures) as error:
+        event_handler.handle_events({'Records': [{'messageId': 'bad', 'body': 'not json'}]})
+    assert error.value.failures == [{'itemIdentifier': 'bad'}]
+
+
+def test_replayed_and_foreign_events_are_ignored(fake):
+    event_handler.handle_events(recorded('endpoint_in_service.json'))
+    calls = fake.calls.total()
+
+    assert event_handler.handle_events(recorded('endpoint_failed.json')) is None
+    foreign = recorded('endpoint_in_service.json')
+    foreign['detail']['EndpointName'] = 'someone-elses-endpoint'
+    assert event_handler.handle_events(foreign) is None
+    # one job lookup each, nothing written
+    assert fake.calls.total() - calls == 2
+    assert dynamo_handler.get_job(JOB)['endpoint_status'] == 'InService'
+
+
+def test_promotion_moves_autoscaling_to_new_endpoint(fake):
+    scaled = [dict(VariantName='default', InitialInstanceCount=1, InstanceType='ml.m4.xlarge',
+                   AutoScaling={'MinCapacity': 1, 'MaxCapacity': 4, 'TargetInvocationsPerInstance': 500})]
+    for endpoint_name in (PREVIOUS, JOB):
+        dynamo_handler.create_endpoint(endpoint_name, endpoint_config=json.dumps(scaled))
+    fake.autoscaling.register_scalable_target(ResourceId=f'endpoint/{PREVIOUS}/variant/default')
+
+    event_handler.handle_events(recorded('endpoint_in_service.json'))
+
+    assert list(fake.autoscaling.targets) == [f'endpoint/{JOB}/variant/default']
+    target = fake.autoscaling.targets[f'endpoint/{JOB}/variant/default']
+    assert (target['MinCapacity'], target['MaxCapacity']) == (1, 4)
+    policy = fake.autoscaling.policies[f'endpoint/{JOB}/variant/default']
+    assert policy['TargetTrackingScalingPolicyConfiguration']['TargetValue'] == 500.0
@@ -0,0 +1,790 @@
+"""
+in-process stand-ins for the aws services used by the handlers, for tests and benchmarks.
+they only implement the calls and expression forms the handlers make,
+count every call and can inject a fixed latency per call
+"""
+import copy
+import io
+import time
+import threading
+import uuid
+from collections import Counter, OrderedDict, namedtuple
+from decimal import Decimal
+from botocore.exceptions import ClientError
+from boto3.dynamodb.conditions import AttributeBase
+from sagemaker_svc_wrapper.configs import clients, metrics
+from sagemaker_svc_wrapper.configs.settings import SYS_CONFIG
+
+FakeAws = namedtuple('FakeAws', ['calls', 'dynamodb', 'sagemaker', 'sqs', 'autoscaling', 'runtime', 's3'])
+
+OK = {'ResponseMetadata': {'HTTPStatusCode': 200}}
+
+
+def client_error(code, operation_name, message='', status_code=None):
+    response = {'Error': {'Code': code, 'Message': message}}
+    if status_code:
+        response['ResponseMetadata'] = {'HTTPStatusCode': status_code}
+    return ClientError(response, operation_name)
+
+
+class AwsCalls:
+    """
+    thread safe counter of fake aws calls by 'service.Operation', sleeps latency seconds per call
+        :param latency: injected seconds per call
+    """
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, service_name, operation_name):
+        start = time.perf_counter()
+        with self._lock:
+            self.counts[f'{service_name}.{operation_name}'] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        # fakes bypass botocore events, feed the per-request metrics directly
+        metrics.record_call(metrics.CallRecord(service_name, operation_name, (time.perf_counter() - start) * 1000,
+                                               retries=0, throttles=0, error=False))
+
+    def total(self):
+        with self._lock:
+            return sum(self.counts.values())
+
+    def reset(self):
+        with self._lock:
+            self.counts.clear()
+
+
+def to_dynamo(value):
+    """
+    store values the way dynamo returns them: numbers as Decimal, floats rejected like boto3 does
+    """
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, float):
+        raise TypeError('Float types are not supported. Use Decimal types instead.')
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, dict):
+        return {key: to_dynamo(nested) for key, nested in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_dynamo(nested) for nested in value]
+    return value
+
+
+def evaluate(condition, item):
+    """
+    evaluate a boto3 condition or key condition against an item
+    """
+    expression = condition.get_expression()
+    operator = expression['operator']
+    values = expression['values']
+
+    def operand(value):
+        if isinstance(value, AttributeBase):
+            return item.get(value.name)
+        return to_dynamo(value)
+
+    if operator == 'AND':
+        return all(evaluate(value, item) for value in values)
+    if operator == 'OR':
+        return any(evaluate(value, item) for value in values)
+    if operator == 'NOT':
+        return not evaluate(values[0], item)
+    if operator == 'attribute_exists':
+        return values[0].name in item
+    if operator == 'attribute_not_exists':
+        return values[0].name not in item
+
+    left = operand(values[0])
+    if operator == 'IN':
+        return left in [to_dynamo(value) for value in values[1]]
+    if operator == 'begins_with':
+        return isinstance(left, str) and left.startswith(values[1])
+    if operator == 'contains':
+        return left is not None and values[1] in left
+    if left is None:
+        return operator == '<>'
+    if operator == 'BETWEEN':
+        return operand(values[1]) <= left <= operand(values[2])
+    right = operand(values[1])
+    return {
+        '=': lambda: left == right,
+        '<>': lambda: left != right,
+        '<': lambda: left < right,
+        '<=': lambda: left <= right,
+        '>': lambda: left > right,
+        '>=': lambda: left >= right,
+    }[operator]()
+
+
+class FakeTable:
+    """
+    dynamo table stand-in
+        :param name: table name
+        :param key_names: primary key attribute names
+        :param indexes: dict of index name to (hash key, range key or None)
+        :param calls: AwsCalls
+    """
+    def __init__(self, name, key_names, indexes=None, calls=None):
+        self.name = name
+        self.key_names = key_names
+        self.indexes = indexes or {}
+        self.calls = calls or AwsCalls()
+        self.items = {}
+        self._lock = threading.Lock()
+
+    def _key(self, key):
+        return tuple(key[name] for name in self.key_names)
+
+    def _record(self, operation_name):
+        self.calls.record('dynamodb', operation_name)
+
+    def get_item(self, Key, ConsistentRead=False, **kwargs):
+        self._record('GetItem')
+        with self._lock:
+            item = self.items.get(self._key(to_dynamo(Key)))
+            response = dict(OK)
+            if item is not None:
+                response['Item'] = copy.deepcopy(item)
+            return response
+
+    def put_item(self, Item, ConditionExpression=None, **kwargs):
+        self._record('PutItem')
+        item = to_dynamo(Item)
+        with self._lock:
+            existing = self.items.get(self._key(item), {})
+            if ConditionExpression is not None and not evaluate(ConditionExpression, existing):
+                raise client_error('ConditionalCheckFailedException', 'PutItem')
+            self.items[self._key(item)] = item
+        return dict(OK)
+
+    def delete_item(self, Key, **kwargs):
+        self._record('DeleteItem')
+        with self._lock:
+            self.items.pop(self._key(to_dynamo(Key)), None)
+        return dict(OK)
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ConditionExpression=None, ReturnValues='NONE', **kwargs):
+        """
+        supports 'SET #name = :value, ...' expressions, the form dynamo_handler generates
+        """
+        self._record('UpdateItem')
+        names = ExpressionAttributeNames or {}
+        values = to_dynamo(ExpressionAttributeValues or {})
+        key = to_dynamo(Key)
+        assert UpdateExpression.startswith('SET '), UpdateExpression
+        with self._lock:
+            existing = self.items.get(self._key(key))
+            stored = copy.deepcopy(existing) if existing is not None else dict(key)
+            if ConditionExpression is not None and not evaluate(ConditionExpression, stored if existing else {}):
+                raise client_error('ConditionalCheckFailedException', 'UpdateItem')
+            old_values = {}
+            for assignment in UpdateExpression[len('SET '):].split(','):
+                name, value = (part.strip() for part in assignment.split('='))
+                attribute = names.get(name, name)
+                if attribute in stored:
+                    old_values[attribute] = stored[attribute]
+                stored[attribute] = values[value]
+            self.items[self._key(key)] = stored
+
+        response = dict(OK)
+        if ReturnValues == 'ALL_NEW':
+            response['Attributes'] = copy.deepcopy(stored)
+        elif ReturnValues == 'UPDATED_OLD':
+            response['Attributes'] = copy.deepcopy(old_values)
+        return response
+
+    def query(self, KeyConditionExpression, IndexName=None, FilterExpression=None, Limit=None,
+              ExclusiveStartKey=None, ScanIndexForward=True, ConsistentRead=False, **kwargs):
+        self._record('Query')
+        if IndexName and IndexName not in self.indexes:
+            raise client_error('ValidationException', 'Query',
+                               f'The table does not have the specified index: {IndexName}')
+        hash_key, range_key = self.indexes[IndexName] if IndexName else (self.key_names + [None])[:2]
+        with self._lock:
+            matches = [item for item in self.items.values()
+                       if hash_key in item and evaluate(KeyConditionExpression, item)]
+        matches.sort(key=lambda item: (item.get(range_key, 0) if range_key else 0, self._key(item)),
+                     reverse=not ScanIndexForward)
+
+        start = 0
+        if ExclusiveStartKey:
+            start_key = self._key(to_dynamo(ExclusiveStartKey))
+            start = next((index + 1 for index, item in enumerate(matches) if self._key(item) == start_key), 0)
+        end = len(matches) if Limit is None else min(len(matches), start + Limit)
+        page = matches[start:end]
+
+        response = dict(OK)
+        response['Items'] = [copy.deepcopy(item) for item in page
+                             if FilterExpression is None or evaluate(FilterExpression, item)]
+        response['Count'] = len(response['Items'])
+        if end < len(matches) and page:
+            last = page[-1]
+            response['LastEvaluatedKey'] = {name: last[name] for name in
+                                            set(self.key_names) | {hash_key, range_key} - {None} if name in last}
+        return response
+
+
+    def scan(self, FilterExpression=None, Limit=None, ExclusiveStartKey=None, **kwargs):
+        self._record('Scan')
+        with self._lock:
+            items = sorted(self.items.values(), key=self._key)
+        start = 0
+        if ExclusiveStartKey:
+            start_key = self._key(to_dynamo(ExclusiveStartKey))
+            start = next((index + 1 for index, item in enumerate(items) if self._key(item) == start_key), 0)
+        end = len(items) if Limit is None else min(len(items), start + Limit)
+        page = items[start:end]
+
+        response = dict(OK)
+        response['Items'] = [copy.deepcopy(item) for item in page
+                             if FilterExpression is None or evaluate(FilterExpression, item)]
+        if end < len(items) and page:
+            response['LastEvaluatedKey'] = {name: page[-1][name] for name in self.key_names}
+        return response
+
+    def batch_writer(self):
+        return FakeBatchWriter(self)
+
+
+class FakeBatchWriter:
+    """
+    Table.batch_writer stand-in, one BatchWriteItem call per 25 buffered deletes
+    """
+    def __init__(self, table):
+        self.table = table
+        self.keys = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+    def delete_item(self, Key):
+        self.keys.append(Key)
+        if len(self.keys) == 25:
+            self.flush()
+
+    def flush(self):
+        if not self.keys:
+            return
+        self.table.calls.record('dynamodb', 'BatchWriteItem')
+        with self.table._lock:
+            for key in self.keys:
+                self.table.items.pop(self.table._key(to_dynamo(key)), None)
+        self.keys = []
+
+
+class FakeDynamoResource:
+    """
+    dynamo resource stand-in holding FakeTables
+        :param calls: AwsCalls
+    """
+    def __init__(self, calls):
+        self.calls = calls
+        self.tables = {}
+        # per upcoming BatchGetItem call, how many keys of each table come back as UnprocessedKeys
+        self.unprocessed = []
+
+    def unprocess_next(self, keys=1, times=1):
+        """
+        leave the last keys of each table unprocessed in the next times BatchGetItem calls, like a throttled table
+        """
+        self.unprocessed.extend([keys] * times)
+
+    def create_table(self, name, key_names, indexes=None):
+        self.tables[name] = FakeTable(name, key_names, indexes, self.calls)
+        return self.tables[name]
+
+    def Table(self, name):
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems):
+        self.calls.record('dynamodb', 'BatchGetItem')
+        unprocessed_count = self.unprocessed.pop(0) if self.unprocessed else 0
+        responses, unprocessed = {}, {}
+        for table_name, request in RequestItems.items():
+            table = self.tables[table_name]
+            keys = request['Keys']
+            if unprocessed_count:
+                keys, left = keys[:-unprocessed_count], keys[-unprocessed_count:]
+                unprocessed[table_name] = dict(request, Keys=left)
+            with table._lock:
+                found = [table.items.get(table._key(to_dynamo(key))) for key in keys]
+            responses[table_name] = [copy.deepcopy(item) for item in found if item is not None]
+        return dict(OK, Responses=responses, UnprocessedKeys=unprocessed)
+
+
+class FakePaginator:
+    """
+    pages of a list call, every page counts as one call
+    """
+    def __init__(self, record, list_call, result_key):
+        self.record = record
+        self.list_call = list_call
+        self.result_key = result_key
+
+    def paginate(self, MaxResults=100, **kwargs):
+        results = self.list_call(**kwargs)
+        for index in range(0, max(len(results), 1), MaxResults):
+            self.record()
+            yield {self.result_key: results[index:index + MaxResults]}
+
+
+class FakeSageMaker:
+    """
+    sagemaker control plane stand-in, endpoints stay Creating/Updating until settle() is called
+        :param calls: AwsCalls
+    """
+    def __init__(self, calls):
+        self.calls = calls
+        self.models = {}
+        self.endpoint_configs = {}
+        self.endpoints = {}
+        self.training_jobs = {}
+        self.transform_jobs = {}
+        # operation name to errors raised by its next calls
+        self.failures = {}
+        self._lock = threading.Lock()
+
+    def _record(self, operation_name):
+        self.calls.record('sagemaker', operation_name)
+        with self._lock:
+            errors = self.failures.get(operation_name)
+            error = errors.pop(0) if errors else None
+        if error is not None:
+            raise error
+
+    def fail_next(self, operation_name, code='ThrottlingException', times=1):
+        with self._lock:
+            self.failures.setdefault(operation_name, []).extend(
+                client_error(code, operation_name, 'injected failure') for _ in range(times))
+
+    def settle(self, status='InService', training_status='Completed'):
+        """
+        finish every in-flight endpoint, training and transform job
+        """
+        with self._lock:
+            for endpoint in self.endpoints.values():
+                if endpoint['EndpointStatus'] in ('Creating', 'Updating'):
+                    endpoint['EndpointStatus'] = status
+            for training_job in self.training_jobs.values():
+                if training_job['TrainingJobStatus'] == 'InProgress':
+                    training_job['TrainingJobStatus'] = training_status
+            for transform_job in self.transform_jobs.values():
+                if transform_job['TransformJobStatus'] == 'InProgress':
+                    transform_job['TransformJobStatus'] = training_status
+
+    def create_model(self, ModelName, **kwargs):
+        self._record('CreateModel')
+        with self._lock:
+            if ModelName in self.models:
+                raise client_error('ValidationException', 'CreateModel',
+                                   f'Cannot create already existing model "{ModelName}".')
+            self.models[ModelName] = dict(kwargs, ModelName=ModelName, CreationTime=time.time())
+        return {'ModelArn': f'arn:aws:sagemaker:local:0:model/{ModelName}'}
+
+    def create_endpoint_config(self, EndpointConfigName, ProductionVariants, **kwargs):
+        self._record('CreateEndpointConfig')
+        with self._lock:
+            if EndpointConfigName in self.endpoint_configs:
+                raise client_error('ValidationException', 'CreateEndpointConfig',
+                                   f'Cannot create already existing endpoint configuration "{EndpointConfigName}".')
+            self.endpoint_configs[EndpointConfigName] = dict(kwargs, EndpointConfigName=EndpointConfigName,
+                                                             ProductionVariants=ProductionVariants,
+                                                             CreationTime=time.time())
+        return {'EndpointConfigArn': f'arn:aws:sagemaker:local:0:endpoint-config/{EndpointConfigName}'}
+
+    def create_endpoint(self, EndpointName, EndpointConfigName, **kwargs):
+        self._record('CreateEndpoint')
+        with self._lock:
+            if EndpointName in self.endpoints:
+                raise client_error('ValidationException', 'CreateEndpoint', f'endpoint {EndpointName} exists')
+            self.endpoints[EndpointName] = {
+                'EndpointName': EndpointName,
+                'EndpointArn': f'arn:aws:sagemaker:local:0:endpoint/{EndpointName}',
+                'EndpointConfigName': EndpointConfigName,
+                'EndpointStatus': 'Creating',
+                'ProductionVariants': self._live_variants(EndpointConfigName),
+                'CreationTime': time.time(),
+            }
+        return {'EndpointArn': self.endpoints[EndpointName]['EndpointArn']}
+
+    def update_endpoint(self, EndpointName, EndpointConfigName, **kwargs):
+        self._record('UpdateEndpoint')
+        with self._lock:
+            endpoint = self._endpoint(EndpointName, 'UpdateEndpoint')
+            endpoint.update(EndpointConfigName=EndpointConfigName, EndpointStatus='Updating',
+                            ProductionVariants=self._live_variants(EndpointConfigName))
+        return {'EndpointArn': endpoint['EndpointArn']}
+
+    def _live_variants(self, endpoint_config_name):
+        config = self.endpoint_configs.get(endpoint_config_name, {})
+        return [{'VariantName': variant['VariantName'],
+                 'CurrentWeight': variant.get('InitialVariantWeight', 1.0),
+                 'CurrentInstanceCount': variant.get('InitialInstanceCount', 1)}
+                for variant in config.get('ProductionVariants', [])]
+
+    def update_endpoint_weights_and_capacities(self, EndpointName, DesiredWeightsAndCapacities):
+        self._record('UpdateEndpointWeightsAndCapacities')
+        with self._lock:
+            endpoint = self._endpoint(EndpointName, 'UpdateEndpointWeightsAndCapacities')
+            if endpoint['EndpointStatus'] != 'InService':
+                raise client_error('ValidationException', 'UpdateEndpointWeightsAndCapacities',
+                                   f'Cannot update in-progress endpoint "{EndpointName}".')
+            live = {variant['VariantName']: variant for variant in endpoint['ProductionVariants']}
+            for desired in DesiredWeightsAndCapacities:
+                variant = live[desired['VariantName']]
+                variant['CurrentWeight'] = desired.get('DesiredWeight', variant['CurrentWeight'])
+                variant['CurrentInstanceCount'] = desired.get('DesiredInstanceCount', variant['CurrentInstanceCount'])
+            endpoint['EndpointStatus'] = 'Updating'
+        return {'EndpointArn': endpoint['EndpointArn']}
+
+    def describe_model(self, ModelName):
+        self._record('DescribeModel')
+        with self._lock:
+            if ModelName not in self.models:
+                raise client_error('ValidationException', 'DescribeModel', f'Could not find model "{ModelName}".')
+            return copy.deepcopy(self.models[ModelName])
+
+    def _endpoint(self, endpoint_name, operation_name):
+        if endpoint_name not in self.endpoints:
+            raise client_error('ValidationException', operation_name, f'Could not find endpoint "{endpoint_name}".')
+        return self.endpoints[endpoint_name]
+
+    def describe_endpoint(self, EndpointName):
+        self._record('DescribeEndpoint')
+        with self._lock:
+            return copy.deepcopy(self._endpoint(EndpointName, 'DescribeEndpoint'))
+
+    def delete_endpoint(self, EndpointName):
+        self._record('DeleteEndpoint')
+        with self._lock:
+            self._endpoint(EndpointName, 'DeleteEndpoint')
+            del self.endpoints[EndpointName]
+        return {}
+
+    def create_training_job(self, TrainingJobName, **kwargs):
+        self._record('CreateTrainingJob')
+        with self._lock:
+            if TrainingJobName in self.training_jobs:
+                raise client_error('ResourceInUse', 'CreateTrainingJob',
+                                   'a training job with this name already exists')
+            self.training_jobs[TrainingJobName] = dict(kwargs, TrainingJobName=TrainingJobName,
+                                                       TrainingJobStatus='InProgress', CreationTime=time.time())
+        return {'TrainingJobArn': f'arn:aws:sagemaker:local:0:training-job/{TrainingJobName}'}
+
+    def describe_training_job(self, TrainingJobName):
+        self._record('DescribeTrainingJob')
+        with self._lock:
+            if TrainingJobName not in self.training_jobs:
+                raise client_error('ValidationException', 'DescribeTrainingJob', 'Requested resource not found.')
+            return copy.deepcopy(self.training_jobs[TrainingJobName])
+
+    def create_transform_job(self, TransformJobName, ModelName, **kwargs):
+        self._record('CreateTransformJob')
+        with self._lock:
+            if ModelName not in self.models:
+                raise client_error('ValidationException', 'CreateTransformJob', f'Could not find model "{ModelName}".')
+            if TransformJobName in self.transform_jobs:
+                raise client_error('ResourceInUse', 'CreateTransformJob',
+                                   'a transform job with this name already exists')
+            self.transform_jobs[TransformJobName] = dict(kwargs, TransformJobName=TransformJobName,
+                                                         ModelName=ModelName, TransformJobStatus='InProgress',
+                                                         CreationTime=time.time())
+        return {'TransformJobArn': f'arn:aws:sagemaker:local:0:transform-job/{TransformJobName}'}
+
+    def describe_transform_job(self, TransformJobName):
+        self._record('DescribeTransformJob')
+        with self._lock:
+            if TransformJobName not in self.transform_jobs:
+                raise client_error('ValidationException', 'DescribeTransformJob', 'Requested resource not found.')
+            return copy.deepcopy(self.transform_jobs[TransformJobName])
+
+    def list_transform_jobs(self, MaxResults=100, NextToken=None, **kwargs):
+        self._record('ListTransformJobs')
+        results = self._list(self.transform_jobs, 'TransformJobName', 'TransformJobStatus', **kwargs)
+        start = int(NextToken or 0)
+        response = {'TransformJobSummaries': results[start:start + MaxResults]}
+        if start + MaxResults < len(results):
+            response['NextToken'] = str(start + MaxResults)
+        return response
+
+    def _list(self, resources, name_key, status_key, CreationTimeAfter=None, CreationTimeBefore=None,
+              StatusEquals=None, **kwargs):
+        with self._lock:
+            return [{name_key: resource[name_key], 'CreationTime': resource['CreationTime'],
+                     **({status_key: resource[status_key]} if status_key else {})}
+                    for resource in resources.values()
+                    if (CreationTimeAfter is None or resource['CreationTime'] > CreationTimeAfter)
+                    and (CreationTimeBefore is None or resource['CreationTime'] < CreationTimeBefore)
+                    and (StatusEquals is None or resource[status_key] == StatusEquals)]
+
+    def delete_model(self, ModelName):
+        self._record('DeleteModel')
+        with self._lock:
+            if ModelName not in self.models:
+                raise client_error('ValidationException', 'DeleteModel', f'Could not find model "{ModelName}".')
+            del self.models[ModelName]
+        return {}
+
+    def delete_endpoint_config(self, EndpointConfigName):
+        self._record('DeleteEndpointConfig')
+        with self._lock:
+            if EndpointConfigName not in self.endpoint_configs:
+                raise client_error('ValidationException', 'DeleteEndpointConfig',
+                                   f'Could not find endpoint configuration "{EndpointConfigName}".')
+            del self.endpoint_configs[EndpointConfigName]
+        return {}
+
+    def get_paginator(self, operation_name):
+        operation = ''.join(part.title() for part in operation_name.split('_'))
+        listings = {
+            'list_endpoints': (self.endpoints, 'EndpointName', 'EndpointStatus', 'Endpoints'),
+            'list_training_jobs': (self.training_jobs, 'TrainingJobName', 'TrainingJobStatus', 'TrainingJobSummaries'),
+            'list_models': (self.models, 'ModelName', None, 'Models'),
+            'list_endpoint_configs': (self.endpoint_configs, 'EndpointConfigName', None, 'EndpointConfigs'),
+        }
+        resources, name_key, status_key, result_key = listings[operation_name]
+        return FakePaginator(lambda: self._record(operation),
+                             lambda **kwargs: self._list(resources, name_key, status_key, **kwargs), result_key)
+
+
+class FakeSageMakerRuntime:
+    """
+    sagemaker-runtime stand-in for InService endpoints of the control plane fake,
+    answers with model(body, content_type) or echoes the payload
+        :param calls: AwsCalls
+        :param sagemaker: FakeSageMaker holding the endpoints
+    """
+    def __init__(self, calls, sagemaker):
+        self.calls = calls
+        self.sagemaker = sagemaker
+        self.model = None
+        self.invocations = []
+
+    def invoke_endpoint(self, EndpointName, Body, ContentType='application/octet-stream', Accept=None,
+                        TargetVariant=None, TargetModel=None, CustomAttributes=None):
+        self.calls.record('sagemaker-runtime', 'InvokeEndpoint')
+        with self.sagemaker._lock:
+            endpoint = copy.deepcopy(self.sagemaker.endpoints.get(EndpointName))
+        if endpoint is None or endpoint['EndpointStatus'] not in ('InService', 'Updating'):
+            raise client_error('ValidationError', 'InvokeEndpoint',
+                               f'Endpoint {EndpointName} of account 0 not found.', status_code=400)
+        variant_names = [variant['VariantName'] for variant in endpoint['ProductionVariants']] or ['default']
+        if TargetVariant and TargetVariant not in variant_names:
+            raise client_error('ValidationError', 'InvokeEndpoint',
+                               f'Variant {TargetVariant} not found for endpoint {EndpointName}', status_code=400)
+        self.invocations.append({'EndpointName': EndpointName, 'Body': Body, 'ContentType': ContentType,
+                                 'Accept': Accept, 'TargetVariant': TargetVariant, 'TargetModel': TargetModel})
+        output = self.model(Body, ContentType) if self.model else Body
+        response = {'Body': io.BytesIO(output),
+                    'ContentType': Accept if Accept and Accept != '*/*' else ContentType,
+                    'InvokedProductionVariant': TargetVariant or variant_names[0]}
+        if CustomAttributes:
+            response['CustomAttributes'] = CustomAttributes
+        return response
+
+
+class FakeApplicationAutoScaling:
+    """
+    application autoscaling stand-in, keeps scalable targets and policies by resource id
+        :param calls: AwsCalls
+    """
+    def __init__(self, calls):
+        self.calls = calls
+        self.targets = {}
+        self.policies = {}
+        self._lock = threading.Lock()
+
+    def register_scalable_target(self, ResourceId, **kwargs):
+        self.calls.record('application-autoscaling', 'RegisterScalableTarget')
+        with self._lock:
+            self.targets[ResourceId] = dict(kwargs, ResourceId=ResourceId)
+        return OK
+
+    def put_scaling_policy(self, PolicyName, ResourceId, **kwargs):
+        self.calls.record('application-autoscaling', 'PutScalingPolicy')
+        with self._lock:
+            if ResourceId not in self.targets:
+                raise client_error('ObjectNotFoundException', 'PutScalingPolicy', 'No scalable target registered')
+            self.policies[ResourceId] = dict(kwargs, PolicyName=PolicyName)
+        return OK
+
+    def deregister_scalable_target(self, ResourceId, **kwargs):
+        self.calls.record('application-autoscaling', 'DeregisterScalableTarget')
+        with self._lock:
+            if ResourceId not in self.targets:
+                raise client_error('ObjectNotFoundException', 'DeregisterScalableTarget',
+                                   'No scalable target registered')
+            del self.targets[ResourceId]
+            self.policies.pop(ResourceId, None)
+        return OK
+
+
+class FakeS3:
+    """
+    s3 stand-in, objects by (bucket, key)
+        :param calls: AwsCalls
+    """
+    def __init__(self, calls):
+        self.calls = calls
+        self.objects = {}
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.calls.record('s3', 'PutObject')
+        with self._lock:
+            self.objects[(Bucket, Key)] = dict(kwargs, Body=Body if isinstance(Body, bytes) else Body.encode())
+        return {'ETag': f'"{uuid.uuid4().hex}"'}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self.calls.record('s3', 'GetObject')
+        with self._lock:
+            if (Bucket, Key) not in self.objects:
+                raise client_error('NoSuchKey', 'GetObject', 'The specified key does not exist.', status_code=404)
+            stored = dict(self.objects[(Bucket, Key)])
+        stored['Body'] = io.BytesIO(stored['Body'])
+        return stored
+
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        self.calls.record('s3', 'CopyObject')
+        with self._lock:
+            source = (CopySource['Bucket'], CopySource['Key'])
+            if source not in self.objects:
+                raise client_error('NoSuchKey', 'CopyObject', 'The specified key does not exist.', status_code=404)
+            self.objects[(Bucket, Key)] = dict(self.objects[source])
+        return {'CopyObjectResult': {'ETag': f'"{uuid.uuid4().hex}"'}}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self.calls.record('s3', 'DeleteObject')
+        with self._lock:
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix='', **kwargs):
+        self.calls.record('s3', 'ListObjectsV2')
+        with self._lock:
+            keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+        return {'Contents': [{'Key': key} for key in keys], 'KeyCount': len(keys)}
+
+
+class FakeSQS:
+    """
+    single queue stand-in with a dead-letter queue.
+    lambda_event hands out messages like the sqs lambda trigger, complete applies the handler response:
+    failed messages stay queued until max_receive_count deliveries, then move to dead_letters.
+    an invocation that raised fails every message of the batch, batchItemFailures of a returned response
+    only count with report_batch_item_failures, like the event source mapping setting
+        :param calls: AwsCalls
+        :param max_receive_count: deliveries before a message is dead-lettered
+        :param report_batch_item_failures: ReportBatchItemFailures on the event source mapping
+    """
+    def __init__(self, calls, max_receive_count=5, report_batch_item_failures=False):
+        self.calls = calls
+        self.max_receive_count = max_receive_count
+        self.report_batch_item_failures = report_batch_item_failures
+        self.messages = OrderedDict()
+        self.dead_letters = []
+        self._lock = threading.Lock()
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        self.calls.record('sqs', 'SendMessage')
+        message_id = str(uuid.uuid4())
+        with self._lock:
+            self.messages[message_id] = {'messageId': message_id, 'body': MessageBody, 'receive_count': 0}
+        return {'MessageId': message_id}
+
+    def lambda_event(self, batch_size=10):
+        with self._lock:
+            batch = list(self.messages.values())[:batch_size]
+            records = []
+            for message in batch:
+                message['receive_count'] += 1
+                records.append({'messageId': message['messageId'], 'body': message['body'],
+                                'eventSource': 'aws:sqs',
+                                'attributes': {'ApproximateReceiveCount': str(message['receive_count'])}})
+        return {'Records': records}
+
+    def complete(self, event, response):
+        """
+        :param event: event from lambda_event
+        :param response: handler response, or the exception it raised
+        """
+        if isinstance(response, Exception):
+            failed = {record['messageId'] for record in event['Records']}
+        elif self.report_batch_item_failures:
+            failed = {failure['itemIdentifier'] for failure in (response or {}).get('batchItemFailures', [])}
+        else:
+            failed = set()
+        with self._lock:
+            for record in event['Records']:
+                message = self.messages[record['messageId']]
+                if record['messageId'] not in failed:
+                    del self.messages[record['messageId']]
+                elif message['receive_count'] >= self.max_receive_count:
+                    self.dead_letters.append(self.messages.pop(record['messageId']))
+
+    def invoke(self, handler, event):
+        """
+        handler(event) like the lambda runtime, then complete the batch
+        :return: handler response or the exception it raised
+        """
+        try:
+            response = handler(event)
+        except Exception as error:  # pylint: disable=broad-except
+            response = error
+        self.complete(event, response)
+        return response
+
+    def drain(self, handler, batch_size=10, max_batches=100):
+        """
+        deliver batches to handler(event) until the queue is empty
+        """
+        for _ in range(max_batches):
+            event = self.lambda_event(batch_size)
+            if not event['Records']:
+                return
+            self.invoke(handler, event)
+
+
+def install_fake_aws(latency=0.0):
+    """
+    register fresh fake dynamo, sagemaker, sagemaker-runtime, sqs, s3 and application autoscaling backends
+    with the client registry and clear the handler caches
+        :param latency: injected seconds per aws call
+    """
+    from sagemaker_svc_wrapper.handlers import cache_handler
+
+    calls = AwsCalls(latency)
+    dynamodb = FakeDynamoResource(calls)
+    dynamodb.create_table(SYS_CONFIG.project_table, ['project_name'])
+    dynamodb.create_table(SYS_CONFIG.project_models_table, ['project_name', 'variant_name'],
+                          {'project_name-index': ('project_name', 'variant_name')})
+    dynamodb.create_table(SYS_CONFIG.job_table, ['job_name'],
+                          {'project_name-timestamp_queued-index': ('project_name', 'timestamp_queued'),
+                           'project_variant-timestamp_queued-index': ('project_variant', 'timestamp_queued'),
+                           'project_job_type-timestamp_queued-index': ('project_job_type', 'timestamp_queued'),
+                           'endpoint_status-index': ('endpoint_status', None)})
+    dynamodb.create_table(SYS_CONFIG.endpoint_table, ['endpoint_name'])
+    sagemaker = FakeSageMaker(calls)
+    sqs = FakeSQS(calls, max_receive_count=SYS_CONFIG.job_max_receive_count)
+
+    clients.reset()
+    clients.register('dynamodb', resource=dynamodb)
+    clients.register('sagemaker', client=sagemaker)
+    clients.register('sqs', client=sqs)
+    autoscaling = FakeApplicationAutoScaling(calls)
+    clients.register('application-autoscaling', client=autoscaling)
+    runtime = FakeSageMakerRuntime(calls, sagemaker)
+    clients.register('sagemaker-runtime', client=runtime)
+    s3 = FakeS3(calls)
+    clients.register('s3', client=s3)
+    metrics.clear()
+    for cache in cache_handler.CACHES.values():
+        cache.clear()
+    return FakeAws(calls, dynamodb, sagemaker, sqs, autoscaling, runtime, s3)
@@ -0,0 +1,64 @@
+import json
+import pytest
+
+pytest.importorskip('boto3')
+
+from tests.fakes import install_fake_aws  # pylint: disable=wrong-import-position
+from sagemaker_svc_wrapper.handlers import dynamo_handler  # pylint: disable=wrong-import-position
+from cron import gc_handler  # pylint: disable=wrong-import-position
+
+DAY = 24 * 60 * 60
+NOW = 1548041871
+OLD = NOW - 30 * DAY
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    """
+    project p serving p-Serve-3 with p-Train-2 as latest_model, an old retired serve job p-Serve-1
+    whose model and config nothing uses, a young orphan p-Serve-4 and old resources of other teams
+    """
+    monkeypatch.setattr(gc_handler.maya, 'now', lambda: gc_handler.maya.MayaDT(NOW))
+    fake = install_fake_aws()
+    dynamo_handler.create_project('p', serving_endpoint='p-Serve-3')
+    dynamo_handler.create_project_model('p', latest_model='p-Train-2')
+    dynamo_handler.log_job('p', 'Serve', job_name='p-Serve-1', endpoint_status='Retired')
+    dynamo_handler.log_job('p', 'Serve', job_name='p-Serve-3', endpoint_status='InService')
+    dynamo_handler.create_endpoint('p-Serve-3', project_name='p', endpoint_config=json.dumps(
+        [{'VariantName': 'default', 'ModelName': 'p-Serve-3'}]))
+    fake.sagemaker.endpoints['p-Serve-3'] = {'EndpointName': 'p-Serve-3', 'EndpointStatus': 'InService',
+                                             'CreationTime': OLD}
+    for name, created in (('p-Serve-1', OLD), ('p-Train-2', OLD), ('p-Serve-3', OLD), ('p-Serve-4', NOW),
+                          ('other-Serve-1', OLD), ('handmade', OLD)):
+        fake.sagemaker.models[name] = {'ModelName': name, 'CreationTime': created}
+        fake.sagemaker.endpoint_configs[name] = {'EndpointConfigName': name, 'CreationTime': created}
+    return fake
+
+
+def test_dry_run_only_reports_old_unreferenced_resources_of_known_projects(fake):
+    fake.calls.reset()
+    report = gc_handler.collect_garbage({'dry_run': True})
+    assert report == {'dry_run': True, 'models': ['p-Serve-1'], 'endpoint_configs': ['p-Serve-1']}
+    assert len(fake.sagemaker.models) == 6
+    assert fake.calls.counts['dynamodb.PutItem'] == 0
+
+
+def test_orphans_are_deleted_and_logged_to_the_job_table(fake):
+    fake.calls.reset()
+    report = gc_handler.collect_garbage()
+    assert report['deleted_models'] == ['p-Serve-1']
+    assert report['deleted_endpoint_configs'] == ['p-Serve-1']
+    assert report['failed'] == []
+    assert sorted(fake.sagemaker.models) == ['handmade', 'other-Serve-1', 'p-Serve-3', 'p-Serve-4', 'p-Train-2']
+    assert sorted(fake.sagemaker.endpoint_configs) == \
+        ['handmade', 'other-Serve-1', 'p-Serve-3', 'p-Serve-4', 'p-Train-2']
+
+    run = dynamo_handler.get_job(f'gc-{NOW}')
+    assert run['job_type'] == 'GarbageCollection'
+    assert json.loads(run['deleted_endpoint_configs']) == ['p-Serve-1']
+    assert dynamo_handler.get_job('p-Serve-1')['model_deleted_at'] == NOW
+    # the run record stays out of the project's job history
+    assert sorted(job['job_name'] for job in dynamo_handler.list_jobs('p')) == ['p-Serve-1', 'p-Serve-3']
+
+    # a second run finds nothing left
+    assert gc_handler.collect_garbage()['models'] == []
@@ -0,0 +1,136 @@
+import json
+import threading
+import time
+import pytest
+
+pytest.importorskip('boto3')
+
+import boto3  # pylint: disable=wrong-import-position
+from botocore.awsrequest import AWSResponse  # pylint: disable=wrong-import-position
+from tests.fakes import install_fake_aws  # pylint: disable=wrong-import-position
+from sagemaker_svc_wrapper.handlers import dynamo_handler, runtime_handler  # pylint: disable=wrong-import-position
+from sagemaker_svc_wrapper.configs.settings import SYS_CONFIG  # pylint: disable=wrong-import-position
+
+LIVE = 'p-Serve-1548000000'
+NEXT = 'p-Serve-1548041871'
+
+
+@pytest.fixture
+def fake():
+    fake = install_fake_aws()
+    dynamo_handler.create_project('p', variants={'a': 1, 'b': 1})
+    dynamo_handler.update_project('p', {'serving_endpoint': LIVE})
+    for endpoint_name in (LIVE, NEXT):
+        fake.sagemaker.create_endpoint_config(EndpointConfigName=endpoint_name, ProductionVariants=[
+            {'VariantName': 'a', 'ModelName': endpoint_name}, {'VariantName': 'b', 'ModelName': endpoint_name}])
+        fake.sagemaker.create_endpoint(EndpointName=endpoint_name, EndpointConfigName=endpoint_name)
+    fake.sagemaker.settle()
+    return fake
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import app
+    monkeypatch.setattr(SYS_CONFIG, 'log_request_metrics', False)
+    return app.app.test_client()
+
+
+def test_invoke_passes_payload_through_with_cached_lookup(fake, client):
+    fake.calls.reset()
+    for _ in range(3):
+        response = client.post('/invoke/p?variant=b', data=b'1,2,3', content_type='text/csv',
+                               headers={'Accept': 'text/csv'})
+        assert response.status_code == 200
+        assert response.data == b'1,2,3'
+        assert response.content_type == 'text/csv'
+        assert response.headers['X-Invoked-Endpoint'] == LIVE
+        assert response.headers['X-Invoked-Variant'] == 'b'
+
+    assert fake.runtime.invocations[-1]['TargetVariant'] == 'b'
+    assert fake.runtime.invocations[-1]['ContentType'] == 'text/csv'
+    assert fake.calls.counts['dynamodb.GetItem'] == 1
+    assert client.post('/invoke/missing', data=b'{}').status_code == 404
+    assert client.post('/invoke/p?variant=c', data=b'{}', content_type='application/json').status_code == 400
+
+
+def test_promotion_elsewhere_is_picked_up_when_the_old_endpoint_is_gone(fake, client):
+    assert client.post('/invoke/p', data=b'{}', content_type='application/json').headers['X-Invoked-Endpoint'] == LIVE
+
+    # another container promotes: the project record moves on and the old endpoint is deleted
+    fake.dynamodb.Table(SYS_CONFIG.project_table).items[('p',)]['serving_endpoint'] = NEXT
+    fake.sagemaker.delete_endpoint(EndpointName=LIVE)
+    response = client.post('/invoke/p', data=b'{}', content_type='application/json')
+    assert response.status_code == 200
+    assert response.headers['X-Invoked-Endpoint'] == NEXT
+
+    # a promotion in this container invalidates the cached name right away
+    dynamo_handler.update_project('p', {'serving_endpoint': LIVE})
+    fake.sagemaker.create_endpoint(EndpointName=LIVE, EndpointConfigName=LIVE)
+    fake.sagemaker.settle()
+    assert client.post('/invoke/p', data=b'{}', content_type='application/json').headers['X-Invoked-Endpoint'] == LIVE
+
+
+def test_promotion_elsewhere_shows_once_the_cached_endpoint_expires(fake, client, monkeypatch):
+    assert SYS_CONFIG.serving_endpoint_ttl_seconds < SYS_CONFIG.cache_ttl_seconds
+    assert dynamo_handler.serving_endpoint_cache.ttl == SYS_CONFIG.serving_endpoint_ttl_seconds
+    monkeypatch.setattr(dynamo_handler.serving_endpoint_cache, 'ttl', 0.05)
+    assert client.post('/invoke/p', data=b'{}', content_type='application/json').headers['X-Invoked-Endpoint'] == LIVE
+
+    # another container promotes and the old endpoint keeps running: served until the entry expires
+    fake.dynamodb.Table(SYS_CONFIG.project_table).items[('p',)]['serving_endpoint'] = NEXT
+    assert client.post('/invoke/p', data=b'{}', content_type='application/json').headers['X-Invoked-Endpoint'] == LIVE
+    time.sleep(0.1)
+    assert client.post('/invoke/p', data=b'{}', content_type='application/json').headers['X-Invoked-Endpoint'] == NEXT
+
+
+def test_target_variant_is_sent_as_header():
+    sent = []
+
+    class Raw:
+        def stream(self, **kwargs):
+            yield b'ok'
+
+    def capture(request, **kwargs):
+        sent.append(request)
+        return AWSResponse(request.url, 200, {'Content-Type': 'text/plain',
+                                              'X-Amzn-Invoked-Production-Variant': 'b'}, Raw())
+
+    runtime = boto3.session.Session(aws_access_key_id='k', aws_secret_access_key='s',
+                                    region_name='ap-southeast-2').client('sagemaker-runtime')
+    runtime_handler.target_variant_hooks(runtime)
+    runtime.meta.events.register('before-send.sagemaker-runtime.InvokeEndpoint', capture)
+
+    response = runtime.invoke_endpoint(EndpointName='e', Body=b'x', ContentType='text/plain', TargetVariant='b',
+                                       TargetModel='p/p-Serve-1.tar.gz')
+    assert response['InvokedProductionVariant'] == 'b'
+    assert sent[0].headers[runtime_handler.TARGET_VARIANT_HEADER] == b'b'
+    assert sent[0].headers[runtime_handler.TARGET_MODEL_HEADER] == b'p/p-Serve-1.tar.gz'
+
+
+def test_concurrent_records_share_one_invocation(fake, client):
+    for variant_name in ('a', 'b'):
+        dynamo_handler.create_project_model('p', variant_name, batching={'max_batch_size': 4, 'max_wait_ms': 2000})
+    fake.runtime.model = lambda body, content_type: json.dumps(
+        {'predictions': [record * 2 for record in json.loads(body)['instances']]}).encode() \
+        if content_type == 'application/json' else body
+    import app
+    responses = {}
+
+    def call(record):
+        response = app.app.test_client().post('/invoke/p', json={'instances': [record]})
+        responses[record] = (response.status_code, response.get_json())
+
+    threads = [threading.Thread(target=call, args=(record,)) for record in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert responses == {record: (200, {'predictions': [record * 2]}) for record in range(4)}
+    assert len(fake.runtime.invocations) == 1
+    assert sorted(json.loads(fake.runtime.invocations[0]['Body'])['instances']) == [0, 1, 2, 3]
+
+    # payloads that can't be merged go out on their own
+    response = client.post('/invoke/p', data=b'raw', content_type='application/octet-stream')
+    assert response.data == b'raw'
+    assert len(fake.runtime.invocations) == 2
@@ -0,0 +1,187 @@
+import json
+import pytest
+
+pytest.importorskip('boto3')
+
+from tests.fakes import install_fake_aws  # pylint: disable=wrong-import-position
+from sagemaker_svc_wrapper.handlers import dynamo_handler, job_handler  # pylint: disable=wrong-import-position
+from sagemaker_svc_wrapper.configs.settings import SYS_CONFIG  # pylint: disable=wrong-import-position
+from cron import status_handler  # pylint: disable=wrong-import-position
+
+SPEC_SERVE = {'InitialInstanceCount': 1, 'InstanceType': 'ml.m4.xlarge',
+              'AutoScaling': {'MinCapacity': 1, 'MaxCapacity': 2, 'TargetInvocationsPerInstance': 100}}
+
+
+@pytest.fixture
+def fake():
+    """
+    project p serving variants a and b from endpoint live
+    """
+    fake = install_fake_aws()
+    config_variants = []
+    for variant in ('a', 'b'):
+        model_name = f'{variant}-model'
+        fake.sagemaker.create_model(ModelName=model_name, PrimaryContainer={'Image': f'image-{variant}'})
+        dynamo_handler.create_project_model('p', variant, spec_serve=SPEC_SERVE, latest_model=model_name)
+        config_variants.append(dict(SPEC_SERVE, VariantName=variant, InitialVariantWeight=1, ModelName=model_name))
+    fake.sagemaker.create_endpoint_config(EndpointConfigName='live', ProductionVariants=config_variants)
+    fake.sagemaker.create_endpoint(EndpointName='live', EndpointConfigName='live')
+    fake.sagemaker.settle()
+    dynamo_handler.create_project('p', variants={'a': 1, 'b': 1})
+    dynamo_handler.update_project('p', {'serving_endpoint': 'live'})
+    return fake
+
+
+def test_weights_shift_in_place(fake):
+    fake.calls.reset()
+    result = job_handler.shift_traffic('p', {'a': 3, 'b': 1}, {'a': 2})
+
+    assert result['mode'] == 'in_place'
+    live = {variant['VariantName']: variant for variant in fake.sagemaker.endpoints['live']['ProductionVariants']}
+    assert (live['a']['CurrentWeight'], live['a']['CurrentInstanceCount'], live['b']['CurrentWeight']) == (3, 2, 1)
+    assert json.loads(dynamo_handler.get_project('p')['variants']) == {'a': 3, 'b': 1}
+    assert not fake.calls.counts['sagemaker.CreateEndpointConfig'] and not fake.calls.counts['sagemaker.UpdateEndpoint']
+
+    # the endpoint is Updating until sagemaker is done
+    with pytest.raises(job_handler.JobError) as error:
+        job_handler.shift_traffic('p', {'a': 1, 'b': 1})
+    assert error.value.status_code == 409
+
+
+def test_new_variant_set_redeploys(fake):
+    result = job_handler.shift_traffic('p', {'a': 1})
+
+    assert result['mode'] == 'redeploy'
+    job = result['job']
+    assert job['image_serve'] == 'image-a'
+    updates = job_handler.submit_serve_job('p', job)
+    assert updates['endpoint_status'] == 'Creating'
+    assert [variant['VariantName'] for variant in json.loads(updates['endpoint_config'])] == ['a']
+    # autoscaling is recorded for the promotion, sagemaker never sees it
+    assert json.loads(dynamo_handler.get_endpoint(job['job_name'])['endpoint_config'])[0]['AutoScaling']
+    assert 'AutoScaling' not in fake.sagemaker.endpoint_configs[job['job_name']]['ProductionVariants'][0]
+
+
+def test_transform_job_scores_with_latest_model(fake, monkeypatch):
+    import app
+    client = app.app.test_client()
+    payload = {'data_input': 's3://data/p/nightly/', 'data_output': 's3://data/p/scores/', 'variant_name': 'b',
+               'instance_count': 2, 'max_payload_mb': 6, 'max_concurrent_transforms': 4, 'split_type': 'Line'}
+
+    response = client.post('/job/p/transform', json=payload)
+    assert response.status_code == 201
+    job_name = response.get_json()['job_name']
+    transform = fake.sagemaker.transform_jobs[job_name]
+    assert transform['ModelName'] == 'b-model'
+    assert transform['BatchStrategy'] == 'MultiRecord'
+    assert (transform['MaxPayloadInMB'], transform['MaxConcurrentTransforms']) == (6, 4)
+    assert transform['TransformResources'] == {'InstanceType': 'ml.m4.xlarge', 'InstanceCount': 2}
+    assert dynamo_handler.get_job(job_name)['endpoint_status'] == 'Transforming'
+    assert client.post('/job/p/transform', json=dict(payload, max_payload_mb=50)).status_code == 400
+
+    # still running: the bulk listing leaves the job alone, then the finished job is recorded
+    monkeypatch.setattr(SYS_CONFIG, 'cron_mode', 'bulk')
+    assert not status_handler.jobs_update().reconciled
+    fake.sagemaker.settle()
+    status_handler.jobs_update()
+    assert dynamo_handler.get_job(job_name)['endpoint_status'] == 'Completed'
+
+
+def test_train_job_streams_sharded_channels(fake):
+    dynamo_handler.create_project_model('p', 'a', image_train=json.dumps('train-image'), spec_train={
+        'InstanceCount': 4, 'InstanceType': 'ml.c5.xlarge', 'VolumeSizeInGB': 50,
+        'TrainingInputMode': 'Pipe', 'S3DataDistributionType': 'ShardedByS3Key'})
+    job = job_handler.prepare_train_job('p', {
+        'variant_name': 'a', 'model_output': 's3://models/p/', 'compression': 'Gzip',
+        'channels': [{'channel_name': 'train', 'data_input': 's3://data/p/train/'},
+                     {'channel_name': 'validation', 'data_input': 's3://data/p/validation/',
+                      'distribution': 'FullyReplicated', 'input_mode': 'File'}]})
+    job_handler.submit_train_job(job)
+
+    training_job = fake.sagemaker.training_jobs[job['job_name']]
+    assert training_job['AlgorithmSpecification']['TrainingInputMode'] == 'Pipe'
+    assert training_job['ResourceConfig'] == {'InstanceCount': 4, 'InstanceType': 'ml.c5.xlarge', 'VolumeSizeInGB': 50}
+    train, validation = training_job['InputDataConfig']
+    assert train['DataSource']['S3DataSource']['S3DataDistributionType'] == 'ShardedByS3Key'
+    assert train['CompressionType'] == 'Gzip' and 'InputMode' not in train
+    assert validation['DataSource']['S3DataSource']['S3DataDistributionType'] == 'FullyReplicated'
+    assert validation['InputMode'] == 'File'
+
+    with pytest.raises(job_handler.JobError):
+        job_handler.prepare_train_job('p', {'variant_name': 'a', 'channels': [
+            {'channel_name': 'train', 'data_input': 's3://a'}, {'channel_name': 'train', 'data_input': 's3://b'}]})
+
+
+def test_multi_model_serve_job_registers_a_target_model(fake, monkeypatch):
+    shared = 's-ml-pipeline-multi-model'
+    monkeypatch.setattr(SYS_CONFIG, 'multi_model_endpoint', shared, raising=False)
+    monkeypatch.setattr(SYS_CONFIG, 'model_artifact_buckets', ['models'], raising=False)
+    fake.sagemaker.create_endpoint_config(EndpointConfigName=shared, ProductionVariants=[
+        {'VariantName': 'AllTraffic', 'ModelName': 'multi-model'}])
+    fake.sagemaker.create_endpoint(EndpointName=shared, EndpointConfigName=shared)
+    fake.sagemaker.settle()
+    fake.s3.put_object(Bucket='models', Key='p/a/model.tar.gz', Body=b'model')
+    dynamo_handler.update_project('p', {'hosting_mode': job_handler.HostingMode.MultiModel.value})
+
+    fake.calls.reset()
+    job, project, project_models = job_handler.prepare_serve_job(
+        'p', {'variant_name': 'a', 'model_artifacts': 's3://models/p/a/model.tar.gz'})
+    updates = job_handler.submit_serve_job('p', job, project, project_models)
+
+    target_model = f"p/{job['job_name']}.tar.gz"
+    assert updates == {'multi_model_endpoint': shared, 'target_model': target_model, 'endpoint_status': 'InService'}
+    assert fake.s3.objects[(SYS_CONFIG.multi_model_bucket, f'{shared}/{target_model}')]['Body'] == b'model'
+    assert not fake.calls.counts['sagemaker.CreateModel'] and not fake.calls.counts['sagemaker.CreateEndpoint']
+    assert dynamo_handler.get_project_model('p', 'a')['latest_model'] == job['job_name']
+
+    # the inference lookup sends the target model to the shared endpoint
+    from sagemaker_svc_wrapper.handlers import runtime_handler
+    assert runtime_handler.invoke('p', b'{}', 'application/json').endpoint_name == shared
+    assert fake.runtime.invocations[-1]['TargetModel'] == target_model
+
+    # the next serve job retires the first one and its copied artifact goes with it
+    dynamo_handler.log_job('p', 'Serve', job_name=job['job_name'], **updates)
+    next_job, project, project_models = job_handler.prepare_serve_job(
+        'p', {'variant_name': 'a', 'model_artifacts': 's3://models/p/a/model.tar.gz'})
+    # job names carry the queue second
+    next_job['job_name'] = f"{job['job_name']}-next"
+    job_handler.submit_serve_job('p', next_job, project, project_models)
+    assert (SYS_CONFIG.multi_model_bucket, f'{shared}/{target_model}') not in fake.s3.objects
+    assert (SYS_CONFIG.multi_model_bucket, f"{shared}/p/{next_job['job_name']}.tar.gz") in fake.s3.objects
+    assert dynamo_handler.get_job(job['job_name'])['endpoint_status'] == 'Retired'
+    assert not fake.calls.counts['sagemaker.DeleteEndpoint']
+
+    assert [mode.value for mode in job_handler.HostingMode] == list(dynamo_handler.HOSTING_MODES)
+    with pytest.raises(ValueError):
+        dynamo_handler.create_project('q', hosting_mode='Multimodel')
+
+    with pytest.raises(job_handler.JobError):
+        job_handler.prepare_serve_job('p', {'variant_name': 'a', 'model_artifacts': 'sagemaker'})
+    with pytest.raises(job_handler.JobError) as error:
+        job_handler.shift_traffic('p', {'a': 1, 'b': 1})
+    assert error.value.status_code == 409
+    # artifacts are only copied from the training output buckets the lambda role may read
+    fake.s3.put_object(Bucket='elsewhere', Key='p/a/model.tar.gz', Body=b'model')
+    with pytest.raises(job_handler.JobError):
+        job_handler.prepare_serve_job('p', {'variant_name': 'a', 'model_artifacts': 's3://elsewhere/p/a/model.tar.gz'})
+    job['model_artifacts'] = 's3://elsewhere/p/a/model.tar.gz'
+    with pytest.raises(job_handler.JobError):
+        job_handler.submit_serve_job('p', job)
+
+
+def test_multi_model_serve_job_needs_a_configured_endpoint(fake, monkeypatch):
+    monkeypatch.setattr(SYS_CONFIG, 'multi_model_endpoint', '', raising=False)
+    dynamo_handler.update_project('p', {'hosting_mode': job_handler.HostingMode.MultiModel.value})
+    job = {'job_name': 'p-Serve-1', 'variant_name': 'a', 'model_artifacts': 's3://models/p/a/model.tar.gz'}
+
+    fake.calls.reset()
+    with pytest.raises(job_handler.JobError) as error:
+        job_handler.submit_serve_job('p', job)
+    assert error.value.status_code == 409
+    assert not fake.calls.counts['s3.CopyObject'] and not fake.calls.counts['sagemaker.CreateEndpoint']
+
+    # a dedicated promotion takes the project off the shared endpoint again
+    dynamo_handler.log_job('p', 'Serve', job_name='live', variant_name='a', endpoint_status='Creating')
+    status_handler.promote_job({'job_name': 'live', 'project_name': 'p', 'variant_name': 'a'},
+                               status_handler.util_handler.AdaptiveThrottle(rate=100))
+    assert dynamo_handler.get_serving_target('p') == ('live', '')
@@ -0,0 +1,98 @@
+import pytest
+
+pytest.importorskip('boto3')
+
+from tests.fakes import install_fake_aws  # pylint: disable=wrong-import-position
+from sagemaker_svc_wrapper.handlers import dynamo_handler, s3_handler  # pylint: disable=wrong-import-position
+from sagemaker_svc_wrapper.configs.settings import SYS_CONFIG  # pylint: disable=wrong-import-position
+from cron import archive_handler  # pylint: disable=wrong-import-position
+
+DAY = 24 * 60 * 60
+NOW = 1548041871
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    """
+    project p: a serve and a train job of variant a and a serve job of variant b per day over 4 days,
+    the oldest ones retired or failed
+    """
+    monkeypatch.setattr(archive_handler.maya, 'now', lambda: archive_handler.maya.MayaDT(NOW))
+    fake = install_fake_aws()
+    for day in range(4):
+        queued = NOW - (3 - day) * DAY
+        old = day == 0
+        dynamo_handler.log_job('p', 'Serve', variant_name='a', job_name=f'p-Serve-a-{queued}',
+                               timestamp_queued=queued, endpoint_status='Retired' if old else 'InService')
+        dynamo_handler.log_job('p', 'Train', variant_name='a', job_name=f'p-Train-a-{queued}',
+                               timestamp_queued=queued, endpoint_status='Failed' if old else 'Completed')
+        dynamo_handler.log_job('p', 'Serve', variant_name='b', job_name=f'p-Serve-b-{queued}',
+                               timestamp_queued=queued + 1, endpoint_status='InService')
+    dynamo_handler.log_job('other', 'Serve', job_name=f'other-Serve-{NOW}', timestamp_queued=NOW)
+    return fake
+
+
+def job_names(response):
+    body = response.get_json()
+    return [job['job_name'] for job in (body['items'] if isinstance(body, dict) else body)]
+
+
+def test_time_range_queries_are_ordered_key_conditions(fake):
+    import app
+    client = app.app.test_client()
+
+    assert job_names(client.get('/project/p/jobs?variant_name=a&job_type=Serve')) == \
+        [f'p-Serve-a-{NOW - day * DAY}' for day in range(4)]
+    assert job_names(client.get(f'/project/p/jobs?job_type=Train&since={NOW - DAY}&order=asc')) == \
+        [f'p-Train-a-{NOW - DAY}', f'p-Train-a-{NOW}']
+    assert job_names(client.get('/project/p/jobs?variant_name=b&until=2019-01-19T03:37:52Z')) == \
+        [f'p-Serve-b-{NOW - 2 * DAY}', f'p-Serve-b-{NOW - 3 * DAY}']
+    assert client.get('/project/p/jobs?since=yesterday-ish').status_code == 400
+
+    # pages follow the time order, each a single query on the variant index
+    fake.calls.reset()
+    first = client.get('/project/p/jobs?variant_name=b&limit=3').get_json()
+    second = client.get(f"/project/p/jobs?variant_name=b&limit=3&next_token={first['next_token']}").get_json()
+    assert [job['timestamp_queued'] for job in first['items'] + second['items']] == \
+        [NOW - day * DAY + 1 for day in range(4)]
+    assert fake.calls.counts['dynamodb.Query'] == 2
+
+    # jobs logged before the filtered indexes get their keys from the backfill
+    del fake.dynamodb.tables[SYS_CONFIG.job_table].items[(f'p-Serve-b-{NOW}',)]['project_variant']
+    assert len(job_names(client.get('/project/p/jobs?variant_name=b'))) == 3
+    assert dynamo_handler.backfill_job_index_keys() == 1
+    assert len(job_names(client.get('/project/p/jobs?variant_name=b'))) == 4
+
+
+def test_tables_without_the_time_ordered_indexes_filter_project_name_index(fake):
+    import app
+    client = app.app.test_client()
+    # a deployment that has not created the indexes yet
+    fake.dynamodb.tables[SYS_CONFIG.job_table].indexes = {'project_name-index': ('project_name', None),
+                                                          'endpoint_status-index': ('endpoint_status', None)}
+
+    assert sorted(job_names(client.get('/project/p/jobs?variant_name=a&job_type=Serve'))) == \
+        sorted(f'p-Serve-a-{NOW - day * DAY}' for day in range(4))
+    assert sorted(job_names(client.get(f'/project/p/jobs?job_type=Train&since={NOW - DAY}'))) == \
+        [f'p-Train-a-{NOW - DAY}', f'p-Train-a-{NOW}']
+    assert len(job_names(client.get('/project/p/jobs?limit=5'))) == 5
+    assert len(list(dynamo_handler.list_jobs('p'))) == 12
+    assert list(dynamo_handler.list_jobs('nobody')) == []
+
+
+def test_archive_moves_old_finished_jobs_to_gzipped_jsonl(fake, monkeypatch):
+    monkeypatch.setattr(SYS_CONFIG, 'archive_after_days', 2)
+    assert archive_handler.archive_jobs() == {'p': 2}
+
+    key = f'jobs/p/2019/01/21/{NOW}.jsonl.gz'
+    assert list(fake.s3.objects) == [(SYS_CONFIG.archive_bucket, key)]
+    assert fake.s3.objects[(SYS_CONFIG.archive_bucket, key)]['ContentEncoding'] == 'gzip'
+    archived = s3_handler.get_jsonl_gz(SYS_CONFIG.archive_bucket, key)
+    assert sorted(job['job_name'] for job in archived) == [f'p-Serve-a-{NOW - 3 * DAY}', f'p-Train-a-{NOW - 3 * DAY}']
+    assert archived[0]['timestamp_queued'] == NOW - 3 * DAY
+
+    # gone from the hot table, newer and still serving jobs stay
+    assert dynamo_handler.get_job(f'p-Serve-a-{NOW - 3 * DAY}') == {}
+    assert len(list(dynamo_handler.list_jobs('p'))) == 10
+    assert fake.calls.counts['dynamodb.BatchWriteItem'] == 1
+    assert archive_handler.archive_jobs() == {}
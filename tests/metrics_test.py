@@ -0,0 +1,49 @@
+import threading
+import pytest
+
+boto3 = pytest.importorskip('boto3')
+from botocore.stub import Stubber
+from sagemaker_svc_wrapper.configs import metrics
+
+
+def test_histogram_buckets():
+    histogram = metrics.Histogram('sagemaker.DescribeEndpoint')
+    histogram.observe(3)
+    histogram.observe(40, retries=2, throttles=1)
+    histogram.observe(90000, error=True)
+
+    snapshot = histogram.snapshot()
+    assert snapshot['count'] == 3
+    assert snapshot['buckets']['le_5'] == 1
+    assert snapshot['buckets']['le_50'] == 1
+    assert snapshot['buckets']['le_inf'] == 1
+    assert (snapshot['retries'], snapshot['throttles'], snapshot['errors']) == (2, 1, 1)
+
+
+def test_instrumented_client_records_calls_in_scope():
+    metrics.clear()
+    client = boto3.session.Session().client('sagemaker', region_name='ap-southeast-2',
+                                            aws_access_key_id='x', aws_secret_access_key='x')
+    metrics.instrument(client)
+    stubber = Stubber(client)
+    stubber.add_response('list_endpoints', {'Endpoints': []})
+    stubber.add_client_error('describe_endpoint', service_error_code='ValidationException', http_status_code=400)
+
+    with stubber, metrics.scope('test') as scope:
+        client.list_endpoints()
+        with pytest.raises(client.exceptions.ClientError):
+            client.describe_endpoint(EndpointName='missing')
+
+    assert [(record.operation, record.error) for record in scope.records] == \
+        [('ListEndpoints', False), ('DescribeEndpoint', True)]
+    assert metrics.snapshot()['aws_calls']['sagemaker.DescribeEndpoint']['errors'] == 1
+    assert metrics.current_scope() is None
+
+
+def test_propagate_binds_scope_in_worker_thread():
+    with metrics.scope('tick') as scope:
+        worker = threading.Thread(target=metrics.propagate(
+            lambda: metrics.record_call(metrics.CallRecord('dynamodb', 'Query', 1.0, 0, 0, False))))
+        worker.start()
+        worker.join()
+    assert len(scope.records) == 1
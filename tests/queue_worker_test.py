@@ -0,0 +1,86 @@
+import json
+import pytest
+
+pytest.importorskip('boto3')
+
+from tests.fakes import install_fake_aws  # pylint: disable=wrong-import-position
+from cron import queue_worker  # pylint: disable=wrong-import-position
+from sagemaker_svc_wrapper.handlers import dynamo_handler, job_handler  # pylint: disable=wrong-import-position
+from sagemaker_svc_wrapper.handlers import sqs_handler  # pylint: disable=wrong-import-position
+
+SPEC_SERVE = {'InitialInstanceCount': 1, 'InstanceType': 'ml.m4.xlarge'}
+
+
+@pytest.fixture
+def fake():
+    fake = install_fake_aws()
+    dynamo_handler.create_project('p', variants={'default': 1})
+    dynamo_handler.create_project_model('p', 'default', spec_serve=SPEC_SERVE, image_serve=json.dumps('image'))
+    return fake
+
+
+def queue_serve_job():
+    job, _, _ = job_handler.prepare_serve_job('p', {'image_serve': 'image', 'variant_name': 'default'})
+    return job_handler.queue_job(job_handler.JobType.Serve.value, 'p', job)
+
+
+def test_queued_job_is_deployed_by_worker(fake):
+    job_name = queue_serve_job()
+    assert dynamo_handler.get_job(job_name)['endpoint_status'] == 'Queued'
+    assert not fake.sagemaker.endpoints
+
+    fake.sqs.drain(queue_worker.process_jobs)
+
+    assert dynamo_handler.get_job(job_name)['endpoint_status'] == 'Creating'
+    assert job_name in fake.sagemaker.endpoints
+    assert not fake.sqs.messages
+
+
+def test_failed_attempt_is_retried_and_resumed(fake):
+    job_name = queue_serve_job()
+    fake.sagemaker.fail_next('CreateEndpoint')
+
+    # without ReportBatchItemFailures a returned failure would be deleted, the invocation fails instead
+    event = fake.sqs.lambda_event()
+    response = fake.sqs.invoke(queue_worker.process_jobs, event)
+    assert isinstance(response, sqs_handler.BatchItemFailures)
+    assert response.failures == [{'itemIdentifier': event['Records'][0]['messageId']}]
+    assert len(fake.sqs.messages) == 1
+    assert dynamo_handler.get_job(job_name)['endpoint_status'] == 'Queued'
+    assert job_name in fake.sagemaker.models
+    # no deployment record for an endpoint sagemaker refused
+    assert not dynamo_handler.get_endpoint(job_name)
+
+    # second delivery finds model and endpoint config from the first attempt
+    fake.sqs.drain(queue_worker.process_jobs)
+    assert dynamo_handler.get_job(job_name)['endpoint_status'] == 'Creating'
+
+
+def test_job_fails_and_message_is_dead_lettered(fake):
+    job_name = queue_serve_job()
+    fake.sagemaker.fail_next('CreateModel', times=fake.sqs.max_receive_count)
+
+    fake.sqs.drain(queue_worker.process_jobs)
+
+    assert len(fake.sqs.dead_letters) == 1
+    assert dynamo_handler.get_job(job_name)['endpoint_status'] == 'Failed'
+
+
+def test_identical_serve_reuses_live_endpoint(fake):
+    first = queue_serve_job()
+    fake.sqs.drain(queue_worker.process_jobs)
+    fake.sagemaker.settle()
+    dynamo_handler.update_project('p', {'serving_endpoint': first})
+    models = len(fake.sagemaker.models)
+
+    # job names are per second
+    job, _, _ = job_handler.prepare_serve_job('p', {'image_serve': 'image', 'variant_name': 'default'})
+    job['job_name'] = 'p-Serve-reused'
+    updates = job_handler.submit_serve_job('p', job)
+
+    assert updates['endpoint_status'] == 'Reused'
+    assert updates['reused_endpoint'] == first
+    assert len(fake.sagemaker.models) == models
+
+    job['job_name'], job['env_serve'] = 'p-Serve-changed', {'threads': '4'}
+    assert job_handler.submit_serve_job('p', job)['endpoint_status'] == 'Creating'
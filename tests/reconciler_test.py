@@ -0,0 +1,37 @@
+import time
+from cron import reconciler
+
+
+def _job(name, project='p', variant='default'):
+    return {'job_name': name, 'project_name': project, 'variant_name': variant}
+
+
+def test_resume_order_puts_checkpoint_first():
+    jobs = [_job('a'), _job('b'), _job('c')]
+    assert [job['job_name'] for job in reconciler.resume_order(jobs, ['c'])] == ['c', 'a', 'b']
+
+
+def test_run_reconciles_all_jobs():
+    seen = []
+    engine = reconciler.Reconciler(lambda job: seen.append(job['job_name']), max_workers=4)
+    jobs = [_job(f'job-{i}', project=f'p{i % 3}') for i in range(9)]
+    result = engine.run(jobs, time.monotonic() + 10)
+    assert sorted(result.reconciled) == sorted(seen) == sorted(job['job_name'] for job in jobs)
+    assert not result.failed and not result.pending
+
+
+def test_run_keeps_unfinished_jobs_pending():
+    engine = reconciler.Reconciler(lambda job: time.sleep(0.05), max_workers=1)
+    jobs = [_job(f'job-{i}') for i in range(5)]
+    result = engine.run(jobs, time.monotonic() + 0.12)
+    assert result.pending
+    assert len(result.reconciled) + len(result.pending) == 5
+
+
+def test_run_records_failures():
+    def reconcile(job):
+        if job['job_name'] == 'bad':
+            raise ValueError('boom')
+    result = reconciler.Reconciler(reconcile).run([_job('bad'), _job('good', project='q')], time.monotonic() + 10)
+    assert result.failed == ['bad']
+    assert result.reconciled == ['good']
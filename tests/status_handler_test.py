@@ -0,0 +1,79 @@
+import pytest
+
+pytest.importorskip('boto3')
+
+from tests.fakes import install_fake_aws  # pylint: disable=wrong-import-position
+from sagemaker_svc_wrapper.handlers import dynamo_handler, util_handler  # pylint: disable=wrong-import-position
+from sagemaker_svc_wrapper.configs.settings import SYS_CONFIG  # pylint: disable=wrong-import-position
+from cron import status_handler  # pylint: disable=wrong-import-position
+
+QUEUED = 1548041871
+# more jobs of each kind than one list call returns
+JOB_COUNT = 150
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    """
+    JOB_COUNT training and transform jobs queued at QUEUED, created a second later and still in progress
+    except p-Train-007 and p-Transform-007. p-Serve-1 and p-Train-early were created before the listing
+    bound, p-Serve-2 is still Creating
+    """
+    monkeypatch.setattr(SYS_CONFIG, 'cron_mode', 'bulk')
+    fake = install_fake_aws()
+    for index in range(JOB_COUNT):
+        for job_type, status, jobs, name_key, status_key in (
+                ('Train', 'Training', fake.sagemaker.training_jobs, 'TrainingJobName', 'TrainingJobStatus'),
+                ('Transform', 'Transforming', fake.sagemaker.transform_jobs, 'TransformJobName',
+                 'TransformJobStatus')):
+            job_name = f'p-{job_type}-{index:03d}'
+            dynamo_handler.log_job('p', job_type, job_name=job_name, endpoint_status=status, timestamp_queued=QUEUED)
+            jobs[job_name] = {name_key: job_name, status_key: 'Completed' if index == 7 else 'InProgress',
+                              'CreationTime': QUEUED + 1}
+
+    # created by an earlier attempt, a second before the listings look
+    before_bound = QUEUED - status_handler.CREATION_TIME_SLACK - 1
+    dynamo_handler.log_job('p', 'Train', job_name='p-Train-early', endpoint_status='Training',
+                           timestamp_queued=QUEUED + 60)
+    fake.sagemaker.training_jobs['p-Train-early'] = {'TrainingJobName': 'p-Train-early',
+                                                     'TrainingJobStatus': 'Completed', 'CreationTime': before_bound}
+    dynamo_handler.log_job('p', 'Serve', job_name='p-Serve-1', endpoint_status='Creating', timestamp_queued=QUEUED)
+    fake.sagemaker.endpoints['p-Serve-1'] = {'EndpointName': 'p-Serve-1', 'EndpointStatus': 'Updating',
+                                             'CreationTime': before_bound}
+    dynamo_handler.log_job('p', 'Serve', job_name='p-Serve-2', endpoint_status='Creating',
+                           timestamp_queued=QUEUED + 60)
+    fake.sagemaker.endpoints['p-Serve-2'] = {'EndpointName': 'p-Serve-2', 'EndpointStatus': 'Creating',
+                                             'CreationTime': QUEUED - status_handler.CREATION_TIME_SLACK + 1}
+    return fake
+
+
+def test_bulk_listings_keep_changed_and_unlisted_jobs(fake):
+    jobs = status_handler.list_in_flight_jobs()
+    assert len(jobs) == 2 * JOB_COUNT + 3
+
+    fake.calls.reset()
+    changed = status_handler.bulk_changed_jobs(jobs, util_handler.AdaptiveThrottle(rate=100))
+    observed = {job['job_name']: job.get('observed_status') for job in changed}
+    # listed and changed, or created before the earliest queued job of their kind less the slack
+    assert observed == {'p-Train-007': 'Completed', 'p-Transform-007': 'Completed',
+                        'p-Train-early': None, 'p-Serve-1': None}
+    # two pages per listing, transform jobs paged with NextToken
+    assert fake.calls.counts['sagemaker.ListTrainingJobs'] == 2
+    assert fake.calls.counts['sagemaker.ListTransformJobs'] == 2
+    assert fake.calls.counts['sagemaker.ListEndpoints'] == 1
+    assert not fake.calls.counts['sagemaker.DescribeTrainingJob']
+
+
+def test_bulk_cron_describes_only_jobs_missing_from_the_listings(fake):
+    fake.calls.reset()
+    status_handler.jobs_update()
+
+    assert fake.calls.counts['sagemaker.DescribeEndpoint'] == 1
+    assert fake.calls.counts['sagemaker.DescribeTrainingJob'] == 1
+    assert not fake.calls.counts['sagemaker.DescribeTransformJob']
+    assert dynamo_handler.get_job('p-Serve-1')['endpoint_status'] == 'Updating'
+    assert dynamo_handler.get_job('p-Serve-2')['endpoint_status'] == 'Creating'
+    assert dynamo_handler.get_job('p-Train-early')['endpoint_status'] == 'Completed'
+    assert dynamo_handler.get_job('p-Train-007')['endpoint_status'] == 'Completed'
+    assert dynamo_handler.get_job('p-Transform-007')['endpoint_status'] == 'Completed'
+    assert dynamo_handler.get_job('p-Train-008')['endpoint_status'] == 'Training'
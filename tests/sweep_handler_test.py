@@ -0,0 +1,138 @@
+import json
+import random
+import pytest
+
+pytest.importorskip('boto3')
+
+from botocore.exceptions import EndpointConnectionError  # pylint: disable=wrong-import-position
+from tests.fakes import install_fake_aws  # pylint: disable=wrong-import-position
+from sagemaker_svc_wrapper.handlers import dynamo_handler, sweep_handler  # pylint: disable=wrong-import-position
+from sagemaker_svc_wrapper.configs.settings import SYS_CONFIG  # pylint: disable=wrong-import-position
+from cron import status_handler  # pylint: disable=wrong-import-position
+
+OBJECTIVE = {'metric_name': 'validation:rmse', 'type': 'Minimize', 'regex': 'validation-rmse:([0-9.]+)'}
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    """
+    project p training variant a, an account with 3 training job slots
+    """
+    monkeypatch.setattr(SYS_CONFIG, 'training_job_slots', 3)
+    monkeypatch.setattr(SYS_CONFIG, 'cron_mode', 'bulk')
+    fake = install_fake_aws()
+    dynamo_handler.create_project('p', variants={'a': 1})
+    dynamo_handler.create_project_model('p', 'a', image_train=json.dumps('xgboost'),
+                                        spec_train={'InstanceCount': 1, 'InstanceType': 'ml.m5.xlarge'})
+    return fake
+
+
+def finish_training(fake):
+    """
+    every training job reports rmse, lowest for eta 0.3 and max_depth 4, then completes
+    """
+    for training_job in fake.sagemaker.training_jobs.values():
+        params = training_job.get('HyperParameters', {})
+        if 'eta' in params:
+            rmse = abs(float(params['eta']) - 0.3) + 1.0 / int(params['max_depth'])
+            training_job['FinalMetricDataList'] = [{'MetricName': 'validation:rmse', 'Value': rmse}]
+    fake.sagemaker.settle()
+
+
+def sweep_training_jobs(fake, sweep_name):
+    return sorted(name for name in fake.sagemaker.training_jobs if name.startswith(sweep_name))
+
+
+def test_grid_sweep_runs_within_slots_and_picks_best(fake):
+    import app
+    fake.sagemaker.create_training_job(TrainingJobName='another-team-job')
+    response = app.app.test_client().post('/job/p/sweep', json={
+        'strategy': 'grid', 'variant_name': 'a', 'data_input': 's3://data/p/train/', 'model_output': 's3://models/p/',
+        'search_space': {'eta': [0.1, 0.3], 'max_depth': {'type': 'integer', 'min': 3, 'max': 4}},
+        'hyperparameters': {'num_round': 50}, 'objective': OBJECTIVE, 'max_parallel_jobs': 3})
+
+    assert response.status_code == 201
+    sweep_name = response.get_json()['job_name']
+    assert response.get_json()['max_jobs'] == 4
+    # one of the 3 account slots is taken
+    started = sweep_training_jobs(fake, sweep_name)
+    assert started == [f'{sweep_name}-000', f'{sweep_name}-001']
+    training_job = fake.sagemaker.training_jobs[started[0]]
+    assert training_job['HyperParameters'] == {'num_round': '50', 'eta': '0.1', 'max_depth': '3'}
+    assert training_job['AlgorithmSpecification']['MetricDefinitions'] == [
+        {'Name': 'validation:rmse', 'Regex': 'validation-rmse:([0-9.]+)'}]
+    assert dynamo_handler.get_job(f'{sweep_name}-002')['endpoint_status'] == 'Scheduled'
+
+    # finished children free their slots, the first start hits the account limit and a later pass retries it
+    finish_training(fake)
+    fake.sagemaker.fail_next('CreateTrainingJob', code='ResourceLimitExceeded')
+    status_handler.jobs_update()
+    assert len(sweep_training_jobs(fake, sweep_name)) == 4
+    assert float(dynamo_handler.get_job(f'{sweep_name}-000')['objective_value']) == pytest.approx(1.0 / 3 + 0.2)
+    assert dynamo_handler.get_job(sweep_name)['endpoint_status'] == 'Sweeping'
+
+    finish_training(fake)
+    status_handler.jobs_update()
+    sweep = dynamo_handler.get_job(sweep_name)
+    assert sweep['endpoint_status'] == 'Completed'
+    assert sweep['best_job'] == f'{sweep_name}-003'
+    assert float(sweep['best_objective_value']) == pytest.approx(0.25)
+
+
+def test_bayesian_suggestions_follow_the_objective():
+    space = sweep_handler.search_space({'x': {'type': 'continuous', 'min': 0.0, 'max': 1.0}})
+    observations = [({'x': x}, (x - 0.7) ** 2) for x in (0.0, 0.25, 0.5, 1.0)]
+
+    first, second = sweep_handler.suggest_bayesian(space, observations, [], 2, random.Random(7))
+    assert 0.5 < first['x'] < 1.0
+    # the pending first suggestion keeps the second one away from it
+    assert abs(second['x'] - first['x']) > 0.01
+
+
+def test_child_claimed_without_a_training_job_goes_back_to_the_schedule(fake, monkeypatch):
+    sweep = sweep_handler.create_sweep('p', {
+        'strategy': 'grid', 'variant_name': 'a', 'data_input': 's3://data/p/train/', 'model_output': 's3://models/p/',
+        'search_space': {'eta': [0.1]}, 'objective': OBJECTIVE})
+    child_name = f"{sweep['job_name']}-000"
+    assert isinstance(sweep['seed'], int)
+    throttle = status_handler.util_handler.AdaptiveThrottle(rate=100)
+
+    # the connection drops during the start: the claim is undone
+    submit_train_job = sweep_handler.job_handler.submit_train_job
+
+    def unreachable(job, resume=False):
+        raise EndpointConnectionError(endpoint_url='https://api.sagemaker')
+    monkeypatch.setattr(sweep_handler.job_handler, 'submit_train_job', unreachable)
+    with pytest.raises(EndpointConnectionError):
+        sweep_handler.schedule_sweep(sweep['job_name'], throttle)
+    assert dynamo_handler.get_job(child_name)['endpoint_status'] == 'Scheduled'
+    monkeypatch.setattr(sweep_handler.job_handler, 'submit_train_job', submit_train_job)
+
+    # the submitting lambda died between claim and start: an old claim without training job is rescheduled
+    dynamo_handler.update_job(child_name, {'endpoint_status': 'Training'})
+    child = dynamo_handler.get_job(child_name)
+    assert status_handler.reconcile_training_job(child, throttle) == 'Training'
+    fake.dynamodb.Table(SYS_CONFIG.job_table).items[(child_name,)]['time_updated'] = 0
+    assert status_handler.reconcile_training_job(child, throttle) == 'Scheduled'
+    sweep_handler.schedule_sweep(sweep['job_name'], throttle)
+    assert sweep_training_jobs(fake, sweep['job_name']) == [child_name]
+
+
+def test_sweep_children_that_can_never_start_fail(fake):
+    with pytest.raises(sweep_handler.JobError) as error:
+        sweep_handler.create_sweep('p', {'strategy': 'grid', 'variant_name': 'a', 'data_input': 's3://data/p/train/',
+                                         'search_space': {'eta': [0.1]}, 'objective': OBJECTIVE})
+    assert error.value.status_code == 400
+    assert list(fake.dynamodb.Table(SYS_CONFIG.job_table).items) == []
+
+    # a child recorded without model_output is failed, not put back on the schedule
+    sweep = sweep_handler.create_sweep('p', {
+        'strategy': 'grid', 'variant_name': 'a', 'data_input': 's3://data/p/train/', 'model_output': 's3://models/p/',
+        'search_space': {'eta': [0.1]}, 'objective': OBJECTIVE})
+    child_name = f"{sweep['job_name']}-000"
+    del fake.dynamodb.Table(SYS_CONFIG.job_table).items[(child_name,)]['model_output']
+    sweep_handler.schedule_sweep(sweep['job_name'], status_handler.util_handler.AdaptiveThrottle(rate=100))
+    child = dynamo_handler.get_job(child_name)
+    assert child['endpoint_status'] == 'Failed'
+    assert 'model_output' in child['error_message']
+    assert sweep_training_jobs(fake, sweep['job_name']) == []
@@ -0,0 +1,23 @@
+from decimal import Decimal
+import pytest
+
+pytest.importorskip('boto3')
+
+from sagemaker_svc_wrapper.handlers import util_handler  # pylint: disable=wrong-import-position
+
+
+def test_page_token_round_trip():
+    key = {'job_name': 'p-Serve-1', 'project_name': 'p', 'timestamp_queued': Decimal('1548041871')}
+    token = util_handler.encode_page_token(key)
+    assert util_handler.decode_page_token(token) == key
+    assert util_handler.encode_page_token(None) is None
+
+
+def test_bad_page_token():
+    with pytest.raises(ValueError):
+        util_handler.decode_page_token('not-a-token')
+
+
+def test_ndjson_lines():
+    lines = list(util_handler.ndjson_lines([{'n': Decimal(1)}, {'n': Decimal('1.5')}]))
+    assert lines == ['{"n": 1}\n', '{"n": 1.5}\n']